@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ..pagination import InvalidCursor, KeysetPaginator
+
+CHANGES_QUERY_PARAM = 'since'
+
+
+class ChangesExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The changes since this cursor are no longer known, fetch the first page again.'
+    default_code = 'changes_expired'
+
+
+def get_changes_link(request, cursor):
+    """
+    Returns the link to the changes since the given changes cursor, on the url of the current request
+    """
+    url = remove_query_param(request.build_absolute_uri(), 'cursor')
+    return replace_query_param(url, CHANGES_QUERY_PARAM, cursor)
+
+
+class ArticleCursorPagination(BasePagination):
+    """
+    Keyset pagination of articles from the most recent on `(created_at, id)`, with opaque cursors
+    in the next and previous links
+    """
+    cursor_query_param = 'cursor'
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    key_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.page_size, key_field=self.key_field)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as error:
+            raise NotFound(str(error)) from error
+
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('results', data),
+        ]))
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class RecommendationCursorPagination(ArticleCursorPagination):
+    """
+    Keyset pagination of the articles recommended to a user from the best scored, on
+    `(recommendation_score, id)`
+    """
+    key_field = 'recommendation_score'
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'The pagination cursor value.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class CommentCursorPagination(ArticleCursorPagination):
+    """
+    Keyset pagination of the comments of an article from the most recent. The first page also links to
+    the changes since it was fetched, from the changes cursor given by the view's `get_changes_cursor`.
+    """
+    page_size = settings.COMMENTS_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        is_first_page = not request.query_params.get(self.cursor_query_param)
+        self.changes_cursor = view.get_changes_cursor() if is_first_page and view is not None else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('changes', get_changes_link(self.request, self.changes_cursor) if self.changes_cursor else None),
+            ('results', data),
+        ]))
@@ -0,0 +1,13 @@
+from rest_framework import permissions
+
+
+class IsCommentOrArticleAuthor(permissions.BasePermission):
+    """
+    Only lets the author of a comment, or the author of its article, change it. The view gives the
+    author of the article through `get_article_author_id`.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return request.user.pk in (obj.author_id, view.get_article_author_id())
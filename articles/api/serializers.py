@@ -1,30 +1,80 @@
+from django.urls import reverse
 from rest_framework import serializers
 
 from profiles.api.serializers import ProfileSerializer
 
+from ..helpers import format_headline
 from ..models import Article, Comment, Tag
+from ..viewer_state import get_viewer_state
+
+
+class ArticleListSerializer(serializers.ListSerializer):
+    """
+    Resolves the viewer state of a whole page of articles at once before serializing them
+    """
+
+    def to_representation(self, data):
+        articles = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request', None)
+        if request:
+            get_viewer_state(request).load_articles(articles)
+        return super().to_representation(articles)
 
 
 class ArticleSerializer(serializers.ModelSerializer):
     # author = ProfileSerializer(read_only=True)
     has_favorited = serializers.SerializerMethodField(method_name = "is_favorite")
-    favorites_count = serializers.SerializerMethodField()
-
+    favorites_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
+    view_count = serializers.IntegerField(read_only=True)
+    content_html = serializers.CharField(source='get_content_html', read_only=True)
 
     class Meta:
         model = Article
-        fields = ['id', 'slug', 'title', 'description', 'content', 'cover_image', 'created_at', 'author', 'favorites_count', 'has_favorited']
+        fields = ['id', 'slug', 'title', 'description', 'content', 'content_html', 'cover_image', 'created_at', 'author', 'favorites_count',
+                  'comments_count', 'view_count', 'has_favorited']
+        list_serializer_class = ArticleListSerializer
 
     def is_favorite(self, instance):
         request = self.context.get('request', None)
 
         if request:
-            if request.user.is_authenticated:
-                return request.user.is_favorite(instance.slug)
+            return get_viewer_state(request).has_favorited(instance)
         return False
 
-    def get_favorites_count(self, instance):
-        return instance.get_favorited_count()
+
+class ArticleSearchSerializer(ArticleSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.SerializerMethodField()
+
+    class Meta(ArticleSerializer.Meta):
+        fields = ArticleSerializer.Meta.fields + ['rank', 'headline']
+
+    def get_headline(self, instance):
+        return format_headline(instance.headline)
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    author = serializers.CharField(source='author.username', read_only=True)
+    author_url = serializers.SerializerMethodField()
+    can_delete = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'body', 'author', 'author_url', 'created_at', 'can_delete']
+
+    def get_author_url(self, instance):
+        return reverse('profiles:profile_detail', args=[instance.author.username])
+
+    def get_can_delete(self, instance):
+        """
+        Whether the viewer may delete the comment, i.e. is its author or the author of the article, whose
+        id is passed in the context
+        """
+        request = self.context.get('request', None)
+        if request and request.user.is_authenticated:
+            return request.user.pk in (instance.author_id, self.context.get('article_author_id'))
+        return False
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.urlpatterns import format_suffix_patterns
 
-from .views import ArticleViewSet, api_root
+from articulate.concurrency import offload
+
+from .views import (ArticleSearchView, ArticleViewSet, CommentViewSet, ExportView, RecommendedArticleListView,
+                    TypeaheadView, api_root)
 
 article_list = ArticleViewSet.as_view({
     'get': 'list',
@@ -23,10 +27,37 @@ article_detail_slug = ArticleViewSet.as_view({
     'delete': 'destroy'
 }, lookup_field='slug')
 
+recommended_article_list = RecommendedArticleListView.as_view()
+
+typeahead = TypeaheadView.as_view()
+
+comment_list = CommentViewSet.as_view({
+    'get': 'list',
+    'post': 'create'
+})
+
+comment_detail = CommentViewSet.as_view({
+    'delete': 'destroy'
+})
+
+if settings.ASYNC_READ_VIEWS:
+    article_list = offload(article_list)
+    article_detail = offload(article_detail)
+    article_detail_slug = offload(article_detail_slug)
+    comment_list = offload(comment_list)
+    recommended_article_list = offload(recommended_article_list)
+    typeahead = offload(typeahead)
+
 app_name = "articles"
 urlpatterns = [
     path('', article_list, name='article-list'),
+    path('search/', ArticleSearchView.as_view(), name='article-search'),
+    path('typeahead/', typeahead, name='typeahead'),
+    path('recommended/', recommended_article_list, name='article-recommended'),
+    path('export/<str:dataset>/', ExportView.as_view(), name='export'),
     path('<int:pk>/', article_detail, name='article-detail'),
+    path('<int:article_pk>/comments/', comment_list, name='comment-list'),
+    path('<int:article_pk>/comments/<int:pk>/', comment_detail, name='comment-detail'),
     path('<slug:slug>/', article_detail_slug, name='article-detail')
 ]
 
@@ -1,10 +1,26 @@
-from rest_framework import permissions, viewsets
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import generics, mixins, permissions, viewsets
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
-from articles.api.serializers import ArticleSerializer
-from articles.models import Article
+from articles.api.pagination import (CHANGES_QUERY_PARAM, ArticleCursorPagination, ChangesExpired,
+                                     CommentCursorPagination, RecommendationCursorPagination, get_changes_link)
+from articles.api.permissions import IsCommentOrArticleAuthor
+from articles.api.serializers import ArticleSearchSerializer, ArticleSerializer, CommentSerializer
+from articles.conditional import get_article_validators, get_feed_etag, get_not_modified_response, set_validators
+from articles.export import DATASETS, FORMATS, NDJSON, stream_export
+from articles.forms import SearchForm
+from articles.helpers import get_comment_changes, get_comment_sync_markers, get_recommended_articles
+from articles.models import Article, Comment, article_cache
+from articles.pagination import ExpiredCursor, InvalidCursor, decode_changes_cursor, encode_changes_cursor
+from articles.search_cache import get_search_results
+from articles.typeahead import KINDS, TOP_K, get_entry_url, typeahead_index
 
 
 @api_view(['GET'])
@@ -19,6 +35,171 @@ class ArticleViewSet(viewsets.ModelViewSet):
     queryset = Article.objects.all()
     serializer_class = ArticleSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ArticleCursorPagination
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        article = article_cache.get_object_or_404(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, article)
+        return article
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        validators = get_article_validators(request.user, request.accepted_renderer.format, **lookup)
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        _, etag, last_modified = validators
+        return get_not_modified_response(request, etag, last_modified) or set_validators(
+            super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        etag = get_feed_etag(request.user, f'{request.get_full_path()}:{request.accepted_renderer.format}',
+                             with_activity=True)
+        return get_not_modified_response(request, etag) or set_validators(
+            super().list(request, *args, **kwargs), etag)
+
+
+class RecommendedArticleListView(generics.ListAPIView):
+    """
+    Articles recommended to the user from the best scored, as last refreshed by `refresh_recommendations`
+    """
+    serializer_class = ArticleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RecommendationCursorPagination
+
+    def get_queryset(self):
+        return get_recommended_articles(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        etag = get_feed_etag(request.user, f'{request.get_full_path()}:{request.accepted_renderer.format}',
+                             recommended=True, with_activity=True)
+        return get_not_modified_response(request, etag) or set_validators(
+            super().list(request, *args, **kwargs), etag)
+
+
+class CommentViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.DestroyModelMixin,
+                     viewsets.GenericViewSet):
+    """
+    Comments of an article from the most recent, with their authors. The first page links to the changes
+    since it was fetched, `?since=<cursor>`, which lists the comments posted since, oldest first, and the
+    ids of the comments deleted since, along with the link to the next changes.
+    """
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsCommentOrArticleAuthor]
+    pagination_class = CommentCursorPagination
+    changes_limit = 100
+
+    def get_queryset(self):
+        return Comment.objects.filter(article_id=self.kwargs['article_pk']).select_related('author')
+
+    def get_sync_markers(self):
+        if not hasattr(self, '_sync_markers'):
+            self._sync_markers = get_comment_sync_markers(self.kwargs['article_pk'])
+            if self._sync_markers is None:
+                raise Http404
+        return self._sync_markers
+
+    def get_article_author_id(self):
+        return self.get_sync_markers()[0]
+
+    def get_changes_cursor(self):
+        _, *position = self.get_sync_markers()
+        return encode_changes_cursor(*position)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['article_author_id'] = self.get_article_author_id()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get(CHANGES_QUERY_PARAM)
+        if since is not None:
+            return self.list_changes(since)
+        return super().list(request, *args, **kwargs)
+
+    def list_changes(self, since):
+        try:
+            position = decode_changes_cursor(since, settings.COMMENT_TOMBSTONE_TTL)
+        except ExpiredCursor as error:
+            raise ChangesExpired from error
+        except InvalidCursor as error:
+            raise NotFound(str(error)) from error
+
+        comments, tombstones, has_more, position = get_comment_changes(
+            self.kwargs['article_pk'], position, self.changes_limit)
+        cursor = encode_changes_cursor(*position)
+        return Response(OrderedDict([
+            ('changes', get_changes_link(self.request, cursor)),
+            ('has_more', has_more),
+            ('results', self.get_serializer(comments, many=True).data),
+            ('deleted', [deleted_id for _, deleted_id in tombstones]),
+        ]))
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
\ No newline at end of file
+        serializer.save(article_id=self.kwargs['article_pk'], author=self.request.user)
+
+
+class ArticleSearchView(generics.ListAPIView):
+    serializer_class = ArticleSearchSerializer
+
+    def get_queryset(self):
+        search_form = SearchForm(self.request.query_params)
+        if not search_form.is_valid():
+            raise ValidationError(search_form.errors)
+
+        return get_search_results(search_form.cleaned_data['query'])
+
+
+class TypeaheadView(APIView):
+    """
+    Suggests the tags, articles and profiles having a word of their name, title or username starting
+    with the query, e.g. `?q=pyth&limit=5`, from the in-memory typeahead index. Requests are not
+    authenticated, so that they are answered without a database round trip.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        limit = request.query_params.get('limit', '5')
+        if not limit.isdigit() or not 1 <= int(limit) <= TOP_K:
+            raise ValidationError({'limit': f'Must be between 1 and {TOP_K}'})
+
+        query = request.query_params.get('q', '')
+        matches = typeahead_index.lookup(query, int(limit))
+        return Response(OrderedDict([('query', query)] + [
+            (f'{kind}s', [{'label': entry.label, 'url': get_entry_url(kind, entry)} for entry in matches[kind]])
+            for kind in KINDS
+        ]))
+
+
+class ExportView(APIView):
+    """
+    Streams a whole dataset to staff users as NDJSON or CSV, e.g. `?output=csv&gzip=1&after=1000`.
+    The export can be resumed with `after` and the id of the last row received.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            raise Http404
+
+        export_format = request.query_params.get('output', NDJSON)
+        if export_format not in FORMATS:
+            raise ValidationError({'output': f'Must be one of {", ".join(sorted(FORMATS))}'})
+
+        after = request.query_params.get('after')
+        if after is not None and not after.isdigit():
+            raise ValidationError({'after': 'Must be an id'})
+
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        filename = f'{dataset}.{export_format}'
+        response = StreamingHttpResponse(
+            stream_export(dataset, export_format, after=int(after) if after else None, compress=compress),
+            content_type='application/gzip' if compress else FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}{".gz" if compress else ""}"'
+        return response
@@ -0,0 +1,127 @@
+"""
+Async views for articles app
+
+These serve the read-only hot paths under ASGI when the `ASYNC_READ_VIEWS` setting is set. They reuse
+the sync views' logic, but run its blocking parts in the thread pool of `articulate.concurrency` and the
+independent queries of a page concurrently. Other requests are handed to the sync views.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from articulate.concurrency import SAFE_METHODS, load_user, run_sync
+
+from .conditional import get_not_modified_response, set_validators
+from .models import Article
+from .viewer_state import get_viewer_state
+from .views import ArticleDetailDisplay, ArticleDetailView, ArticleListView
+
+sync_article_list = sync_to_async(ArticleListView.as_view(), thread_sensitive=True)
+sync_article_detail = sync_to_async(ArticleDetailView.as_view(), thread_sensitive=True)
+
+
+def _render(view, context):
+    return view.render_to_response(context).render()
+
+
+def _prepare_article_list(view):
+    load_user(view.request)
+    view.record_tag_click()
+    return view.get_request_validators()
+
+
+def _get_article_list_context(view):
+    view.object_list = view.get_queryset()
+    return view.get_feed_context_data()
+
+
+async def article_list(request, **kwargs):
+    """
+    Async version of `ArticleListView`, fetching the page of the feed and the trending tags concurrently
+    """
+    if request.method not in SAFE_METHODS:
+        return await sync_article_list(request, **kwargs)
+
+    view = ArticleListView()
+    view.setup(request, **kwargs)
+    validators = await run_sync(_prepare_article_list, view)
+    if validators is not None:
+        response = get_not_modified_response(request, *validators)
+        if response is not None:
+            return response
+
+    context, popular_tags = await asyncio.gather(
+        run_sync(_get_article_list_context, view), run_sync(view.get_popular_tags)
+    )
+    context['popular_tags'] = popular_tags
+    response = await run_sync(_render, view, context)
+    if validators is not None and response.status_code == 200:
+        set_validators(response, *validators)
+    return response
+
+
+def _prepare_article_detail(view):
+    load_user(view.request)
+    return view.get_request_validators()
+
+
+def _get_article(view):
+    return view.get_object()
+
+
+async def _fetch_article(view, article):
+    return article if article is not None else await run_sync(_get_article, view)
+
+
+def _get_similar_articles(article_id):
+    return list(Article(pk=article_id).get_similar_articles())
+
+
+def _load_viewer_state(request, article_id):
+    get_viewer_state(request).load_articles([Article(pk=article_id)])
+
+
+def _render_article_detail(view, article, comments, comments_changes_cursor, similar_articles):
+    view.object = article
+    context = view.get_context_data(object=article, comments=comments, similar_articles=similar_articles,
+                                    comments_changes_cursor=comments_changes_cursor)
+    return _render(view, context)
+
+
+async def article_detail(request, article_slug):
+    """
+    Async version of `ArticleDetailView`, fetching the article, its page of comments and their changes
+    cursor, its similar articles and whether the viewer favorited it concurrently. Comments are still posted through the
+    sync view.
+    """
+    if request.method not in SAFE_METHODS:
+        return await sync_article_detail(request, article_slug=article_slug)
+
+    view = ArticleDetailDisplay()
+    view.setup(request, article_slug=article_slug)
+    validators = await run_sync(_prepare_article_detail, view)
+    article = None
+    if validators is not None:
+        response = get_not_modified_response(request, *validators)
+        if response is not None:
+            view.count_view()
+            return response
+        article_id = view.article_id
+    else:
+        # The id is only known from the validators, so without them the article is fetched first
+        article = await run_sync(_get_article, view)
+        article_id = article.pk
+
+    article, comments, comments_changes_cursor, similar_articles, _ = await asyncio.gather(
+        _fetch_article(view, article),
+        run_sync(view.get_comments_page, article_id),
+        run_sync(view.get_comments_changes_cursor, article_id),
+        run_sync(_get_similar_articles, article_id),
+        run_sync(_load_viewer_state, request, article_id),
+    )
+    response = await run_sync(_render_article_detail, view, article, comments, comments_changes_cursor,
+                              similar_articles)
+    view.count_view()
+    if validators is not None and response.status_code == 200:
+        set_validators(response, *validators)
+    return response
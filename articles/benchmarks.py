@@ -0,0 +1,343 @@
+"""
+Micro-benchmarks of the hot paths of articles app
+"""
+import math
+import statistics
+import time
+from fnmatch import fnmatch
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import helpers
+from .models import Article, Tag
+from .pagination import encode_changes_cursor
+from .typeahead import typeahead_index
+
+BENCHMARKS = {}
+
+SEARCH_QUERY = 'python'
+TRIGRAM_QUERY = 'pyhton'
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function receives a `BenchmarkContext` and returns the
+    callable to time, so that any preparation is left out of the measurements.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def rolled_back(function):
+    """
+    Wraps a callable writing to the database so that every run is rolled back, keeping the runs and
+    the dataset identical
+    """
+    def run():
+        with transaction.atomic():
+            function()
+            transaction.set_rollback(True)
+    return run
+
+
+class BenchmarkContext:
+    """
+    The objects the benchmarks run against, picked among the busiest of the dataset since these are
+    the ones whose pages are the slowest and the most requested
+    """
+
+    def __init__(self):
+        Profile = get_user_model()
+        self.user = Profile.objects.annotate(following=Count('followed_profiles')).order_by('-following').first()
+        self.article = Article.objects.order_by('-favorites_count', '-id').first()
+        self.tag = Tag.objects.annotate(articles_count=Count('articles')).order_by('-articles_count').first()
+        if self.user is None or self.article is None or self.tag is None:
+            raise ValueError('The database needs profiles, articles and tags to benchmark, see seed_bench')
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.anonymous_client = Client()
+
+    def get(self, path, client=None):
+        """
+        Returns a callable requesting a page, failing unless it is rendered successfully
+        """
+        client = client or self.anonymous_client
+
+        def request():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise AssertionError(f'GET {path} returned {response.status_code}')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return request
+
+
+@benchmark('helpers.get_articles_liked_and_authored_by_followed_profiles')
+def bench_get_articles_liked_and_authored_by_followed_profiles(context):
+    return lambda: list(helpers.get_articles_liked_and_authored_by_followed_profiles(context.user)[:20])
+
+
+@benchmark('helpers.get_feed_inbox_articles')
+def bench_get_feed_inbox_articles(context):
+    return lambda: list(helpers.get_feed_inbox_articles(context.user)[:20])
+
+
+@benchmark('helpers.get_recommended_articles')
+def bench_get_recommended_articles(context):
+    return lambda: list(helpers.get_recommended_articles(context.user)[:20])
+
+
+@benchmark('helpers.get_follower_ids')
+def bench_get_follower_ids(context):
+    return lambda: helpers.get_follower_ids([context.article.author_id])
+
+
+@benchmark('helpers.add_to_feed_inboxes')
+def bench_add_to_feed_inboxes(context):
+    follower_ids = helpers.get_follower_ids([context.article.author_id])
+    article_ids = list(Article.objects.filter(author_id=context.article.author_id).values_list('id', flat=True)[:20])
+    return rolled_back(lambda: helpers.add_to_feed_inboxes(follower_ids, Article.objects.filter(pk__in=article_ids)))
+
+
+@benchmark('helpers.prune_feed_inboxes')
+def bench_prune_feed_inboxes(context):
+    follower_ids = helpers.get_follower_ids([context.article.author_id])
+    return rolled_back(lambda: helpers.prune_feed_inboxes(follower_ids, [context.article.id]))
+
+
+@benchmark('helpers.backfill_feed_inbox')
+def bench_backfill_feed_inbox(context):
+    return rolled_back(lambda: helpers.backfill_feed_inbox(context.user))
+
+
+@benchmark('helpers.get_top_n_most_popular_tags')
+def bench_get_top_n_most_popular_tags(context):
+    return lambda: list(helpers.get_top_n_most_popular_tags(Article.objects.all(), 10))
+
+
+@benchmark('helpers.get_trending_tags')
+def bench_get_trending_tags(context):
+    return lambda: helpers.get_trending_tags(10)
+
+
+@benchmark('helpers.get_trending_tags[scoped]')
+def bench_get_trending_tags_scoped(context):
+    return lambda: helpers.get_trending_tags(10, context.tag.slug)
+
+
+@benchmark('helpers.refresh_tag_leaderboard')
+def bench_refresh_tag_leaderboard(context):
+    return rolled_back(helpers.refresh_tag_leaderboard)
+
+
+@benchmark('helpers.refresh_tag_leaderboard[rebuild]')
+def bench_refresh_tag_leaderboard_rebuild(context):
+    return rolled_back(lambda: helpers.refresh_tag_leaderboard(rebuild=True))
+
+
+@benchmark('helpers.get_articles_tagged_by_given_tag')
+def bench_get_articles_tagged_by_given_tag(context):
+    return lambda: list(helpers.get_articles_tagged_by_given_tag(Article.objects.all(), context.tag.slug)[:20])
+
+
+@benchmark('helpers.get_articles_matching_full_text_search')
+def bench_get_articles_matching_full_text_search(context):
+    return lambda: list(helpers.get_articles_matching_full_text_search(SEARCH_QUERY)[:20])
+
+
+@benchmark('helpers.format_headline')
+def bench_format_headline(context):
+    headlines = [article.headline for article in helpers.get_articles_matching_full_text_search(SEARCH_QUERY)[:20]]
+    return lambda: [helpers.format_headline(headline) for headline in headlines]
+
+
+@benchmark('helpers.update_search_vectors')
+def bench_update_search_vectors(context):
+    article_ids = list(Article.objects.order_by('-id').values_list('id', flat=True)[:100])
+    return rolled_back(lambda: helpers.update_search_vectors(article_ids))
+
+
+@benchmark('helpers.get_most_similar_articles_based_on_trigram_similarity')
+def bench_get_most_similar_articles_based_on_trigram_similarity(context):
+    return lambda: list(helpers.get_most_similar_articles_based_on_trigram_similarity(TRIGRAM_QUERY)[:20])
+
+
+@benchmark('helpers.refresh_related_articles')
+def bench_refresh_related_articles(context):
+    tag_ids = list(context.article.tags.values_list('id', flat=True))
+    return rolled_back(lambda: helpers.refresh_related_articles(context.article, tag_ids))
+
+
+@benchmark('helpers.rebuild_related_articles')
+def bench_rebuild_related_articles(context):
+    return rolled_back(helpers.rebuild_related_articles)
+
+
+@benchmark('helpers.get_related_ids_being_removed')
+def bench_get_related_ids_being_removed(context):
+    return lambda: helpers.get_related_ids_being_removed(
+        Article.tags.through, context.tag, True, None, 'article_id', 'tag_id')
+
+
+@benchmark('helpers.adjust_counter')
+def bench_adjust_counter(context):
+    return rolled_back(lambda: helpers.adjust_counter(
+        Article.objects.filter(pk=context.article.pk), 'favorites_count', 1))
+
+
+@benchmark('Article.get_similar_articles')
+def bench_article_get_similar_articles(context):
+    return lambda: list(context.article.get_similar_articles())
+
+
+@benchmark('Article.compute_similar_articles')
+def bench_article_compute_similar_articles(context):
+    return lambda: list(context.article.compute_similar_articles()[:10])
+
+
+@benchmark('views.article_list')
+def bench_views_article_list(context):
+    return context.get(reverse('articles:article_list'))
+
+
+@benchmark('views.article_list[search]')
+def bench_views_article_list_search(context):
+    return context.get(f'{reverse("articles:article_list")}?query={SEARCH_QUERY}')
+
+
+@benchmark('views.article_list_by_tag')
+def bench_views_article_list_by_tag(context):
+    return context.get(reverse('articles:article_list_by_tag', args=[context.tag.slug]))
+
+
+@benchmark('views.article_local_feed')
+def bench_views_article_local_feed(context):
+    return context.get(reverse('articles:article_local_feed'), context.client)
+
+
+@benchmark('views.article_detail')
+def bench_views_article_detail(context):
+    return context.get(reverse('articles:article_detail', args=[context.article.slug]))
+
+
+@benchmark('api.article_list')
+def bench_api_article_list(context):
+    return context.get(reverse('api_articles:article-list'))
+
+
+@benchmark('api.article_detail')
+def bench_api_article_detail(context):
+    return context.get(reverse('api_articles:article-detail', args=[context.article.pk]))
+
+
+@benchmark('api.article_comments')
+def bench_api_article_comments(context):
+    return context.get(reverse('api_articles:comment-list', args=[context.article.pk]))
+
+
+@benchmark('api.article_comment_changes')
+def bench_api_article_comment_changes(context):
+    # Polls from the newest comment, as clients do, so there are usually no changes
+    _, *position = helpers.get_comment_sync_markers(context.article.pk)
+    url = reverse('api_articles:comment-list', args=[context.article.pk])
+    return context.get(f'{url}?since={encode_changes_cursor(*position)}')
+
+
+@benchmark('api.article_search')
+def bench_api_article_search(context):
+    return context.get(f'{reverse("api_articles:article-search")}?query={SEARCH_QUERY}')
+
+
+@benchmark('typeahead.lookup')
+def bench_typeahead_lookup(context):
+    typeahead_index.reload()
+
+    def lookup():
+        for length in range(1, len(SEARCH_QUERY) + 1):
+            typeahead_index.lookup(SEARCH_QUERY[:length])
+    return lookup
+
+
+@benchmark('api.typeahead')
+def bench_api_typeahead(context):
+    typeahead_index.reload()
+    return context.get(f'{reverse("api_articles:typeahead")}?q={SEARCH_QUERY[:4]}')
+
+
+@benchmark('api.profile_list')
+def bench_api_profile_list(context):
+    return context.get(reverse('api_profiles:profile-list'))
+
+
+def percentile(values, percent):
+    """
+    Returns the given percentile of a list of values, interpolating between the closest ranks
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def measure(function, iterations):
+    """
+    Times a callable after a warm up run, then counts the queries of one more run
+
+    Args:
+        function (callable): Callable to measure
+        iterations (int): Number of timed runs
+
+    Returns:
+        dict: The median, 95th percentile, mean and fastest durations in milliseconds, and the queries
+        of a run
+    """
+    function()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    with CaptureQueriesContext(connection) as queries:
+        function()
+
+    return {
+        'p50_ms': round(statistics.median(durations), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'mean_ms': round(statistics.mean(durations), 3),
+        'min_ms': round(min(durations), 3),
+        'queries': len(queries),
+    }
+
+
+def run_benchmarks(iterations=20, patterns=None, log=None):
+    """
+    Runs the registered benchmarks against the current database
+
+    Args:
+        iterations (int): Number of timed runs of each benchmark
+        patterns (list): Shell style patterns of the names of the benchmarks to run, all if empty
+        log (callable): Called with the name and results of each benchmark
+
+    Returns:
+        dict: Results of each benchmark, keyed on its name
+    """
+    context = BenchmarkContext()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['*']):
+        for name, setup in BENCHMARKS.items():
+            if patterns and not any(fnmatch(name, pattern) for pattern in patterns):
+                continue
+            results[name] = measure(setup(context), iterations)
+            if log:
+                log(name, results[name])
+    return results
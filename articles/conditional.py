@@ -0,0 +1,181 @@
+"""
+Conditional responses for articles app
+"""
+import hashlib
+import uuid
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from articulate.replicas import delete_from_cache_on_commit
+
+from .fragments import get_articles_version, get_fragment_versions
+from .models import Article, ArticleRecommendation, FeedEntry, RelatedArticle
+
+ACTIVITY_VERSION_KEY = 'article-activity-version'
+LEADERBOARD_VERSION_KEY = 'tag-leaderboard-version'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        cache.set(key, version, timeout=None)
+    return version
+
+
+def get_activity_version():
+    """
+    Returns a version of the favorites and comments of all the articles, which changes whenever any
+    article is favorited, unfavorited or commented on
+    """
+    return _get_version(ACTIVITY_VERSION_KEY)
+
+
+def bump_activity_version():
+    cache.delete(ACTIVITY_VERSION_KEY)
+
+
+def get_leaderboard_version():
+    """
+    Returns a version of the trending tags leaderboard, which changes whenever it is refreshed
+    """
+    return _get_version(LEADERBOARD_VERSION_KEY)
+
+
+def bump_leaderboard_version():
+    delete_from_cache_on_commit([LEADERBOARD_VERSION_KEY])
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()[:24]
+
+
+def get_viewer_key(user):
+    return user.pk if user is not None and user.is_authenticated else 'anonymous'
+
+
+def get_article_validators(user, variant='', with_similar=False, **lookup):
+    """
+    Computes the validators of a response showing an article with a single query on the article's
+    change markers, i.e. its last update, last favorite or comment activity and counts, along with the
+    version of its cached fragments, which changes with its tags and author. Responses showing the similar
+    articles also depend on the article's entries in the related articles index and on their fragment
+    versions, rather than on every other article.
+
+    Args:
+        user (Profile): User the response is rendered for
+        variant (str): Anything else the response depends on, e.g. its format
+        with_similar (bool): Whether the response shows the similar articles
+        **lookup: Lookup of the article, e.g. `slug=...`
+
+    Returns:
+        tuple: The id of the article, its ETag and its last modification as a timestamp, or None if
+        there is no such article
+    """
+    markers = Article.objects.filter(**lookup).values_list(
+        'pk', 'updated_at', 'last_activity_at', 'comments_count', 'favorites_count').first()
+    if markers is None:
+        return None
+
+    pk, updated_at, last_activity_at = markers[:3]
+    similar_ids = list(RelatedArticle.objects.filter(article_id=pk).order_by('rank').values_list(
+        'related_article_id', flat=True)) if with_similar else []
+    versions = get_fragment_versions([pk, *similar_ids])
+    last_modified = max(filter(None, (updated_at, last_activity_at)))
+    etag = make_etag('article', variant, *markers, versions[pk], *(versions[similar_id] for similar_id in similar_ids),
+                     get_viewer_key(user))
+    return pk, etag, int(last_modified.timestamp())
+
+
+def get_feed_etag(user, variant='', local=False, recommended=False, with_activity=False, with_trending_tags=False):
+    """
+    Computes the ETag of a page of a feed from the newest article in the feed and the version of the
+    articles as a whole, which changes whenever any article is edited, retagged or deleted. The local
+    feed uses the newest entry and size of the user's inbox instead, since favorites add older articles
+    to it, and the recommended feed the newest entry and size of the user's recommendations, which are
+    replaced whenever they are refreshed. Pages showing the trending tags also depend on the last refresh
+    of the leaderboard.
+
+    Args:
+        user (Profile): User the page is rendered for
+        variant (str): Anything else the page depends on, e.g. its path and query string
+        local (bool): Whether the page is of the user's local feed
+        recommended (bool): Whether the page is of the articles recommended to the user
+        with_activity (bool): Whether the page shows the favorites and comments counts of the articles
+        with_trending_tags (bool): Whether the page shows the trending tags
+
+    Returns:
+        str: ETag of the page
+    """
+    if local:
+        marker = FeedEntry.objects.filter(owner=user).aggregate(newest=Max('id'), size=Count('id'))
+    elif recommended:
+        marker = ArticleRecommendation.objects.filter(owner=user).aggregate(newest=Max('id'), size=Count('id'))
+    else:
+        marker = Article.objects.aggregate(newest=Max('created_at'))
+
+    activity = get_activity_version() if with_activity else ''
+    leaderboard = get_leaderboard_version() if with_trending_tags else ''
+    return make_etag('feed', variant, marker['newest'], marker.get('size'), get_articles_version(), activity,
+                     leaderboard, get_viewer_key(user))
+
+
+def get_not_modified_response(request, etag=None, last_modified=None):
+    """
+    Returns a 304 response if the validators sent by the client match the given ones, or a 412 response
+    if a precondition failed, and None otherwise
+
+    Args:
+        request (HttpRequest): Current request
+        etag (str): Unquoted ETag of the response
+        last_modified (int): Timestamp of the last modification of the response
+    """
+    return get_conditional_response(request, etag=quote_etag(etag) if etag else None, last_modified=last_modified)
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """
+    Sets the `ETag` and `Last-Modified` headers of a response
+    """
+    if etag and not response.has_header('ETag'):
+        response['ETag'] = quote_etag(etag)
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Mixin for views answering conditional GET requests with a 304 response before doing any of the
+    work of rendering the page, when the validators computed by `get_validators` match the client's.
+    Pages with pending messages are always rendered since the messages are not part of the validators.
+    """
+
+    def get_validators(self):
+        """
+        Returns the ETag and the last modification timestamp of the page, either being None if unknown,
+        or None if the page cannot be validated
+        """
+        return None
+
+    def get_request_validators(self):
+        """
+        Returns the validators of the page, or None if it cannot be validated or has pending messages
+        """
+        return None if len(get_messages(self.request)) else self.get_validators()
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_request_validators()
+        if validators is not None:
+            response = get_not_modified_response(request, *validators)
+            if response is not None:
+                return response
+
+        response = super().get(request, *args, **kwargs)
+        if validators is not None and response.status_code == 200:
+            set_validators(response, *validators)
+        return response
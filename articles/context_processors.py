@@ -0,0 +1,20 @@
+"""
+Context processors for articles app
+"""
+from django.conf import settings
+
+from .viewer_state import get_viewer_state
+
+
+def viewer_state(request):
+    """
+    Adds the request scoped viewer state to the context as `viewer`
+    """
+    return {'viewer': get_viewer_state(request)}
+
+
+def fragment_cache(request):
+    """
+    Adds the timeout of the cached article fragments to the context as `fragment_cache_timeout`
+    """
+    return {'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT}
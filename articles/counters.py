@@ -0,0 +1,159 @@
+"""
+Buffered counters for articles app
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+from django.db.models import F
+
+from articulate.objectcache import invalidate_cached_objects
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Accumulates high volume counter increments and many-to-many additions in process, and periodically
+    flushes them to the database as batched `F()` updates and bulk inserts. Increments to the same
+    counter are merged, so a flush costs one update per distinct amount per counter column, however
+    many increments were buffered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._increments = defaultdict(int)
+        self._relations = defaultdict(set)
+        self._flusher = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+
+    def increment(self, model, pk, field, amount=1):
+        """
+        Buffers an increment of the counter column `field` of the `model` object with primary key `pk`
+        """
+        with self._lock:
+            self._increments[(model, field, pk)] += amount
+        self._ensure_flusher()
+
+    def add_relation(self, through, **columns):
+        """
+        Buffers the addition of a row to the through model of a many-to-many relation, given as the values
+        of its columns, e.g. `add_relation(Tag.clicked_by_profile.through, tag_id=1, profile_id=2)`.
+        Rows that already exist are skipped on flush.
+        """
+        with self._lock:
+            self._relations[through].add(tuple(sorted(columns.items())))
+        self._ensure_flusher()
+
+    def flush(self):
+        """
+        Writes all the buffered increments and relations to the database, in separate transactions. If
+        writing fails on a connection or operational error, the batch is put back in the buffer for the
+        next flush. Relation rows whose related objects no longer exist are dropped, and any other
+        failure drops the batch, so that a single bad row can not block every later flush.
+        """
+        with self._lock:
+            increments, self._increments = self._increments, defaultdict(int)
+            relations, self._relations = self._relations, defaultdict(set)
+
+        retry_error = None
+        if increments:
+            retry_error = self._write(self._write_increments, increments, self._restore_increments)
+        if relations:
+            retry_error = self._write(self._write_relations, relations, self._restore_relations) or retry_error
+        if retry_error is not None:
+            raise retry_error
+
+    @staticmethod
+    def _write(write, batch, restore):
+        """
+        Writes the batch, restoring it in the buffer on retryable errors, which are returned, and logging
+        and dropping it on any other error
+        """
+        try:
+            write(batch)
+        except (OperationalError, InterfaceError) as error:
+            restore(batch)
+            return error
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Dropped %s buffered counter writes that can not be flushed', len(batch))
+        return None
+
+    @staticmethod
+    def _write_increments(increments):
+        updates = defaultdict(list)
+        for (model, field, pk), amount in increments.items():
+            updates[(model, field, amount)].append(pk)
+
+        with transaction.atomic():
+            for (model, field, amount), pks in updates.items():
+                model.objects.filter(pk__in=pks).update(**{field: F(field) + amount})
+                invalidate_cached_objects(model, pks)
+
+    @staticmethod
+    def _write_relations(relations):
+        for through, rows in relations.items():
+            rows = _existing_relation_rows(through, rows)
+            try:
+                with transaction.atomic():
+                    through.objects.bulk_create(
+                        [through(**dict(row)) for row in rows], batch_size=1000, ignore_conflicts=True
+                    )
+            except IntegrityError:
+                logger.exception('Dropped %s buffered %s rows referencing deleted objects',
+                                 len(rows), through.__name__)
+
+    def _restore_increments(self, increments):
+        with self._lock:
+            for key, amount in increments.items():
+                self._increments[key] += amount
+
+    def _restore_relations(self, relations):
+        with self._lock:
+            for through, rows in relations.items():
+                self._relations[through] |= rows
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            with self._lock:
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._flush_periodically, name='counter-flusher',
+                                                     daemon=True)
+                    self._flusher.start()
+
+    def _flush_periodically(self):
+        stopped = threading.Event()
+        while not stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Failed to flush buffered counters')
+            finally:
+                # Keeps the connection between flushes, unless it broke or outlived CONN_MAX_AGE
+                close_old_connections()
+
+
+def _existing_relation_rows(through, rows):
+    """
+    Returns the rows of the through model whose foreign keys all point to objects that still exist
+    """
+    rows = [dict(row) for row in rows]
+    for field in through._meta.concrete_fields:
+        if not field.many_to_one:
+            continue
+        ids = {row[field.attname] for row in rows if field.attname in row}
+        if not ids:
+            continue
+        existing = set(field.related_model._base_manager.filter(pk__in=ids).values_list('pk', flat=True))
+        rows = [row for row in rows if row.get(field.attname, None) is None or row[field.attname] in existing]
+    return [tuple(sorted(row.items())) for row in rows]
+
+
+counter_buffer = CounterBuffer()
+atexit.register(counter_buffer.flush)
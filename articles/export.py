@@ -0,0 +1,144 @@
+"""
+Streaming export for articles app
+"""
+import csv
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+
+from .models import Article, Comment, Tag
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv',
+}
+
+CHUNK_SIZE = 2000
+
+
+def get_article_rows():
+    tag_names = Tag.objects.filter(articles=OuterRef('pk')).values('articles').annotate(
+        names=ArrayAgg('name', ordering='name')).values('names')
+    return Article.objects.annotate(author_username=Subquery(
+        get_user_model().objects.filter(pk=OuterRef('author_id')).values('username')
+    ), tag_names=Subquery(tag_names)).values_list(
+        'id', 'slug', 'title', 'description', 'content', 'cover_image', 'author_username', 'tag_names',
+        'favorites_count', 'comments_count', 'view_count', 'created_at', 'updated_at'
+    )
+
+
+def get_tag_rows():
+    return Tag.objects.values_list('id', 'name', 'slug', 'click_count')
+
+
+def get_comment_rows():
+    return Comment.objects.values_list('id', 'article_id', 'author_id', 'body', 'active', 'created_at', 'updated_at')
+
+
+def get_favorite_rows():
+    return get_user_model().favorite_articles.through.objects.values_list('id', 'profile_id', 'article_id')
+
+
+def get_follow_rows():
+    return get_user_model().followed_profiles.through.objects.values_list('id', 'from_profile_id', 'to_profile_id')
+
+
+DATASETS = {
+    'articles': get_article_rows,
+    'tags': get_tag_rows,
+    'comments': get_comment_rows,
+    'favorites': get_favorite_rows,
+    'follows': get_follow_rows,
+}
+
+
+def get_rows(dataset, after=None, chunk_size=CHUNK_SIZE):
+    """
+    Lazily reads the rows of a dataset in increasing id order through a server-side cursor, fetching
+    `chunk_size` rows at a time so that memory stays constant whatever the size of the table
+
+    Args:
+        dataset (str): Name of the dataset, one of `DATASETS`
+        after (int): Only read the rows with a greater id, to resume an interrupted export
+        chunk_size (int): Number of rows to fetch from the cursor at a time
+
+    Returns:
+        tuple: The names of the columns and an iterator over the rows
+    """
+    rows = DATASETS[dataset]()
+    if after is not None:
+        rows = rows.filter(id__gt=after)
+    rows = rows.order_by('id')
+    return list(rows._fields), rows.iterator(chunk_size=chunk_size)
+
+
+class _Line:
+    """
+    File-like object that returns what is written to it instead of buffering it
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_export(dataset, export_format=NDJSON, after=None, compress=False, chunk_size=CHUNK_SIZE):
+    """
+    Streams a dataset as NDJSON, one object per row, or as CSV with a header, optionally gzipped.
+    List values such as the tag names of articles are written as JSON lists in NDJSON and as comma
+    separated values in CSV.
+
+    Args:
+        dataset (str): Name of the dataset, one of `DATASETS`
+        export_format (str): Either `NDJSON` or `CSV`
+        after (int): Only export the rows with a greater id, to resume an interrupted export
+        compress (bool): Whether to gzip the stream
+        chunk_size (int): Number of rows to read and write at a time
+
+    Yields:
+        bytes: Successive chunks of the export
+    """
+    columns, rows = get_rows(dataset, after, chunk_size)
+    chunks = _encode_chunks(columns, rows, export_format, chunk_size)
+
+    if not compress:
+        yield from chunks
+        return
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _encode_chunks(columns, rows, export_format, chunk_size):
+    if export_format == CSV:
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns).encode()
+        encode = writer.writerow
+        columns_to_join = [index for index, column in enumerate(columns) if column == 'tag_names']
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        columns_to_join = []
+
+        def encode(row):
+            return encoder.encode(dict(zip(columns, row))) + '\n'
+
+    lines = []
+    for row in rows:
+        if columns_to_join:
+            row = list(row)
+            for index in columns_to_join:
+                row[index] = ','.join(row[index] or [])
+        lines.append(encode(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines).encode()
+            lines = []
+    if lines:
+        yield ''.join(lines).encode()
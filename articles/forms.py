@@ -4,6 +4,7 @@ Forms for the articles app
 from django import forms
 from django.db.models import Q
 
+from .helpers import refresh_related_articles
 from .models import Article, Comment, Tag
 
 
@@ -52,9 +53,10 @@ class ArticleForm(forms.ModelForm):
     def save(self, commit=True):
         """
         Override save method to convert all the tag name strings into Tag objects and add it to m2m field with the
-        current object
+        current object. The related articles index is refreshed if the set of tags changed.
         """
         article_instance = super().save(commit=False)
+        old_tag_ids = set(article_instance.tags.values_list('id', flat=True)) if article_instance.pk else set()
         if commit:
             article_instance.author = self.request.user
             article_instance.save()
@@ -68,6 +70,11 @@ class ArticleForm(forms.ModelForm):
                 article_instance.tags.add(tag)
 
         article_instance.tags.remove(*article_instance.tags.filter(~Q(name__in=tag_names)))
+
+        changed_tag_ids = old_tag_ids ^ set(article_instance.tags.values_list('id', flat=True))
+        if changed_tag_ids:
+            refresh_related_articles(article_instance, changed_tag_ids)
+
         return article_instance
 
 
@@ -105,7 +112,20 @@ class SearchForm(forms.Form):
     """
     Form for searching
     """
+    MODE_FULL_TEXT = 'full_text'
+    MODE_FUZZY = 'fuzzy'
+    MODE_CHOICES = (
+        (MODE_FULL_TEXT, 'Full text'),
+        (MODE_FUZZY, 'Similar titles'),
+    )
+
     query = forms.CharField(
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search articles, profiles and more...'}),
         label='',
     )
+    mode = forms.ChoiceField(
+        choices=MODE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label='',
+    )
@@ -0,0 +1,92 @@
+"""
+Versioned fragment caching for articles app
+"""
+import uuid
+
+from django.core.cache import cache
+
+from articulate.replicas import delete_from_cache_on_commit
+
+from .rendering import get_renderer_version
+
+VERSION_KEY = 'article-fragment-version:{}'
+ALL_ARTICLES_VERSION_KEY = 'article-fragment-version:all'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def get_fragment_versions(article_ids):
+    """
+    Returns the versions the cached fragments of the given articles are keyed on, in a single cache
+    round trip. Articles without a version, because they were changed or their version was evicted,
+    get a new random one so that fragments cached under a previous version are never served again.
+    The renderer version is part of every version since fragments include the rendered content.
+
+    Args:
+        article_ids (Iterable[int]): Ids of the articles
+
+    Returns:
+        dict: Version of each article by id
+    """
+    keys = {VERSION_KEY.format(article_id): article_id for article_id in article_ids}
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+
+    renderer_version = get_renderer_version()
+    return {keys[key]: f'{version}.{renderer_version}' for key, version in versions.items()}
+
+
+def load_fragment_versions(articles):
+    """
+    Resolves the fragment versions of all the given articles at once, e.g. of a whole page of a feed,
+    so that rendering their cached fragments costs a single cache round trip
+    """
+    articles = [article for article in articles if not hasattr(article, '_fragment_version')]
+    versions = get_fragment_versions(article.pk for article in articles)
+    for article in articles:
+        article._fragment_version = versions[article.pk]
+
+
+def get_fragment_version(article):
+    if not hasattr(article, '_fragment_version'):
+        load_fragment_versions([article])
+    return article._fragment_version
+
+
+def get_articles_version():
+    """
+    Returns a version of the articles as a whole, which changes whenever the fragments of any article
+    are invalidated
+    """
+    version = cache.get(ALL_ARTICLES_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        cache.set(ALL_ARTICLES_VERSION_KEY, version, timeout=None)
+    return f'{version}.{get_renderer_version()}'
+
+
+def bump_articles_version():
+    """
+    Invalidates what is cached on the articles as a whole, like search results, once the change is
+    committed, for changes that do not go through the model signals such as bulk inserts
+    """
+    delete_from_cache_on_commit([ALL_ARTICLES_VERSION_KEY])
+
+
+def bump_fragment_versions(article_ids):
+    """
+    Invalidates every cached fragment of the given articles by dropping their versions, along with
+    the version of the articles as a whole, once the change is committed. The versions are dropped again
+    once the replicas caught up with it, since pages read from them in the meantime may have cached
+    fragments of the articles before the change under new versions.
+
+    Args:
+        article_ids (Iterable[int]): Ids of the changed articles
+    """
+    delete_from_cache_on_commit([VERSION_KEY.format(article_id) for article_id in article_ids] +
+                                [ALL_ARTICLES_VERSION_KEY])
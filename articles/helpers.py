@@ -1,10 +1,31 @@
 """
 Helpers for articles app
 """
-from django.contrib.postgres.search import TrigramSimilarity
-from django.db.models import Count, Q
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
 
-from articles.models import Article, Tag
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery, SearchRank, SearchVector,
+                                            TrigramSimilarity)
+from django.db import transaction
+from django.db.models import Count, Exists, F, Func, IntegerField, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.html import escape
+
+from articles.conditional import bump_leaderboard_version
+from articles.models import (Article, ArticleRecommendation, Comment, CommentTombstone, FeedEntry, RelatedArticle, Tag,
+                             TagPopularity)
+
+HEADLINE_START_SEL = '\x02'
+HEADLINE_STOP_SEL = '\x03'
+
+MIN_SCOPED_TAG_POPULARITY = 1e-3
 
 
 def get_articles_liked_and_authored_by_followed_profiles(user):
@@ -26,6 +47,119 @@ def get_articles_liked_and_authored_by_followed_profiles(user):
     ).distinct().order_by('-created_at')
 
 
+def get_feed_inbox_articles(user):
+    """
+    Given a user, returns the articles in the user's local feed inbox, most recent first. This is
+    the precomputed equivalent of `get_articles_liked_and_authored_by_followed_profiles`. The articles
+    are annotated with the `feed_created_at` of their inbox entry, on which the inbox is indexed.
+
+    Args:
+        user (Profile): User for which to get the feed articles
+
+    Returns:
+        QuerySet: A QuerySet containing articles
+    """
+    return Article.objects.select_related('author').prefetch_related('tags').filter(
+        feed_entries__owner=user
+    ).annotate(feed_created_at=F('feed_entries__article_created_at')).order_by('-feed_created_at', '-id')
+
+
+def get_recommended_articles(user):
+    """
+    Given a user, returns the articles recommended to the user, best scored first, as precomputed by
+    `refresh_recommendations`. The articles are annotated with the `recommendation_score` they are
+    ranked on, on which the recommendations are indexed.
+
+    Args:
+        user (Profile): User for which to get the recommended articles
+
+    Returns:
+        QuerySet: A QuerySet containing articles
+    """
+    return Article.objects.select_related('author').prefetch_related('tags').filter(
+        recommendations__owner=user
+    ).annotate(recommendation_score=F('recommendations__score')).order_by('-recommendation_score', '-id')
+
+
+def drop_recommendations(owner_ids, article_ids):
+    """
+    Removes the given articles from the recommendations of every owner, e.g. once they favorited them
+    """
+    ArticleRecommendation.objects.filter(owner_id__in=owner_ids, article_id__in=article_ids).delete()
+
+
+def get_follower_ids(profile_ids):
+    """
+    Given some profile ids, returns the ids of all the profiles following any of them
+
+    Args:
+        profile_ids (Iterable[int]): Ids of the followed profiles
+
+    Returns:
+        set: Ids of the followers
+    """
+    follows = get_user_model().followed_profiles.through.objects
+    return set(follows.filter(to_profile_id__in=profile_ids).values_list('from_profile_id', flat=True))
+
+
+def add_to_feed_inboxes(owner_ids, articles):
+    """
+    Adds the given articles to the local feed inbox of every owner, skipping the ones already there
+
+    Args:
+        owner_ids (Iterable[int]): Ids of the profiles whose inboxes to write to
+        articles (QuerySet): QuerySet containing the articles to add
+    """
+    owner_ids = list(owner_ids)
+    if not owner_ids:
+        return
+
+    FeedEntry.objects.bulk_create([
+        FeedEntry(owner_id=owner_id, article_id=article_id, article_created_at=created_at)
+        for article_id, created_at in articles.values_list('id', 'created_at')
+        for owner_id in owner_ids
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+def prune_feed_inboxes(owner_ids, article_ids):
+    """
+    Removes the given articles from the local feed inbox of every owner unless they are still
+    authored or favorited by a profile the owner follows, or favorited by the owner, in a single
+    DELETE whatever the number of owners
+
+    Args:
+        owner_ids (Iterable[int]): Ids of the profiles whose inboxes to prune
+        article_ids (Iterable[int]): Ids of the articles that might not belong in the inboxes anymore
+    """
+    Profile = get_user_model()
+    follows = Profile.followed_profiles.through.objects
+    favorites = Profile.favorite_articles.through.objects
+    followed_ids = follows.filter(from_profile_id=OuterRef(OuterRef('owner_id'))).values('to_profile_id')
+
+    FeedEntry.objects.filter(owner_id__in=owner_ids, article_id__in=article_ids).filter(
+        ~Exists(follows.filter(from_profile_id=OuterRef('owner_id'), to_profile_id=OuterRef('article__author_id'))),
+        ~Exists(favorites.filter(article_id=OuterRef('article_id'), profile_id=OuterRef('owner_id'))),
+        ~Exists(favorites.filter(article_id=OuterRef('article_id'), profile_id__in=followed_ids)),
+    ).delete()
+
+
+def backfill_feed_inbox(user):
+    """
+    Rebuilds the local feed inbox of a user from the articles authored or favorited by the followed profiles
+
+    Args:
+        user (Profile): User whose inbox to rebuild
+
+    Returns:
+        int: Number of entries in the rebuilt inbox
+    """
+    with transaction.atomic():
+        FeedEntry.objects.filter(owner=user).delete()
+        add_to_feed_inboxes([user.id], get_articles_liked_and_authored_by_followed_profiles(user))
+
+    return FeedEntry.objects.filter(owner=user).count()
+
+
 def get_top_n_most_popular_tags(articles, top_n):
     """
     Given a queryset of Articles, returns the top_n most popular tags in the articles
@@ -44,6 +178,111 @@ def get_top_n_most_popular_tags(articles, top_n):
     return tags_sorted_on_popularity[:top_n + 1]
 
 
+def get_trending_tags(top_n, scope_slug=None):
+    """
+    Returns the top_n most popular tags from the precomputed leaderboard, either of the global feed or
+    of the feed filtered by the tag with slug `scope_slug`
+
+    Args:
+        top_n (int): Top n tags to return
+        scope_slug (str): Slug of the tag filtering the feed, if any
+
+    Returns:
+        list: The top_n tags, most popular first
+    """
+    scores = TagPopularity.objects.select_related('tag')
+    if scope_slug:
+        scores = scores.filter(scope__slug=scope_slug)
+    else:
+        scores = scores.filter(scope__isnull=True)
+
+    return [score.tag for score in scores.order_by('-score')[:top_n]]
+
+
+def refresh_tag_leaderboard(rebuild=False):
+    """
+    Incrementally refreshes the tag popularity leaderboard. Every score decays exponentially with the
+    `TAG_POPULARITY_HALF_LIFE_DAYS` half-life since its last refresh, then the articles created since
+    then are added with a weight decayed by their age, along with the clicks since then weighted by
+    `TAG_POPULARITY_CLICK_WEIGHT`. A tag scores within the scope of another tag for the articles tagged
+    by both of them.
+
+    Args:
+        rebuild (bool): Whether to discard the current scores and recompute them from all the articles
+
+    Returns:
+        int: Number of scores in the leaderboard
+    """
+    now = timezone.now()
+    decay_rate = math.log(2) / (settings.TAG_POPULARITY_HALF_LIFE_DAYS * 24 * 3600)
+
+    def decay(since):
+        return math.exp(-decay_rate * max((now - since).total_seconds(), 0))
+
+    with transaction.atomic():
+        if rebuild:
+            TagPopularity.objects.all().delete()
+
+        scores = {(score.tag_id, score.scope_id): score for score in TagPopularity.objects.select_for_update()}
+        last_refreshed_at = max((score.refreshed_at for score in scores.values()), default=None)
+
+        def score_for(tag_id, scope_id):
+            if (tag_id, scope_id) not in scores:
+                scores[(tag_id, scope_id)] = TagPopularity(tag_id=tag_id, scope_id=scope_id, refreshed_at=now)
+            return scores[(tag_id, scope_id)]
+
+        for score in scores.values():
+            score.score *= decay(score.refreshed_at)
+
+        new_articles = Article.objects.all()
+        if last_refreshed_at:
+            new_articles = new_articles.filter(created_at__gt=last_refreshed_at)
+
+        tags_by_article = defaultdict(list)
+        for article_id, tag_id, created_at in Article.tags.through.objects.filter(
+            article__in=new_articles
+        ).values_list('article_id', 'tag_id', 'article__created_at').iterator():
+            tags_by_article[(article_id, created_at)].append(tag_id)
+
+        for (_, created_at), tag_ids in tags_by_article.items():
+            weight = decay(created_at)
+            for tag_id in tag_ids:
+                score_for(tag_id, None).score += weight
+                for scope_id in tag_ids:
+                    score_for(tag_id, scope_id).score += weight
+
+        scoped_scores = defaultdict(list)
+        for (tag_id, scope_id), score in scores.items():
+            if scope_id is not None:
+                scoped_scores[tag_id].append(score)
+
+        for tag_id, click_count in Tag.objects.values_list('id', 'click_count'):
+            global_score = score_for(tag_id, None)
+            clicks = click_count - global_score.click_count_snapshot
+            if clicks > 0:
+                for score in [global_score] + scoped_scores[tag_id]:
+                    score.score += clicks * settings.TAG_POPULARITY_CLICK_WEIGHT
+            global_score.click_count_snapshot = click_count
+
+        stale = [score for score in scores.values() if score.scope_id is not None and score.pk
+                 and score.score < MIN_SCOPED_TAG_POPULARITY]
+        TagPopularity.objects.filter(pk__in=[score.pk for score in stale]).delete()
+        for score in stale:
+            del scores[(score.tag_id, score.scope_id)]
+
+        for score in scores.values():
+            score.refreshed_at = now
+
+        TagPopularity.objects.bulk_update(
+            [score for score in scores.values() if score.pk], ['score', 'click_count_snapshot', 'refreshed_at'],
+            batch_size=1000
+        )
+        TagPopularity.objects.bulk_create([score for score in scores.values() if not score.pk], batch_size=1000)
+
+    bump_leaderboard_version()
+    return len(scores)
+
+
 def get_articles_tagged_by_given_tag(articles, tag_slug):
     """
     Given a queryset of articles, return only the articles tagged by a Tag with slug, `tag_slug`
@@ -58,9 +297,70 @@ def get_articles_tagged_by_given_tag(articles, tag_slug):
     return articles.filter(tags__slug=tag_slug)
 
 
+def get_articles_matching_full_text_search(query):
+    """
+    Given a query, returns the articles matching it in their title, description, content or tag names,
+    ranked by relevance and annotated with a `headline` snippet of the content in which the matched
+    terms are enclosed in `HEADLINE_START_SEL` and `HEADLINE_STOP_SEL`
+
+    Args:
+        query (str): Query to search articles for, in web search syntax
+
+    Returns:
+        QuerySet: A queryset of matching articles
+    """
+    search_query = SearchQuery(query, config=settings.SEARCH_CONFIG, search_type='websearch')
+
+    return Article.objects.select_related('author').prefetch_related('tags').filter(
+        search_vector=search_query
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        headline=SearchHeadline(
+            'content', search_query, config=settings.SEARCH_CONFIG, start_sel=HEADLINE_START_SEL,
+            stop_sel=HEADLINE_STOP_SEL, max_words=35, min_words=15,
+        ),
+    ).order_by('-rank', '-created_at')
+
+
+def format_headline(headline):
+    """
+    Given a headline annotated by `get_articles_matching_full_text_search`, returns it as HTML with the
+    matched terms highlighted. The rest of the headline is escaped since it comes from the raw content.
+
+    Args:
+        headline (str): Headline snippet
+
+    Returns:
+        str: HTML of the highlighted headline
+    """
+    return escape(headline).replace(HEADLINE_START_SEL, '<mark>').replace(HEADLINE_STOP_SEL, '</mark>')
+
+
+def update_search_vectors(article_ids):
+    """
+    Recomputes the stored search vector of the given articles, weighting the title above the tag names
+    and description, and those above the content
+
+    Args:
+        article_ids (Iterable[int]): Ids of the articles to update
+    """
+    tag_names = Tag.objects.filter(articles=OuterRef('pk')).values('articles').annotate(
+        names=StringAgg('name', delimiter=' ')).values('names')
+
+    Article.objects.filter(id__in=list(article_ids)).update(search_vector=(
+        SearchVector('title', weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(tag_names), Value('')), weight='B', config=settings.SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=settings.SEARCH_CONFIG)
+        + SearchVector('content', weight='C', config=settings.SEARCH_CONFIG)
+    ))
+
+
 def get_most_similar_articles_based_on_trigram_similarity(query):
     """
-    Given a query, returns all the articles based on trigram similarity
+    Given a query, returns all the articles whose title is similar to it based on trigram similarity.
+    Matching goes through the trigram similarity operator so that the trigram index on the title is
+    used, the threshold being the `TRIGRAM_SIMILARITY_THRESHOLD` setting, and only the matching
+    articles are ranked.
 
     Args:
         query (str): Query to search articles for
@@ -68,5 +368,234 @@ def get_most_similar_articles_based_on_trigram_similarity(query):
     Returns:
         QuerySet: A queryset of similar articles
     """
-    return Article.objects.annotate(similarity=TrigramSimilarity('title', query)).filter(
-        similarity__gt=0.1).order_by('-similarity')
+    return Article.objects.select_related('author').prefetch_related('tags').filter(
+        title__trigram_similar=query
+    ).annotate(similarity=TrigramSimilarity('title', query)).order_by('-similarity', '-created_at')
+
+
+def refresh_related_articles(article, changed_tag_ids):
+    """
+    Incrementally refreshes the related articles index after the tags of `article` changed.
+    The entries of `article` itself are always recomputed, and so are the entries of any other
+    article whose shared tag count with `article` changed and that either lists `article` already
+    or could now do so.
+
+    Args:
+        article (Article): Article whose tags were changed
+        changed_tag_ids (Iterable[int]): Ids of the tags that were added to or removed from the article
+    """
+    article_tags = Article.tags.through.objects.exclude(article_id=article.id)
+    candidate_ids = set(article_tags.filter(tag_id__in=changed_tag_ids).values_list('article_id', flat=True))
+
+    shared_tags = dict(article_tags.filter(
+        tag_id__in=article.tags.values_list('id', flat=True), article_id__in=candidate_ids
+    ).values('article_id').annotate(shared=Count('id')).values_list('article_id', 'shared'))
+
+    listed_in = set(RelatedArticle.objects.filter(
+        related_article=article, article_id__in=candidate_ids).values_list('article_id', flat=True))
+
+    thresholds = {
+        entry['article_id']: (entry['lowest'], entry['entries'])
+        for entry in RelatedArticle.objects.filter(article_id__in=list(shared_tags)).values('article_id').annotate(
+            lowest=Min('shared_tags'), entries=Count('id'))
+    }
+
+    to_refresh = {article.id} | listed_in
+    for article_id, shared in shared_tags.items():
+        lowest, entries = thresholds.get(article_id, (0, 0))
+        if entries < RelatedArticle.TOP_K or shared >= lowest:
+            to_refresh.add(article_id)
+
+    with transaction.atomic():
+        RelatedArticle.objects.filter(article_id__in=to_refresh).delete()
+        RelatedArticle.objects.bulk_create([
+            RelatedArticle(article_id=article_id, related_article_id=similar.id, shared_tags=similar.same_tags,
+                           rank=rank)
+            for article_id in to_refresh
+            for rank, similar in enumerate(
+                Article(id=article_id).compute_similar_articles()[:RelatedArticle.TOP_K]
+            )
+        ])
+
+
+def rebuild_related_articles(batch_size=1000):
+    """
+    Rebuilds the whole related articles index from scratch using an in-memory tag co-occurrence
+    count, ties in the shared tag count being broken by the most recent article first
+
+    Args:
+        batch_size (int): Number of index entries to insert per query
+
+    Returns:
+        int: Number of index entries written
+    """
+    tags_by_article = defaultdict(list)
+    articles_by_tag = defaultdict(list)
+    for article_id, tag_id in Article.tags.through.objects.values_list('article_id', 'tag_id').iterator():
+        tags_by_article[article_id].append(tag_id)
+        articles_by_tag[tag_id].append(article_id)
+
+    created_at = dict(Article.objects.filter(id__in=tags_by_article).values_list('id', 'created_at'))
+
+    def entries():
+        for article_id, tag_ids in tags_by_article.items():
+            co_occurrences = Counter(
+                other_id for tag_id in tag_ids for other_id in articles_by_tag[tag_id] if other_id != article_id
+            )
+            most_similar = heapq.nlargest(
+                RelatedArticle.TOP_K, co_occurrences.items(), key=lambda item: (item[1], created_at[item[0]])
+            )
+            for rank, (related_id, shared) in enumerate(most_similar):
+                yield RelatedArticle(article_id=article_id, related_article_id=related_id, shared_tags=shared,
+                                     rank=rank)
+
+    written = 0
+    batch = []
+    with transaction.atomic():
+        RelatedArticle.objects.all().delete()
+        for entry in entries():
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                written += len(RelatedArticle.objects.bulk_create(batch))
+                batch = []
+        written += len(RelatedArticle.objects.bulk_create(batch))
+
+    return written
+
+
+def get_related_ids_being_removed(through, instance, reverse, pk_set, source_field, target_field):
+    """
+    Given the arguments of a `pre_remove` or `pre_clear` m2m_changed signal, returns the ids of the
+    objects on the other side of the relation that are actually related to `instance`, and so will
+    really be removed. Unlike for `post_add`, the `pk_set` of removals is not filtered by Django.
+
+    Args:
+        through (Model): Through model of the relation
+        instance (Model): Instance whose relation is being changed
+        reverse (bool): Whether the relation is being changed from its reverse side
+        pk_set (set): Ids being removed, or None if the relation is being cleared
+        source_field (str): Name of the through model column pointing to the forward side
+        target_field (str): Name of the through model column pointing to the reverse side
+
+    Returns:
+        set: Ids of the related objects being removed
+    """
+    own_field, other_field = (target_field, source_field) if reverse else (source_field, target_field)
+    pairs = through.objects.filter(**{own_field: instance.pk})
+    if pk_set is not None:
+        pairs = pairs.filter(**{f'{other_field}__in': pk_set})
+    return set(pairs.values_list(other_field, flat=True))
+
+
+def adjust_counter(queryset, field, delta, **changes):
+    """
+    Atomically adds `delta` to a counter column of every object in the queryset with a single
+    `F()` update, never letting the counter go below zero
+
+    Args:
+        queryset (QuerySet): Objects whose counter to adjust
+        field (str): Name of the counter column
+        delta (int): Amount to add, negative to decrease the counter
+        **changes: Other columns to set in the same update
+    """
+    if delta:
+        queryset.update(**{field: Greatest(F(field) + delta, 0)}, **changes)
+
+
+def get_changes_window(newest_id, ids):
+    """
+    Returns the given ids that fall within the trailing window of `COMMENT_CHANGES_WINDOW` ids ending at
+    the newest one, sorted. Ids are assigned before their transaction commits, so a comment or tombstone may
+    show up after newer ones: the window is read again on every poll, skipping the ids already seen.
+
+    Args:
+        newest_id (int): Id of the newest comment or tombstone seen
+        ids (Iterable[int]): Ids of the comments or tombstones seen
+
+    Returns:
+        list: Ids within the window
+    """
+    return sorted({id_ for id_ in ids if newest_id - settings.COMMENT_CHANGES_WINDOW < id_ <= newest_id})
+
+
+def get_comment_sync_markers(article_id):
+    """
+    Gets the author of an article along with its newest comment and newest deleted comment, and the ones
+    within the trailing window below them, with a single query, to start following the changes of its
+    comments from
+
+    Args:
+        article_id (int): Id of the article
+
+    Returns:
+        tuple: The ids of the author, the newest comment and the newest tombstone of the article, the
+        latter being 0 if there are none, then the ids of the comments and tombstones within the window
+        below them, or None if there is no such article
+    """
+    def newest_ids(model):
+        # Ids are shared by all the articles, so the window holds at most as many ids of this article
+        ids = model.objects.filter(article=OuterRef('pk')).order_by('-id').values('id')
+        return Func(Subquery(ids[:settings.COMMENT_CHANGES_WINDOW]), function='ARRAY',
+                    output_field=ArrayField(IntegerField()))
+
+    markers = Article.objects.filter(pk=article_id).values_list(
+        'author_id', newest_ids(Comment), newest_ids(CommentTombstone)).first()
+    if markers is None:
+        return None
+
+    author_id, comment_ids, tombstone_ids = markers
+    comment_id, tombstone_id = max(comment_ids, default=0), max(tombstone_ids, default=0)
+    return (author_id, comment_id, tombstone_id, get_changes_window(comment_id, comment_ids),
+            get_changes_window(tombstone_id, tombstone_ids))
+
+
+def get_comment_changes(article_id, position, limit):
+    """
+    Gets the comments posted on an article and the comments deleted from it after the given position,
+    oldest first, along with the ones committed late within the window below it. Comments posted and
+    deleted in between show up as deleted only.
+
+    Args:
+        article_id (int): Id of the article
+        position (tuple): Ids of the newest comment and tombstone already seen, and lists of the ids of the
+            comments and tombstones already seen within the window below them, as decoded by
+            `decode_changes_cursor`
+        limit (int): Maximum number of comments and of tombstones to get
+
+    Returns:
+        tuple: The new comments with their authors, the `(id, comment_id)` pairs of the new tombstones,
+        whether there are more changes than the limit, and the position to get the next changes from
+    """
+    comment_id, tombstone_id, seen_comment_ids, seen_tombstone_ids = position
+    seen_comment_ids = get_changes_window(comment_id, seen_comment_ids)
+    seen_tombstone_ids = get_changes_window(tombstone_id, seen_tombstone_ids)
+    window = settings.COMMENT_CHANGES_WINDOW
+
+    comments = list(Comment.objects.filter(article_id=article_id, id__gt=comment_id - window).exclude(
+        id__in=seen_comment_ids).select_related('author').order_by('id')[:limit + 1])
+    tombstones = list(CommentTombstone.objects.filter(article_id=article_id, id__gt=tombstone_id - window).exclude(
+        id__in=seen_tombstone_ids).order_by('id').values_list('id', 'comment_id')[:limit + 1])
+    has_more = len(comments) > limit or len(tombstones) > limit
+    comments, tombstones = comments[:limit], tombstones[:limit]
+
+    seen_comment_ids += [comment.pk for comment in comments]
+    seen_tombstone_ids += [seen_id for seen_id, _ in tombstones]
+    comment_id, tombstone_id = max([comment_id, *seen_comment_ids]), max([tombstone_id, *seen_tombstone_ids])
+    position = (comment_id, tombstone_id, get_changes_window(comment_id, seen_comment_ids),
+                get_changes_window(tombstone_id, seen_tombstone_ids))
+    return comments, tombstones, has_more, position
+
+
+def record_comment_tombstone(comment):
+    """
+    Remembers that a comment was deleted for the clients following the changes of its article
+    """
+    CommentTombstone.objects.create(article_id=comment.article_id, comment_id=comment.pk)
+
+
+def prune_comment_tombstones():
+    """
+    Forgets the comments deleted longer than `COMMENT_TOMBSTONE_TTL` seconds ago
+    """
+    expired = timezone.now() - timedelta(seconds=settings.COMMENT_TOMBSTONE_TTL)
+    CommentTombstone.objects.filter(deleted_at__lt=expired).delete()
@@ -0,0 +1,349 @@
+"""
+Bulk import of articles for articles app
+"""
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .fragments import bump_articles_version
+from .helpers import update_search_vectors
+from .models import Article, FeedEntry, Tag
+
+FRONT_MATTER_DELIMITER = '---'
+INSERT_BATCH_SIZE = 1000
+
+
+class InvalidRecord(ValueError):
+    """
+    Raised when a record to import is malformed, with the location it was read from
+    """
+
+    def __init__(self, location, message):
+        super().__init__(f'{location}: {message}')
+        self.location = location
+
+
+def read_jsonl(path):
+    """
+    Lazily reads the records to import from a file with one JSON object per line
+
+    Args:
+        path (Path): Path of the file
+
+    Yields:
+        tuple: The location of the record and the record itself
+    """
+    with open(path, encoding='utf-8') as lines:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            location = f'{path}:{number}'
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield location, InvalidRecord(location, f'Invalid JSON ({error})')
+                continue
+            yield location, record
+
+
+def read_markdown_directory(path):
+    """
+    Lazily reads the records to import from the markdown files of a directory, the content of each file
+    being preceded by its other fields as `key: value` lines between `---` lines. The title defaults to
+    the name of the file.
+
+    Args:
+        path (Path): Path of the directory
+
+    Yields:
+        tuple: The location of the record and the record itself
+    """
+    for file_path in sorted(path.rglob('*.md')):
+        text = file_path.read_text(encoding='utf-8')
+        record, content = parse_front_matter(text)
+        record.setdefault('title', file_path.stem.replace('-', ' ').replace('_', ' '))
+        record['content'] = content
+        yield str(file_path), record
+
+
+def parse_front_matter(text):
+    """
+    Splits a markdown document into its front matter fields and its content
+
+    Args:
+        text (str): Markdown document
+
+    Returns:
+        tuple: The dict of front matter fields and the content
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines or lines[0].strip() != FRONT_MATTER_DELIMITER:
+        return {}, text
+
+    fields = {}
+    for index, line in enumerate(lines[1:], start=1):
+        if line.strip() == FRONT_MATTER_DELIMITER:
+            return fields, ''.join(lines[index + 1:]).lstrip('\n')
+        key, separator, value = line.partition(':')
+        if separator and key.strip():
+            fields[key.strip().lower()] = value.strip().strip('"\'')
+
+    return {}, text
+
+
+def read_records(path):
+    """
+    Lazily reads the records to import from either a JSONL file or a directory of markdown files
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f'No such file or directory: {path}')
+    return read_markdown_directory(path) if path.is_dir() else read_jsonl(path)
+
+
+def parse_tag_names(tags):
+    """
+    Returns the normalized names of the tags of a record, given either as a list or as a comma
+    separated string, the way `ArticleForm` normalizes them
+    """
+    if isinstance(tags, str):
+        tags = tags.strip().strip('[]').split(',')
+    names = [str(tag).strip().strip('"\'').lower() for tag in tags or []]
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def allocate_unique_slugs(model, values, fallback):
+    """
+    Allocates unique slugs for new objects of `model` the way its `AutoSlugField` would, suffixing
+    `-2`, `-3`... on collisions, but resolving the collisions of all the values at once with a single
+    prefix lookup instead of one query per attempted slug
+
+    Args:
+        model (Model): Model whose `slug` field to allocate slugs of
+        values (list): Values to slugify, one per new object
+        fallback (str): Slug to use for values that slugify to nothing
+
+    Returns:
+        list: The unique slugs, in the order of `values`
+    """
+    field = model._meta.get_field('slug')
+    max_length = field.max_length
+    bases = [slugify(value)[:max_length].strip('-') or fallback for value in values]
+
+    # Suffixed candidates only ever truncate their base to make room for the suffix, so every slug the
+    # bases could collide with starts with one of the bases truncated to leave room for a long suffix.
+    # Prefix matches go through the pattern ops index Postgres has on slug fields.
+    prefixes = {base[:max_length - 4].strip('-') for base in bases}
+    taken = set(model.objects.filter(
+        Q(*[('slug__startswith', prefix) for prefix in sorted(prefixes)], _connector=Q.OR)
+    ).values_list('slug', flat=True))
+
+    slugs = []
+    next_suffixes = defaultdict(lambda: 2)
+    for base in bases:
+        slug = base
+        while slug in taken:
+            end = f'-{next_suffixes[base]}'
+            slug = base[:max_length - len(end)].strip('-') + end
+            next_suffixes[base] += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def restore_creation_dates(articles):
+    """
+    Sets the creation and update dates of inserted articles back to their `created_at`, which is
+    overridden on insert. A single update joining on the list of dates is much cheaper than the
+    `CASE` expression `bulk_update` builds.
+
+    Args:
+        articles (list): Saved articles with their original `created_at`
+    """
+    table = Article._meta.db_table
+    for start in range(0, len(articles), INSERT_BATCH_SIZE):
+        batch = articles[start:start + INSERT_BATCH_SIZE]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET created_at = dates.created_at, updated_at = dates.created_at '
+                f'FROM (VALUES {", ".join(["(%s, %s::timestamptz)"] * len(batch))}) AS dates (id, created_at) '
+                f'WHERE {table}.id = dates.id',
+                [value for article in batch for value in (article.id, article.created_at)]
+            )
+
+
+class ArticleImporter:
+    """
+    Imports records of articles in batches, each batch being written in a transaction with a constant
+    number of queries however many articles it holds. Tags are upserted in bulk, slugs are allocated
+    with one lookup per batch, and what the signal receivers of a saved article would do, i.e. indexing
+    it for search and fanning it out to the feed inboxes, is done once for the whole batch.
+    """
+
+    def __init__(self, default_author=None, render=True):
+        self.default_author = default_author
+        self.render = render
+        self.author_ids = {}
+        self.tag_ids = {}
+
+    def import_batch(self, records):
+        """
+        Imports a batch of records, skipping the invalid ones
+
+        Args:
+            records (list): Pairs of the location and the record, as read by `read_records`
+
+        Returns:
+            tuple: The number of imported articles and the list of `InvalidRecord` errors of the skipped ones
+        """
+        self.load_authors({
+            record.get('author') for _, record in records if isinstance(record, dict) and record.get('author')
+        })
+
+        articles, tag_names, errors = [], [], []
+        for location, record in records:
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise record
+                article, names = self.build_article(location, record)
+            except InvalidRecord as error:
+                errors.append(error)
+                continue
+            articles.append(article)
+            tag_names.append(names)
+
+        if not articles:
+            return 0, errors
+
+        with transaction.atomic():
+            self.upsert_tags({name for names in tag_names for name in names})
+            slugs = allocate_unique_slugs(Article, [article.title for article in articles], 'article')
+            for article, slug in zip(articles, slugs):
+                article.slug = slug
+
+            created_at = [article.created_at for article in articles]
+            Article.objects.bulk_create(articles, batch_size=INSERT_BATCH_SIZE)
+
+            for article, original in zip(articles, created_at):
+                if original is not None:
+                    article.created_at = article.updated_at = original
+            restore_creation_dates([article for article, original in zip(articles, created_at) if original])
+
+            Article.tags.through.objects.bulk_create([
+                Article.tags.through(article_id=article.id, tag_id=self.tag_ids[name])
+                for article, names in zip(articles, tag_names)
+                for name in names
+            ], batch_size=INSERT_BATCH_SIZE)
+
+            update_search_vectors([article.id for article in articles])
+            self.fan_out(articles)
+            # The bulk inserts send no signals, so the cached search results are invalidated here
+            bump_articles_version()
+
+        return len(articles), errors
+
+    def load_authors(self, usernames):
+        """
+        Resolves the ids of the given authors that were not resolved already
+        """
+        usernames = {str(username) for username in usernames} - set(self.author_ids)
+        if usernames:
+            self.author_ids.update(
+                get_user_model().objects.filter(username__in=usernames).values_list('username', 'id')
+            )
+
+    def build_article(self, location, record):
+        """
+        Builds the unsaved article of a record, along with the names of its tags
+
+        Raises:
+            InvalidRecord: If the record is missing a field or one is invalid
+        """
+        if not isinstance(record, dict):
+            raise InvalidRecord(location, 'Expected an object')
+
+        title = str(record.get('title') or '').strip()
+        content = str(record.get('content') or '')
+        if not title or not content.strip():
+            raise InvalidRecord(location, 'The title and content are required')
+        if len(title) > Article._meta.get_field('title').max_length:
+            raise InvalidRecord(location, 'The title is too long')
+
+        description = str(record.get('description') or '').strip()
+        if len(description) > Article._meta.get_field('description').max_length:
+            raise InvalidRecord(location, 'The description is too long')
+
+        username = record.get('author')
+        if username is not None:
+            author_id = self.author_ids.get(str(username))
+            if author_id is None:
+                raise InvalidRecord(location, f'Unknown author {username!r}')
+        elif self.default_author is not None:
+            author_id = self.default_author.id
+        else:
+            raise InvalidRecord(location, 'The author is required')
+
+        created_at = None
+        if record.get('created_at'):
+            try:
+                created_at = parse_datetime(str(record['created_at']))
+            except ValueError:
+                created_at = None
+            if created_at is None:
+                raise InvalidRecord(location, f'Invalid date {record["created_at"]!r}')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+
+        tag_names = parse_tag_names(record.get('tags'))
+        if any(len(name) > Tag._meta.get_field('name').max_length for name in tag_names):
+            raise InvalidRecord(location, 'A tag name is too long')
+
+        article = Article(title=title, description=description, content=content, author_id=author_id,
+                          created_at=created_at)
+        if record.get('cover_image'):
+            article.cover_image = str(record['cover_image'])
+        if self.render:
+            article.render_content()
+        return article, tag_names
+
+    def upsert_tags(self, names):
+        """
+        Creates the tags that do not exist yet in a single insert, and resolves the ids of the given tags
+        that were not resolved already
+        """
+        names = set(names) - set(self.tag_ids)
+        if not names:
+            return
+
+        self.tag_ids.update(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+        missing = sorted(names - set(self.tag_ids))
+        if missing:
+            Tag.objects.bulk_create([
+                Tag(name=name, slug=slug)
+                for name, slug in zip(missing, allocate_unique_slugs(Tag, missing, 'tag'))
+            ], batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+            self.tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    @staticmethod
+    def fan_out(articles):
+        """
+        Adds the imported articles to the feed inboxes of their authors' followers
+        """
+        followers = defaultdict(list)
+        for author_id, follower_id in get_user_model().followed_profiles.through.objects.filter(
+            to_profile_id__in={article.author_id for article in articles}
+        ).values_list('to_profile_id', 'from_profile_id'):
+            followers[author_id].append(follower_id)
+
+        FeedEntry.objects.bulk_create([
+            FeedEntry(owner_id=follower_id, article_id=article.id, article_created_at=article.created_at)
+            for article in articles
+            for follower_id in followers[article.author_id]
+        ], batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
@@ -0,0 +1,28 @@
+"""
+Management command to backfill the local feed inboxes
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from articles.helpers import backfill_feed_inbox
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the local feed inbox of every profile, or only of the given ones
+    """
+    help = 'Rebuilds the local feed inboxes from the articles authored or favorited by the followed profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only backfill the inboxes of these profiles')
+
+    def handle(self, *args, **options):
+        profiles = get_user_model().objects.order_by('id')
+        if options['usernames']:
+            profiles = profiles.filter(username__in=options['usernames'])
+
+        total = 0
+        for profile in profiles.iterator():
+            total += backfill_feed_inbox(profile)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled feed inboxes with {total} entries'))
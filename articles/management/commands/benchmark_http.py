@@ -0,0 +1,181 @@
+"""
+Management command to compare the throughput of the WSGI and ASGI deployments
+"""
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from articles.benchmarks import percentile
+from articles.models import Article
+
+SERVERS = {
+    'wsgi': ['articulate.wsgi'],
+    'asgi': ['articulate.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    """
+    Starts gunicorn with sync workers serving `articulate.wsgi` and with uvicorn workers serving
+    `articulate.asgi`, with the same number of workers, and loads each with concurrent clients requesting
+    the read-only hot paths for a fixed duration. Generate a dataset with seed_bench first.
+    """
+    help = 'Compares the throughput and latency of the hot paths served over WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS),
+                            help='Deployments to benchmark')
+        parser.add_argument('--workers', type=int, default=2, help='Number of gunicorn workers')
+        parser.add_argument('--concurrency', type=int, default=32, help='Number of concurrent clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to load each path for')
+        parser.add_argument('--paths', nargs='+', help='Paths to request, the hot paths of the dataset by default')
+        parser.add_argument('--output', help='File to write the results to as JSON')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.get_default_paths()
+        results = {}
+        for server in options['servers']:
+            self.stdout.write(f'Benchmarking {server} with {options["workers"]} workers', self.style.MIGRATE_HEADING)
+            results[server] = {}
+            port = get_free_port()
+            process = self.start_server(server, port, options['workers'])
+            try:
+                self.wait_until_ready(process, port, paths[0])
+                for path in paths:
+                    results[server][path] = self.load(port, path, options['concurrency'], options['duration'])
+                    self.write_result(path, results[server][path])
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+        if len(results) > 1:
+            self.write_comparison(results)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump({'options': {key: options[key] for key in ('workers', 'concurrency', 'duration')},
+                           'results': results}, output_file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote the results to {options["output"]}'))
+
+    @staticmethod
+    def get_default_paths():
+        article = Article.objects.order_by('-favorites_count', '-id').first()
+        if article is None:
+            raise CommandError('There are no articles to request, generate some with seed_bench')
+        author = get_user_model().objects.get(pk=article.author_id)
+        return [
+            reverse('articles:article_list'),
+            reverse('articles:article_detail', args=[article.slug]),
+            reverse('profiles:profile_detail', args=[author.username]),
+            reverse('api_articles:article-list'),
+            reverse('api_articles:article-detail', args=[article.pk]),
+        ]
+
+    @staticmethod
+    def start_server(server, port, workers):
+        environment = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE, HOST='127.0.0.1')
+        environment.pop('ASYNC_READ_VIEWS', None)
+        return subprocess.Popen([
+            sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()', *SERVERS[server],
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+        ], env=environment)
+
+    @staticmethod
+    def wait_until_ready(process, port, path, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'The server exited with status {process.returncode}')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                connection.request('GET', path)
+                connection.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'The server did not answer within {timeout}s')
+
+    def load(self, port, path, concurrency, duration):
+        """
+        Requests a path from `concurrency` threads, each reusing its connection when the server keeps it
+        alive, for `duration` seconds after a warm up request
+
+        Returns:
+            dict: Throughput in requests per second, latency percentiles in milliseconds and errors
+        """
+        warm_up = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        warm_up.request('GET', path)
+        warm_up.getresponse().read()
+        warm_up.close()
+
+        latencies = []
+        errors = itertools.count()
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            own_latencies = []
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        next(errors)
+                    if response.will_close:
+                        connection.close()
+                except (OSError, http.client.HTTPException):
+                    next(errors)
+                    connection.close()
+                    continue
+                own_latencies.append((time.perf_counter() - start) * 1000)
+            with lock:
+                latencies.extend(own_latencies)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        return {
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+            'errors': next(errors),
+        }
+
+    def write_result(self, path, result):
+        self.stdout.write(
+            f'  {path:<48} {result["requests_per_second"]:>8.1f} req/s  p50 {result["p50_ms"]:>8}ms  '
+            f'p95 {result["p95_ms"]:>8}ms  p99 {result["p99_ms"]:>8}ms  {result["errors"]} errors'
+        )
+
+    def write_comparison(self, results):
+        self.stdout.write('Throughput of asgi relative to wsgi', self.style.MIGRATE_HEADING)
+        for path, wsgi in results.get('wsgi', {}).items():
+            asgi = results.get('asgi', {}).get(path)
+            if asgi and wsgi['requests_per_second']:
+                self.stdout.write(f'  {path:<48} {asgi["requests_per_second"] / wsgi["requests_per_second"]:>6.2f}x')
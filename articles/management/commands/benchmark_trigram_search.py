@@ -0,0 +1,117 @@
+"""
+Management command to benchmark the fuzzy title search
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from articles.helpers import get_most_similar_articles_based_on_trigram_similarity
+from articles.models import Article
+
+WORDS = [
+    'django', 'python', 'postgres', 'index', 'search', 'query', 'cache', 'design', 'travel', 'cooking',
+    'music', 'history', 'science', 'startup', 'writing', 'health', 'finance', 'garden', 'climate', 'poetry',
+    'football', 'painting', 'rust', 'kernel', 'network', 'mobile', 'privacy', 'economy', 'coffee', 'mountain',
+]
+
+INSERT_ARTICLES_SQL = '''
+    INSERT INTO articles_article (
+        title, slug, description, content, content_html, content_html_version, cover_image, author_id,
+        favorites_count, comments_count, view_count, created_at, updated_at
+    )
+    SELECT
+        words[1 + floor(random() * cardinality(words))::int] || ' '
+            || words[1 + floor(random() * cardinality(words))::int] || ' '
+            || words[1 + floor(random() * cardinality(words))::int] || ' ' || series,
+        'trigram-benchmark-' || series, '', '', '', '', '', %(author_id)s, 0, 0, 0, now(), now()
+    FROM generate_series(%(start)s, %(stop)s) AS series, (SELECT %(words)s::text[] AS words) AS vocabulary
+'''
+
+
+class Command(BaseCommand):
+    """
+    Measures the latency of the fuzzy title search at growing numbers of synthetic articles, comparing
+    the index backed similarity operator against computing the similarity of every row. The synthetic
+    articles are inserted in a transaction that is rolled back at the end.
+    """
+    help = 'Benchmarks the trigram title search against synthetic catalogs of the given sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Numbers of articles to benchmark at')
+        parser.add_argument('--queries', type=int, default=20, help='Number of queries to time per size')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random queries')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = [self.make_query(rng) for _ in range(options['queries'])]
+
+        self.stdout.write(f'{"articles":>10} {"scan p50":>10} {"scan p95":>10} {"index p50":>10} {"index p95":>10}')
+        with transaction.atomic():
+            author = get_user_model().objects.create(username='trigram-benchmark')
+            inserted = Article.objects.count()
+
+            for size in sorted(options['sizes']):
+                if size > inserted:
+                    with connection.cursor() as cursor:
+                        cursor.execute(INSERT_ARTICLES_SQL, {
+                            'author_id': author.id, 'start': inserted + 1, 'stop': size, 'words': WORDS
+                        })
+                        cursor.execute('ANALYZE articles_article')
+                    inserted = size
+
+                scan = self.time_queries(self.sequential_scan_search, queries)
+                indexed = self.time_queries(get_most_similar_articles_based_on_trigram_similarity, queries)
+                self.stdout.write(
+                    f'{size:>10} {self.percentile(scan, 50):>8.1f}ms {self.percentile(scan, 95):>8.1f}ms '
+                    f'{self.percentile(indexed, 50):>8.1f}ms {self.percentile(indexed, 95):>8.1f}ms'
+                )
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def make_query(rng):
+        """
+        Returns a word from the vocabulary with a typo, like a user typing a search would
+        """
+        word = rng.choice(WORDS)
+        position = rng.randrange(len(word))
+        return word[:position] + rng.choice('aeiou') + word[position + 1:]
+
+    @staticmethod
+    def sequential_scan_search(query):
+        """
+        The fuzzy search as it was before the trigram index, computing the similarity of every title
+        """
+        return Article.objects.annotate(similarity=TrigramSimilarity('title', query)).filter(
+            similarity__gt=settings.TRIGRAM_SIMILARITY_THRESHOLD).order_by('-similarity')
+
+    @staticmethod
+    def time_queries(search, queries):
+        """
+        Returns the latencies in milliseconds of fetching the first page of results of each query
+        """
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            list(search(query)[:20])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    @staticmethod
+    def percentile(latencies, percent):
+        """
+        Returns the given percentile of the latencies, interpolating between the closest ranks, since
+        `statistics.quantiles` does not exist on the Python 3.7 runtime
+        """
+        latencies = sorted(latencies)
+        position = (len(latencies) - 1) * percent / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(latencies) - 1)
+        return latencies[lower] + (latencies[upper] - latencies[lower]) * (position - lower)
@@ -0,0 +1,43 @@
+"""
+Management command to export data as NDJSON or CSV
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from articles.export import CHUNK_SIZE, DATASETS, FORMATS, NDJSON, stream_export
+
+
+class Command(BaseCommand):
+    """
+    Streams a dataset to a file or to the standard output through a server-side cursor, in constant
+    memory whatever the size of the table. An interrupted export can be resumed with `--after` and the
+    id of the last row written.
+    """
+    help = 'Exports articles, tags, comments, favorites or follows as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS), help='Data to export')
+        parser.add_argument('--format', dest='export_format', choices=sorted(FORMATS), default=NDJSON,
+                            help='Format to export as')
+        parser.add_argument('--after', type=int, help='Only export the rows with a greater id')
+        parser.add_argument('--gzip', action='store_true', help='Compress the export with gzip')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Number of rows to read at a time')
+        parser.add_argument('--output', help='File to write to, instead of the standard output')
+
+    def handle(self, *args, **options):
+        chunks = stream_export(options['dataset'], options['export_format'], after=options['after'],
+                               compress=options['gzip'], chunk_size=options['chunk_size'])
+        try:
+            output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        except OSError as error:
+            raise CommandError(error) from error
+
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,72 @@
+"""
+Management command to bulk import articles
+"""
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from articles.helpers import rebuild_related_articles, refresh_tag_leaderboard
+from articles.importing import ArticleImporter, read_records
+
+
+class Command(BaseCommand):
+    """
+    Streams articles from a JSONL file or a directory of markdown files with front matter into the
+    database in large transactional batches. Each JSONL line is an object with a `title`, `content`,
+    and optionally a `description`, `tags` (a list or comma separated), `author` (a username),
+    `cover_image` and `created_at`, which are also the front matter keys of the markdown files.
+    """
+    help = 'Bulk imports articles from a JSONL file or a directory of markdown files with front matter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file or directory of markdown files to import')
+        parser.add_argument('--author', help='Username of the author of the articles that do not name one')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of articles to write per transaction')
+        parser.add_argument('--defer-rendering', action='store_true',
+                            help='Leave the HTML to be rendered lazily or by the render_articles command')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Do not rebuild the related articles index and the tag leaderboard afterwards')
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['author']:
+            try:
+                default_author = get_user_model().objects.get(username=options['author'])
+            except get_user_model().DoesNotExist as error:
+                raise CommandError(f'Unknown author {options["author"]!r}') from error
+
+        try:
+            records = read_records(options['path'])
+        except OSError as error:
+            raise CommandError(error) from error
+
+        importer = ArticleImporter(default_author, render=not options['defer_rendering'])
+        imported = skipped = 0
+        start = time.perf_counter()
+        while True:
+            batch = list(islice(records, options['batch_size']))
+            if not batch:
+                break
+
+            count, errors = importer.import_batch(batch)
+            imported += count
+            skipped += len(errors)
+            for error in errors:
+                self.stderr.write(f'Skipped {error}')
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'Imported {imported} articles, skipped {skipped} in {elapsed:.1f}s '
+                f'({imported / elapsed:.0f} articles/s)'
+            )
+
+        if imported and not options['skip_indexes']:
+            self.stdout.write('Rebuilding the related articles index and the tag leaderboard')
+            rebuild_related_articles()
+            refresh_tag_leaderboard(rebuild=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} articles and skipped {skipped} in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,20 @@
+"""
+Management command to rebuild the related articles index
+"""
+from django.core.management.base import BaseCommand
+
+from articles.helpers import rebuild_related_articles
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the related articles index from scratch
+    """
+    help = 'Rebuilds the related articles index from the tag co-occurrence of all articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of index entries per insert')
+
+    def handle(self, *args, **options):
+        written = rebuild_related_articles(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt related articles index with {written} entries'))
@@ -0,0 +1,52 @@
+"""
+Management command to repair the denormalized counters
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from articles.models import Article, Comment
+
+
+def count_related(related_model, column):
+    """
+    Returns an expression counting the rows of `related_model` pointing to the outer object through `column`
+    """
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{column: OuterRef('pk')}).values(column).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """
+    Recounts the favorites, comments, followers and following counters and repairs the ones that drifted
+    """
+    help = 'Repairs the denormalized favorites, comments, followers and following counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted counters')
+
+    def handle(self, *args, **options):
+        Profile = get_user_model()
+        counters = [
+            (Article, 'favorites_count', Profile.favorite_articles.through, 'article_id'),
+            (Article, 'comments_count', Comment, 'article_id'),
+            (Profile, 'followers_count', Profile.followed_profiles.through, 'to_profile_id'),
+            (Profile, 'following_count', Profile.followed_profiles.through, 'from_profile_id'),
+        ]
+
+        for model, field, related_model, column in counters:
+            with transaction.atomic():
+                actual = count_related(related_model, column)
+                drifted = model.objects.annotate(actual=actual).exclude(**{field: F('actual')})
+                drifted_ids = list(drifted.values_list('pk', flat=True))
+                if drifted_ids and not options['dry_run']:
+                    model.objects.filter(pk__in=drifted_ids).update(**{field: actual})
+
+            self.stdout.write(f'{model._meta.label}.{field}: {len(drifted_ids)} drifted')
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Reconciled counters'))
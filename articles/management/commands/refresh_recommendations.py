@@ -0,0 +1,26 @@
+"""
+Management command to refresh the recommended articles
+"""
+from django.core.management.base import BaseCommand
+
+from articles.models import ArticleRecommendation
+from articles.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the articles recommended to every profile from the favorites, authorship and tag clicks
+    of all the profiles
+    """
+    help = 'Recomputes the articles recommended to every profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=ArticleRecommendation.TOP_K,
+                            help='Number of recommendations to store per profile')
+        parser.add_argument('--memory-mb', type=int, default=256,
+                            help='Approximate size in megabytes of the dense results computed per chunk')
+
+    def handle(self, *args, **options):
+        written = refresh_recommendations(top_k=options['top'], memory_mb=options['memory_mb'],
+                                          log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} recommendations'))
@@ -0,0 +1,20 @@
+"""
+Management command to refresh the trending tags leaderboard
+"""
+from django.core.management.base import BaseCommand
+
+from articles.helpers import refresh_tag_leaderboard
+
+
+class Command(BaseCommand):
+    """
+    Incrementally refreshes the time decayed tag popularity leaderboard, meant to be run on a schedule
+    """
+    help = 'Refreshes the trending tags leaderboard with the articles and tag clicks since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the leaderboard from all the articles')
+
+    def handle(self, *args, **options):
+        scores = refresh_tag_leaderboard(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed tag leaderboard with {scores} scores'))
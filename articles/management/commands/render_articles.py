@@ -0,0 +1,41 @@
+"""
+Management command to re-render the stored HTML of articles
+"""
+from django.core.management.base import BaseCommand
+
+from articles.models import Article
+from articles.rendering import get_renderer_version
+
+
+class Command(BaseCommand):
+    """
+    Re-renders the markdown content of articles whose stored HTML is stale, in batches
+    """
+    help = 'Re-renders the stored HTML of articles rendered by a different Markdown version or set of extensions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of articles to render per batch')
+        parser.add_argument('--force', action='store_true', help='Re-render all articles, even up to date ones')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        articles = Article.objects.order_by('id').only('id', 'content', 'content_html', 'content_html_version')
+        if not options['force']:
+            articles = articles.exclude(content_html_version=get_renderer_version())
+
+        rendered = 0
+        last_id = 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for article in batch:
+                article.render_content()
+            Article.objects.bulk_update(batch, ['content_html', 'content_html_version'])
+
+            rendered += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Rendered {rendered} articles')
+
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {rendered} articles'))
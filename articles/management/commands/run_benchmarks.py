@@ -0,0 +1,127 @@
+"""
+Management command to run the micro-benchmark suite
+"""
+import json
+import platform
+import sys
+from fnmatch import fnmatch
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from articles.benchmarks import BENCHMARKS, run_benchmarks
+from articles.seeding import seed
+
+
+class Command(BaseCommand):
+    """
+    Times the helpers, the similar articles lookups and the main pages and API endpoints against
+    synthetic datasets of growing sizes, and writes the results as JSON so that runs can be compared.
+    Every scale replaces the data generated by `seed_bench`, so this is meant for a scratch database.
+    """
+    help = 'Benchmarks the hot paths at several dataset sizes and writes the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Numbers of articles to generate and benchmark at')
+        parser.add_argument('--profiles-per-article', type=float, default=0.2,
+                            help='Number of profiles generated per article')
+        parser.add_argument('--iterations', type=int, default=20, help='Number of timed runs per benchmark')
+        parser.add_argument('--only', nargs='+', metavar='PATTERN',
+                            help='Only run the benchmarks whose name matches one of these shell style patterns')
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Benchmark the current database once instead of generating datasets')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset generator')
+        parser.add_argument('--output', help='File to write the results to, instead of standard output')
+        parser.add_argument('--compare', metavar='PATH', help='Results of a previous run to compare against')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='Ratio of the median durations above which a benchmark is reported as regressed')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Cannot read {options["compare"]}: {error}') from error
+
+        if options['only'] and not any(fnmatch(name, pattern) for name in BENCHMARKS for pattern in options['only']):
+            raise CommandError('No benchmark matches the given patterns')
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'environment': {
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_version': getattr(connection, 'pg_version', None),
+                'machine': platform.machine(),
+            },
+            'scales': {},
+        }
+
+        scales = [None] if options['no_seed'] else sorted(options['scales'])
+        for scale in scales:
+            label = 'current' if scale is None else str(scale)
+            scale_results = results['scales'][label] = {}
+            if scale is not None:
+                profiles = max(int(scale * options['profiles_per_article']), 10)
+                self.progress(f'Generating {scale} articles by {profiles} profiles', self.style.MIGRATE_HEADING)
+                scale_results['dataset'] = seed(profiles, scale, random_seed=options['seed'], log=self.progress)
+
+            self.progress(f'Benchmarking at {label}', self.style.MIGRATE_HEADING)
+            scale_results['benchmarks'] = run_benchmarks(
+                options['iterations'], options['only'], log=self.log_result
+            )
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote the results to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.compare(baseline, results, options['threshold'])
+
+    def progress(self, message, style=str):
+        """
+        Reports progress on standard error, keeping standard output for the results
+        """
+        self.stderr.write(message, style)
+
+    def log_result(self, name, result):
+        self.progress(
+            f'  {name:<64} p50 {result["p50_ms"]:>9.2f}ms  p95 {result["p95_ms"]:>9.2f}ms  '
+            f'{result["queries"]:>4} queries'
+        )
+
+    def compare(self, baseline, results, threshold):
+        """
+        Prints the ratio of the median durations of every benchmark run at the same scale in both runs,
+        and fails if any regressed beyond the threshold or now issues more queries
+        """
+        regressions = []
+        for scale, scale_results in results['scales'].items():
+            previous = baseline.get('scales', {}).get(scale, {}).get('benchmarks', {})
+            for name, result in scale_results['benchmarks'].items():
+                if name not in previous:
+                    continue
+                ratio = result['p50_ms'] / previous[name]['p50_ms'] if previous[name]['p50_ms'] else 1
+                more_queries = result['queries'] > previous[name]['queries']
+                regressed = ratio > threshold or more_queries
+                style = self.style.ERROR if regressed else self.style.SUCCESS if ratio < 1 / threshold else str
+                self.stdout.write(style(
+                    f'{scale:>8} {name:<64} {ratio:>6.2f}x  '
+                    f'{previous[name]["queries"]:>4} -> {result["queries"]:<4} queries'
+                ))
+                if regressed:
+                    regressions.append(f'{name} at {scale}')
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} benchmarks regressed: {", ".join(regressions)}')
@@ -0,0 +1,46 @@
+"""
+Management command to generate a synthetic dataset
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from articles.seeding import USERNAME_PREFIX, clear_seeded_data, seed
+
+
+class Command(BaseCommand):
+    """
+    Replaces the previously generated synthetic data with profiles following each other, articles,
+    tags, favorites and comments distributed along power laws like real usage, a few profiles, authors,
+    tags and articles getting most of the attention. The generated profiles are named after
+    `USERNAME_PREFIX` and everything else belongs to them, so the rest of the database is left alone.
+    """
+    help = 'Generates a realistic synthetic dataset of the given size for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=1000, help='Number of profiles')
+        parser.add_argument('--articles', type=int, default=10000, help='Number of articles')
+        parser.add_argument('--tags', type=int, default=200, help='Number of distinct tags')
+        parser.add_argument('--follows', type=float, default=20, help='Mean number of profiles followed per profile')
+        parser.add_argument('--favorites', type=float, default=10,
+                            help='Mean number of articles favorited per profile')
+        parser.add_argument('--comments', type=float, default=2, help='Mean number of comments per article')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generator')
+        parser.add_argument('--clear', action='store_true', help='Only delete the previously generated data')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_seeded_data()
+            self.stdout.write(self.style.SUCCESS(f'Deleted the {USERNAME_PREFIX}* profiles and their data'))
+            return
+
+        start = time.perf_counter()
+        counts = seed(
+            options['profiles'], options['articles'], tags=options['tags'], follows=options['follows'],
+            favorites=options['favorites'], comments=options['comments'], random_seed=options['seed'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(f'{count} {kind}' for kind, count in counts.items())
+            + f' in {time.perf_counter() - start:.1f}s'
+        ))
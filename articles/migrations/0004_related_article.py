@@ -0,0 +1,35 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0003_auto_20210611_0043'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_tags', models.PositiveIntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='articles.article')),
+                ('related_article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='articles.article')),
+            ],
+            options={
+                'ordering': ('article', 'rank'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedarticle',
+            index=models.Index(fields=['article', 'rank'], name='related_article_rank_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedarticle',
+            unique_together={('article', 'related_article')},
+        ),
+    ]
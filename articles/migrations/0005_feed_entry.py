@@ -0,0 +1,33 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('articles', '0004_related_article'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_created_at', models.DateTimeField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='articles.article')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['owner', '-article_created_at', '-article'], name='feed_entry_owner_recent_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('owner', 'article')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0005_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='content_html_version',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+    ]
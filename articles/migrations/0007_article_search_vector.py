@@ -0,0 +1,45 @@
+# Generated by Django 3.1.7 on 2026-10-18 17:59
+
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.contrib.postgres.aggregates import StringAgg
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_search_vectors(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    Tag = apps.get_model('articles', 'Tag')
+
+    tag_names = Tag.objects.filter(articles=OuterRef('pk')).values('articles').annotate(
+        names=StringAgg('name', delimiter=' ')).values('names')
+
+    Article.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(tag_names), Value('')), weight='B', config=settings.SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=settings.SEARCH_CONFIG)
+        + SearchVector('content', weight='C', config=settings.SEARCH_CONFIG)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0006_article_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:01
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0007_article_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='article_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0008_article_title_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-created_at', '-id'], name='article_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(related_model, column):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{column: OuterRef('pk')}).values(column).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    Comment = apps.get_model('articles', 'Comment')
+    Profile = apps.get_model('profiles', 'Profile')
+
+    Article.objects.update(
+        favorites_count=count_related(Profile.favorite_articles.through, 'article_id'),
+        comments_count=count_related(Comment, 'article_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0009_article_recent_index'),
+        ('profiles', '0003_profile_username_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
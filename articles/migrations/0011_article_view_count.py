@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0010_article_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
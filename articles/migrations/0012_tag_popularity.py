@@ -0,0 +1,37 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0011_article_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagPopularity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('click_count_snapshot', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+                ('scope', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='scoped_popularity_scores', to='articles.tag')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity_scores', to='articles.tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tagpopularity',
+            index=models.Index(fields=['scope', '-score'], name='tag_popularity_ranking_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagpopularity',
+            constraint=models.UniqueConstraint(fields=('tag', 'scope'), name='unique_scoped_tag_popularity'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagpopularity',
+            constraint=models.UniqueConstraint(condition=models.Q(scope__isnull=True), fields=('tag',), name='unique_global_tag_popularity'),
+        ),
+    ]
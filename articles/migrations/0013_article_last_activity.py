@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0012_tag_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='last_activity_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0013_article_last_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('article', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='comment_tombstones', to='articles.article')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='commenttombstone',
+            index=models.Index(fields=['article', 'id'], name='comment_tombstone_article_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.7 on 2026-10-18 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('articles', '0014_comment_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleRecommendation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='articles.article')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='articlerecommendation',
+            index=models.Index(fields=['owner', '-score', '-article'], name='recommendation_owner_rank_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='articlerecommendation',
+            unique_together={('owner', 'article')},
+        ),
+    ]
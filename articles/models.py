@@ -2,11 +2,17 @@
 Models for articles app
 """
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.db.models import Count
 from django.urls import reverse
 from django_extensions.db.fields import AutoSlugField
 
+from articulate.objectcache import ObjectCache
+
+from .rendering import get_renderer_version, render_markdown
+
 
 class Article(models.Model):
     """
@@ -15,9 +21,11 @@ class Article(models.Model):
     COVER_IMG_PLACEHOLDER_URL = 'https://cdn.pixabay.com/photo/2019/09/30/14/29/books-4515917_1280.jpg'
 
     title = models.CharField(max_length=100)
-    slug = AutoSlugField('slug', max_length=50, unique=True, populate_from=('title',))
+    slug = AutoSlugField('slug', max_length=50, unique=True, populate_from=('title',), overwrite_on_add=False)
     description = models.CharField(max_length=300)
     content = models.TextField()
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_version = models.CharField(max_length=12, blank=True, editable=False)
     cover_image = models.URLField(
         blank=True,
         default=COVER_IMG_PLACEHOLDER_URL,
@@ -26,16 +34,78 @@ class Article(models.Model):
     )
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='authored_articles')
     tags = models.ManyToManyField('articles.Tag', related_name='articles', blank=True)
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='article_recent_idx'),
+            GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+            GinIndex(fields=['title'], name='article_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rendered_content = instance.__dict__.get('content')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Override save method to re-render the content into HTML whenever it has changed
+        """
+        if self.content != getattr(self, '_rendered_content', None) or self.has_stale_content_html():
+            self.render_content()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'content_html', 'content_html_version'}
+
+        super().save(*args, **kwargs)
+
+    def render_content(self):
+        """
+        Renders the markdown content into HTML with the current renderer
+        """
+        self.content_html = render_markdown(self.content)
+        self.content_html_version = get_renderer_version()
+        self._rendered_content = self.content
+
+    def has_stale_content_html(self):
+        return self.content_html_version != get_renderer_version()
+
+    def get_content_html(self):
+        """
+        Returns the rendered HTML of the content, lazily re-rendering and storing it if it was
+        rendered by a different Markdown version or set of extensions
+        """
+        if self.has_stale_content_html():
+            self.render_content()
+            Article.objects.filter(pk=self.pk).update(
+                content_html=self.content_html, content_html_version=self.content_html_version
+            )
+            article_cache.invalidate([self.pk])
+        return self.content_html
+
     def get_similar_articles(self):
+        """
+        Returns the articles sharing the most tags with this one, as precomputed in the
+        related articles index
+        """
+        return Article.objects.filter(related_to__article=self).select_related('author').order_by(
+            'related_to__rank')
+
+    def compute_similar_articles(self):
+        """
+        Runs the tag co-occurrence query that the related articles index is built from
+        """
         article_tags = self.tags.values_list('id', flat=True)
         similar_articles = Article.objects.filter(tags__in=article_tags).exclude(id=self.id)
         similar_articles = similar_articles.annotate(same_tags=Count('tags')).order_by('-same_tags', '-created_at')
@@ -59,7 +129,7 @@ class Tag(models.Model):
     Model for Tag
     """
     name = models.CharField(max_length=25, unique=True)
-    slug = AutoSlugField('slug', max_length=25, populate_from=('name',))
+    slug = AutoSlugField('slug', max_length=25, populate_from=('name',), overwrite_on_add=False)
     click_count = models.IntegerField(default=0)
     clicked_by_profile = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='tags_clicked', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -68,6 +138,18 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    def is_renamed(self):
+        """
+        Returns whether the name has changed since the tag was loaded from the database
+        """
+        return self.name != getattr(self, '_loaded_name', self.name)
+
     def increase_click_count(self):
         self.click_count += 1
         self.save()
@@ -97,3 +179,116 @@ class Comment(models.Model):
 
     def __str__(self):
         return f'{self.body[:15]}...'
+
+
+class CommentTombstone(models.Model):
+    """
+    Model for a deleted comment, kept for `COMMENT_TOMBSTONE_TTL` seconds so that the clients polling the
+    comments of its article for changes can remove it. The comments of an article being deleted are
+    deleted before it, so the article is not a constrained foreign key and the tombstones outlive it
+    until they expire.
+    """
+    article = models.ForeignKey(Article, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                related_name='comment_tombstones')
+    comment_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['article', 'id'], name='comment_tombstone_article_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.article_id} - {self.comment_id}'
+
+
+class RelatedArticle(models.Model):
+    """
+    Model for an entry in the related articles index, i.e. one of the top `TOP_K` articles
+    sharing the most tags with `article`
+    """
+    TOP_K = 10
+
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_entries')
+    related_article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_to')
+    shared_tags = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ('article', 'rank')
+        unique_together = ('article', 'related_article')
+        indexes = [
+            models.Index(fields=['article', 'rank'], name='related_article_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.article_id} -> {self.related_article_id} ({self.shared_tags})'
+
+
+class FeedEntry(models.Model):
+    """
+    Model for an entry in a profile's local feed inbox, written when an article is authored or
+    favorited by one of the followed profiles
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries')
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='feed_entries')
+    article_created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'article')
+        indexes = [
+            models.Index(fields=['owner', '-article_created_at', '-article'], name='feed_entry_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.owner_id} <- {self.article_id}'
+
+
+class ArticleRecommendation(models.Model):
+    """
+    Model for one of the top `TOP_K` articles recommended to `owner`, as computed offline from the
+    favorites, authorship and tag clicks of all the profiles by `refresh_recommendations`
+    """
+    TOP_K = 30
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recommendations')
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='recommendations')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('owner', 'article')
+        indexes = [
+            models.Index(fields=['owner', '-score', '-article'], name='recommendation_owner_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.owner_id} <- {self.article_id} ({self.score:.3f})'
+
+
+class TagPopularity(models.Model):
+    """
+    Model for the time decayed popularity score of a tag, either in the global feed, or in the feed
+    filtered by the `scope` tag. The click count snapshot is only kept for the global scores.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='popularity_scores')
+    scope = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='scoped_popularity_scores')
+    score = models.FloatField(default=0)
+    click_count_snapshot = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'scope'], name='unique_scoped_tag_popularity'),
+            models.UniqueConstraint(fields=['tag'], condition=models.Q(scope__isnull=True),
+                                    name='unique_global_tag_popularity'),
+        ]
+        indexes = [
+            models.Index(fields=['scope', '-score'], name='tag_popularity_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag_id} in {self.scope_id or "global"}: {self.score:.3f}'
+
+
+article_cache = ObjectCache(Article, lookup_fields=('slug',))
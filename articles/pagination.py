@@ -0,0 +1,219 @@
+"""
+Keyset pagination for articles app
+"""
+import base64
+import binascii
+import json
+import math
+import time
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import DateTimeField, Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class ExpiredCursor(InvalidCursor):
+    pass
+
+
+def _encode(position):
+    position = json.dumps(position, separators=(',', ':'))
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def encode_cursor(direction, key, pk):
+    """
+    Encodes a position in a feed into an opaque cursor token
+
+    Args:
+        direction (str): Either `NEXT` or `PREVIOUS`, the side of the position to paginate to
+        key (datetime|float): Value of the key field at the position, a date or a score
+        pk (int): Id of the article at the position
+
+    Returns:
+        str: Cursor token
+    """
+    return _encode({'d': direction, 'k': key.isoformat() if hasattr(key, 'isoformat') else key, 'i': pk})
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor token created by `encode_cursor`
+
+    Args:
+        cursor (str): Cursor token
+
+    Returns:
+        tuple: The direction, key and id of the position
+
+    Raises:
+        InvalidCursor: If the token is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, key, pk = position['d'], position['k'], int(position['i'])
+        key = parse_datetime(key) if isinstance(key, str) else float(key)
+    except (binascii.Error, ValueError, TypeError, KeyError) as error:
+        raise InvalidCursor('Invalid cursor') from error
+
+    if direction not in (NEXT, PREVIOUS) or key is None or (isinstance(key, float) and not math.isfinite(key)):
+        raise InvalidCursor('Invalid cursor')
+
+    return direction, key, pk
+
+
+def encode_changes_cursor(comment_id, tombstone_id, seen_comment_ids=(), seen_tombstone_ids=()):
+    """
+    Encodes the newest comment and deleted comment seen by a client into an opaque cursor token, along
+    with the ones seen within the trailing window below them and the time it was issued at
+
+    Args:
+        comment_id (int): Id of the newest comment seen, or 0
+        tombstone_id (int): Id of the newest tombstone seen, or 0
+        seen_comment_ids (Iterable[int]): Ids of the comments seen within the window below `comment_id`
+        seen_tombstone_ids (Iterable[int]): Ids of the tombstones seen within the window below `tombstone_id`
+
+    Returns:
+        str: Cursor token
+    """
+    return _encode({'c': comment_id, 't': tombstone_id, 'sc': sorted(seen_comment_ids),
+                    'st': sorted(seen_tombstone_ids), 'at': int(time.time())})
+
+
+def decode_changes_cursor(cursor, max_age):
+    """
+    Decodes a cursor token created by `encode_changes_cursor`
+
+    Args:
+        cursor (str): Cursor token
+        max_age (int): Seconds after which the cursor expires
+
+    Returns:
+        tuple: The ids of the newest comment and tombstone seen, and the lists of the ids seen below them
+
+    Raises:
+        InvalidCursor: If the token is malformed
+        ExpiredCursor: If the token was issued more than `max_age` seconds ago
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        comment_id, tombstone_id, issued_at = int(position['c']), int(position['t']), int(position['at'])
+        seen_comment_ids = [int(seen_id) for seen_id in position.get('sc', [])]
+        seen_tombstone_ids = [int(seen_id) for seen_id in position.get('st', [])]
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError) as error:
+        raise InvalidCursor('Invalid cursor') from error
+
+    if time.time() - issued_at > max_age:
+        raise ExpiredCursor('Expired cursor')
+
+    return comment_id, tombstone_id, seen_comment_ids, seen_tombstone_ids
+
+
+class KeysetPage:
+    """
+    A page of a feed paginated by `KeysetPaginator`
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset from the highest to the lowest `(key_field, id)`, e.g. from the most recent to
+    the oldest or from the best scored, seeking to the page through the position encoded in a cursor
+    rather than counting and offsetting rows, so that every page costs the same as the first one.
+    """
+
+    def __init__(self, queryset, per_page, key_field='created_at'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.key_field = key_field
+
+    def cursor_for(self, direction, article):
+        return encode_cursor(direction, getattr(article, self.key_field), article.pk)
+
+    def get_key_field(self):
+        """
+        Returns the field of the key, which may be an annotation of the queryset
+        """
+        annotations = self.queryset.query.annotations
+        if self.key_field in annotations:
+            return annotations[self.key_field].output_field
+        return self.queryset.model._meta.get_field(self.key_field)
+
+    def check_key(self, key):
+        """
+        Checks that a key decoded from a cursor is of the type of the key field, so that a forged cursor is
+        rejected rather than failing the query
+
+        Raises:
+            InvalidCursor: If the key is a date for a score or a score for a date
+        """
+        if isinstance(key, datetime) != isinstance(self.get_key_field(), DateTimeField):
+            raise InvalidCursor('Invalid cursor')
+
+    def page(self, cursor=None):
+        """
+        Returns the page next to or previous to the position encoded in `cursor`, or the first page if
+        there is no cursor
+
+        Raises:
+            InvalidCursor: If the cursor is malformed, or its key does not fit the key field
+        """
+        if not cursor:
+            object_list = list(self.queryset.order_by(f'-{self.key_field}', '-pk')[:self.per_page + 1])
+            return KeysetPage(object_list[:self.per_page], self, len(object_list) > self.per_page, False)
+
+        direction, key, pk = decode_cursor(cursor)
+        self.check_key(key)
+        if direction == NEXT:
+            after = Q(**{f'{self.key_field}__lt': key}) | Q(**{self.key_field: key, 'pk__lt': pk})
+            object_list = list(
+                self.queryset.filter(after).order_by(f'-{self.key_field}', '-pk')[:self.per_page + 1]
+            )
+            return KeysetPage(object_list[:self.per_page], self, len(object_list) > self.per_page, True)
+
+        before = Q(**{f'{self.key_field}__gt': key}) | Q(**{self.key_field: key, 'pk__gt': pk})
+        object_list = list(self.queryset.filter(before).order_by(self.key_field, 'pk')[:self.per_page + 1])
+        has_previous = len(object_list) > self.per_page
+        return KeysetPage(object_list[:self.per_page][::-1], self, True, has_previous)
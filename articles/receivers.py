@@ -1,17 +1,328 @@
 """
 Signal receivers for articles app
 """
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
+from .conditional import bump_activity_version
+from .counters import counter_buffer
+from .fragments import bump_fragment_versions
+from .helpers import (
+    add_to_feed_inboxes,
+    adjust_counter,
+    backfill_feed_inbox,
+    drop_recommendations,
+    get_follower_ids,
+    get_related_ids_being_removed,
+    prune_comment_tombstones,
+    prune_feed_inboxes,
+    record_comment_tombstone,
+    update_search_vectors
+)
+from .models import Article, Comment, Tag, article_cache
 from .signals import tag_click
+from .typeahead import ARTICLE, TAG, typeahead_index
+
+Profile = get_user_model()
+
+# Articles whose deletion is cascading to their comments, which are deleted first
+articles_being_deleted = ContextVar('articles_being_deleted', default=frozenset())
+_tombstones_pruned_at = None
+
+
+@receiver(connection_created)
+def set_trigram_similarity_threshold(sender, connection, **kwargs):
+    """
+    Receiver that sets the threshold of the trigram similarity operator used by fuzzy searches
+    on every new database connection
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET pg_trgm.similarity_threshold = %s', [settings.TRIGRAM_SIMILARITY_THRESHOLD])
 
 
 @receiver(tag_click)
 def update_tag_click_status(sender, tag, profile, **kwargs):
     """
-    Receiver that updates a tag's click count
+    Receiver that updates a tag's click count, and the profiles that clicked it, through the counter buffer
     """
     if tag:
-        tag.increase_click_count()
+        counter_buffer.increment(Tag, tag.pk, 'click_count')
         if profile:
-            tag.add_profile_to_clicked(profile)
+            counter_buffer.add_relation(Tag.clicked_by_profile.through, tag_id=tag.pk, profile_id=profile.pk)
+
+
+@receiver(post_save, sender=Article)
+def fan_out_published_article(sender, instance, created, **kwargs):
+    """
+    Receiver that adds a newly published article to the feed inboxes of the author's followers
+    """
+    if created:
+        add_to_feed_inboxes(get_follower_ids([instance.author_id]), Article.objects.filter(id=instance.id))
+
+
+@receiver(m2m_changed, sender=Profile.favorite_articles.through)
+def fan_out_favorited_articles(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that keeps the feed inboxes of a profile and its followers in sync with the profile's favorites
+    """
+    if action == 'pre_clear':
+        instance._cleared_favorite_ids = get_related_ids_being_removed(
+            sender, instance, reverse, pk_set, 'profile_id', 'article_id'
+        )
+        return
+
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_favorite_ids', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        profile_ids, article_ids = pk_set, {instance.id}
+    else:
+        profile_ids, article_ids = {instance.id}, pk_set
+
+    owner_ids = get_follower_ids(profile_ids) | set(profile_ids)
+    if action == 'post_add':
+        add_to_feed_inboxes(owner_ids, Article.objects.filter(id__in=article_ids))
+    else:
+        prune_feed_inboxes(owner_ids, article_ids)
+
+
+@receiver(m2m_changed, sender=Profile.favorite_articles.through)
+def drop_favorited_recommendations(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that stops recommending articles to the profiles that just favorited them, until the
+    recommendations are next refreshed
+    """
+    if action == 'post_add' and pk_set:
+        profile_ids, article_ids = (pk_set, {instance.id}) if reverse else ({instance.id}, pk_set)
+        drop_recommendations(profile_ids, article_ids)
+
+
+@receiver(m2m_changed, sender=Profile.followed_profiles.through)
+def update_feed_inboxes_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that adds or removes the articles of (un)followed profiles from the follower's feed inbox
+    """
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_follower_ids = get_related_ids_being_removed(
+                sender, instance, reverse, pk_set, 'from_profile_id', 'to_profile_id'
+            )
+        return
+
+    if action == 'post_clear':
+        if not reverse:
+            backfill_feed_inbox(instance)
+            return
+        pk_set = instance.__dict__.pop('_cleared_follower_ids', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        follower_ids, followed_ids = pk_set, {instance.id}
+    else:
+        follower_ids, followed_ids = {instance.id}, pk_set
+
+    articles = Article.objects.filter(Q(author_id__in=followed_ids) | Q(favorited__in=followed_ids)).distinct()
+    if action == 'post_add':
+        add_to_feed_inboxes(follower_ids, articles)
+    else:
+        prune_feed_inboxes(follower_ids, articles.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Article)
+def invalidate_cached_article(sender, instance, **kwargs):
+    """
+    Receiver that drops the cached copy of an article whenever it is saved or deleted
+    """
+    article_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Article)
+def update_article_search_vector(sender, instance, **kwargs):
+    """
+    Receiver that keeps the search vector of an article current with its title, description and content
+    """
+    update_search_vectors([instance.id])
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def update_search_vectors_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that keeps the search vectors of articles current with their tag names
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        article_ids = pk_set if pk_set is not None else []
+    else:
+        article_ids = [instance.id]
+    update_search_vectors(article_ids)
+
+
+@receiver(post_save, sender=Tag)
+def update_articles_on_tag_rename(sender, instance, created, **kwargs):
+    """
+    Receiver that keeps the search vectors and cached fragments of the articles tagged by a tag current
+    with its name
+    """
+    if not created and instance.is_renamed():
+        article_ids = list(instance.articles.values_list('id', flat=True))
+        update_search_vectors(article_ids)
+        bump_fragment_versions(article_ids)
+        instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_article_fragments(sender, instance, **kwargs):
+    """
+    Receiver that invalidates the cached fragments of an article whenever it is saved or deleted
+    """
+    bump_fragment_versions([instance.id])
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def invalidate_fragments_on_tagging(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that invalidates the cached fragments of articles whose tags changed
+    """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_article_ids = get_related_ids_being_removed(
+            sender, instance, reverse, pk_set, 'article_id', 'tag_id'
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        article_ids = [instance.id]
+    elif action == 'post_clear':
+        article_ids = instance.__dict__.pop('_cleared_article_ids', set())
+    else:
+        article_ids = pk_set
+    bump_fragment_versions(article_ids)
+
+
+@receiver(m2m_changed, sender=Profile.favorite_articles.through)
+def update_favorites_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that keeps the favorites count and last activity of articles in sync with their favorites
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_favorite_ids = get_related_ids_being_removed(
+            sender, instance, reverse, pk_set, 'profile_id', 'article_id'
+        )
+        return
+
+    if action == 'post_add':
+        changed_ids, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed_ids, delta = instance.__dict__.pop('_removed_favorite_ids', set()), -1
+    else:
+        return
+
+    if not changed_ids:
+        return
+
+    if reverse:
+        adjust_counter(Article.objects.filter(id=instance.id), 'favorites_count', delta * len(changed_ids),
+                       last_activity_at=Now())
+        article_cache.invalidate([instance.id])
+    else:
+        adjust_counter(Article.objects.filter(id__in=changed_ids), 'favorites_count', delta, last_activity_at=Now())
+        article_cache.invalidate(changed_ids)
+    bump_activity_version()
+
+
+@receiver(post_save, sender=Comment)
+def increase_comments_count(sender, instance, created, **kwargs):
+    """
+    Receiver that increases the comments count of an article when it is commented on, and updates its
+    last activity when one of its comments is edited
+    """
+    if created:
+        adjust_counter(Article.objects.filter(id=instance.article_id), 'comments_count', 1, last_activity_at=Now())
+    else:
+        Article.objects.filter(id=instance.article_id).update(last_activity_at=Now())
+    article_cache.invalidate([instance.article_id])
+    bump_activity_version()
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_comments_count(sender, instance, **kwargs):
+    """
+    Receiver that decreases the comments count of an article when one of its comments is deleted
+    """
+    adjust_counter(Article.objects.filter(id=instance.article_id), 'comments_count', -1, last_activity_at=Now())
+    article_cache.invalidate([instance.article_id])
+    bump_activity_version()
+
+
+@receiver(pre_delete, sender=Article)
+def mark_article_being_deleted(sender, instance, **kwargs):
+    """
+    Receiver that marks an article as being deleted until it is, for the receivers of its comments
+    """
+    articles_being_deleted.set(articles_being_deleted.get() | {instance.pk})
+
+
+@receiver(post_delete, sender=Article)
+def unmark_article_being_deleted(sender, instance, **kwargs):
+    """
+    Receiver that unmarks a deleted article, once its comments were deleted
+    """
+    articles_being_deleted.set(articles_being_deleted.get() - {instance.pk})
+
+
+@receiver(post_delete, sender=Comment)
+def remember_deleted_comment(sender, instance, **kwargs):
+    """
+    Receiver that records a tombstone of a deleted comment for the clients following the changes of the
+    comments of its article, unless the article is deleted too, and forgets the expired tombstones at
+    most every `COMMENT_TOMBSTONE_PRUNE_INTERVAL` seconds
+    """
+    global _tombstones_pruned_at
+
+    if instance.article_id in articles_being_deleted.get():
+        return
+    record_comment_tombstone(instance)
+
+    now = time.monotonic()
+    if _tombstones_pruned_at is None or now - _tombstones_pruned_at >= settings.COMMENT_TOMBSTONE_PRUNE_INTERVAL:
+        _tombstones_pruned_at = now
+        prune_comment_tombstones()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Tag)
+def update_typeahead_entry(sender, instance, **kwargs):
+    """
+    Receiver that adds new articles and tags to the typeahead index of this process, and keeps their
+    entries current, once the change is committed
+    """
+    kind = TAG if sender is Tag else ARTICLE
+    transaction.on_commit(lambda: typeahead_index.put(kind, instance))
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Tag)
+def remove_typeahead_entry(sender, instance, **kwargs):
+    """
+    Receiver that removes deleted articles and tags from the typeahead index of this process
+    """
+    kind, pk = TAG if sender is Tag else ARTICLE, instance.pk
+    transaction.on_commit(lambda: typeahead_index.remove(kind, pk))
@@ -0,0 +1,194 @@
+"""
+Collaborative filtering recommendations for articles app
+
+Recommendations are computed offline from the implicit feedback of all the profiles, held in sparse
+matrices: a profile x article matrix of the favorites and authored articles, a profile x tag matrix of the
+tag clicks and an article x tag matrix of the tags. Articles are similar when the same profiles favorited
+or wrote them, by the cosine of their columns, and each article keeps its `NEIGHBOURS` most similar ones.
+A profile's score for an article sums the similarities of the article to the profile's articles, plus
+the overlap of its tags with the tags the profile clicked, so that profiles with few favorites still get
+recommendations. Dense intermediate results are computed a chunk of rows at a time to bound memory.
+"""
+from itertools import chain
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from scipy import sparse
+
+from .models import Article, ArticleRecommendation, Tag
+
+NEIGHBOURS = 50
+AUTHORED_WEIGHT = 1.0
+TAG_WEIGHT = 0.5
+BATCH_SIZE = 5000
+
+
+def _load_ids(queryset):
+    return np.fromiter(queryset.order_by('id').values_list('id', flat=True).iterator(chunk_size=BATCH_SIZE),
+                       dtype=np.int64)
+
+
+def _load_matrix(queryset, row_ids, column_ids, weight=1.0):
+    """
+    Loads the `(row id, column id)` pairs of a queryset into a sparse matrix indexed like `row_ids` and
+    `column_ids`, summing duplicate pairs. The pairs are not read in the same snapshot as the ids, so the
+    ones of rows or columns created or deleted in the meantime are dropped.
+    """
+    values = np.fromiter(chain.from_iterable(queryset.iterator(chunk_size=BATCH_SIZE)), dtype=np.int64)
+    row_values, column_values = values[0::2], values[1::2]
+    loaded = np.isin(row_values, row_ids) & np.isin(column_values, column_ids)
+    rows = np.searchsorted(row_ids, row_values[loaded])
+    columns = np.searchsorted(column_ids, column_values[loaded])
+    data = np.full(len(rows), weight, dtype=np.float32)
+    return sparse.csr_matrix((data, (rows, columns)), shape=(len(row_ids), len(column_ids)))
+
+
+def _scale_rows(matrix, scales):
+    return sparse.diags(scales.astype(np.float32)) @ matrix
+
+
+def _inverse(values):
+    inverse = np.zeros(len(values), dtype=np.float32)
+    np.divide(1, values, out=inverse, where=values > 0)
+    return inverse
+
+
+def load_feedback():
+    """
+    Loads the implicit feedback of all the profiles into sparse matrices
+
+    Returns:
+        tuple: The profile ids and article ids by row and column index, the profile x article matrix of
+        the favorites and authored articles, the profile x tag matrix of the tag clicks and the
+        article x tag matrix of the tags
+    """
+    profile_ids = _load_ids(get_user_model().objects)
+    article_ids = _load_ids(Article.objects)
+    tag_ids = _load_ids(Tag.objects)
+
+    interactions = _load_matrix(get_user_model().favorite_articles.through.objects.values_list(
+        'profile_id', 'article_id'), profile_ids, article_ids)
+    interactions += _load_matrix(Article.objects.order_by().values_list('author_id', 'id'), profile_ids,
+                                 article_ids, AUTHORED_WEIGHT)
+    clicks = _load_matrix(Tag.clicked_by_profile.through.objects.values_list('profile_id', 'tag_id'),
+                          profile_ids, tag_ids)
+    tags = _load_matrix(Article.tags.through.objects.values_list('article_id', 'tag_id'), article_ids, tag_ids)
+    return profile_ids, article_ids, interactions, clicks, tags
+
+
+def _top_k(scores, k):
+    """
+    Returns the column indexes and values of the `k` highest positive values of every row of a dense
+    matrix, from the highest, as two arrays of `k` columns, where a column index of -1 pads the rows with
+    fewer positive values
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(k), scores.shape).copy()
+    values = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    columns, values = np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1)
+    columns[values <= 0] = -1
+    return columns, values
+
+
+def _rows_per_chunk(columns, memory_mb):
+    # A dense float32 cell takes 4 bytes, and the sparse product it comes from up to 12 more per cell
+    return max(1, memory_mb * 2 ** 20 // (16 * max(columns, 1)))
+
+
+def compute_neighbours(interactions, memory_mb):
+    """
+    Computes the `NEIGHBOURS` most similar articles of every article, by the cosine similarity of their
+    columns in the profile x article matrix, a chunk of articles at a time
+
+    Returns:
+        csr_matrix: Article x article matrix of the similarities to the neighbours of every article
+    """
+    norms = np.sqrt(np.asarray(interactions.multiply(interactions).sum(axis=0)).ravel())
+    normalized = (interactions @ sparse.diags(_inverse(norms))).tocsc()
+    by_article = normalized.T.tocsr()
+    article_count = interactions.shape[1]
+
+    rows, columns, values = [], [], []
+    chunk = _rows_per_chunk(article_count, memory_mb)
+    for start in range(0, article_count, chunk):
+        stop = min(start + chunk, article_count)
+        similarities = (by_article[start:stop] @ normalized).toarray()
+        similarities[np.arange(stop - start), np.arange(start, stop)] = 0
+        top_columns, top_values = _top_k(similarities, NEIGHBOURS)
+        kept = top_columns >= 0
+        rows.append(np.nonzero(kept)[0] + start)
+        columns.append(top_columns[kept])
+        values.append(top_values[kept])
+
+    if not rows:
+        return sparse.csr_matrix((article_count, article_count), dtype=np.float32)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                             shape=(article_count, article_count), dtype=np.float32)
+
+
+def _save_recommendations(owner_ids, columns, values, article_ids):
+    owner_ids = [int(owner_id) for owner_id in owner_ids]
+    recommended_ids = {int(article_ids[column]) for column in np.unique(columns) if column >= 0}
+    with transaction.atomic():
+        # Profiles and articles deleted since the feedback was loaded are skipped
+        existing_owner_ids = set(get_user_model().objects.filter(id__in=owner_ids).values_list('id', flat=True))
+        existing_article_ids = set(Article.objects.filter(id__in=recommended_ids).values_list('id', flat=True))
+        rows = [
+            ArticleRecommendation(owner_id=owner_id, article_id=int(article_ids[column]), score=float(value))
+            for owner_id, owner_columns, owner_values in zip(owner_ids, columns, values)
+            if owner_id in existing_owner_ids
+            for column, value in zip(owner_columns, owner_values)
+            if column >= 0 and int(article_ids[column]) in existing_article_ids
+        ]
+        ArticleRecommendation.objects.filter(owner_id__in=owner_ids).delete()
+        ArticleRecommendation.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def refresh_recommendations(top_k=ArticleRecommendation.TOP_K, memory_mb=256, log=None):
+    """
+    Recomputes the recommended articles of every profile, replacing the stored recommendations of a chunk
+    of profiles at a time. Articles a profile favorited or wrote are not recommended to it.
+
+    Args:
+        top_k (int): Number of recommendations to store per profile
+        memory_mb (int): Approximate size of the dense intermediate results of a chunk, in megabytes
+        log (callable): Called with progress messages, if given
+
+    Returns:
+        int: Number of recommendations stored
+    """
+    profile_ids, article_ids, interactions, clicks, tags = load_feedback()
+    if log:
+        log(f'Loaded {len(profile_ids)} profiles, {len(article_ids)} articles, {interactions.nnz} favorites and '
+            f'authored articles and {clicks.nnz} tag clicks')
+
+    neighbours = compute_neighbours(interactions, memory_mb)
+    if log:
+        log(f'Computed {neighbours.nnz} article similarities')
+
+    # Tag clicks count as a share of a profile's clicks, and tags as a share of an article's tags
+    clicks = _scale_rows(clicks, _inverse(np.asarray(clicks.sum(axis=1)).ravel()))
+    tags = _scale_rows(tags, _inverse(np.sqrt(np.asarray(tags.sum(axis=1)).ravel())))
+    tags_by_article = tags.T.tocsr()
+
+    written = 0
+    chunk = _rows_per_chunk(len(article_ids), memory_mb)
+    for start in range(0, len(profile_ids), chunk):
+        stop = min(start + chunk, len(profile_ids))
+        seen = interactions[start:stop]
+        scores = (seen @ neighbours).toarray()
+        scores += TAG_WEIGHT * (clicks[start:stop] @ tags_by_article).toarray()
+        seen_rows, seen_columns = seen.nonzero()
+        scores[seen_rows, seen_columns] = 0
+        columns, values = _top_k(scores, top_k)
+        written += _save_recommendations(profile_ids[start:stop], columns, values, article_ids)
+        if log:
+            log(f'Recommended articles to {stop} of {len(profile_ids)} profiles')
+
+    return written
@@ -0,0 +1,56 @@
+"""
+Markdown rendering for articles app
+"""
+import hashlib
+import threading
+from functools import lru_cache
+
+import markdown
+from django.conf import settings
+
+_converters = threading.local()
+
+
+def get_markdown_extensions():
+    """
+    Returns the Markdown extensions articles are rendered with, configurable through the
+    `MARKDOWN_EXTENSIONS` setting
+    """
+    return list(getattr(settings, 'MARKDOWN_EXTENSIONS', []))
+
+
+@lru_cache(maxsize=None)
+def get_renderer_version():
+    """
+    Returns a key identifying the Markdown version and extensions used for rendering, so that
+    HTML rendered by a different renderer can be detected as stale
+    """
+    renderer = f'{markdown.__version__}:{",".join(get_markdown_extensions())}'
+    return hashlib.sha1(renderer.encode()).hexdigest()[:12]
+
+
+def get_markdown_converter():
+    """
+    Returns a Markdown converter for the current thread, reused across renders since building one
+    costs about as much as converting a document. Converters are not thread safe, so each thread
+    gets its own.
+    """
+    extensions = get_markdown_extensions()
+    converter = getattr(_converters, 'converter', None)
+    if converter is None or _converters.extensions != extensions:
+        converter = _converters.converter = markdown.Markdown(extensions=extensions)
+        _converters.extensions = extensions
+    return converter
+
+
+def render_markdown(text):
+    """
+    Converts markdown text into HTML
+
+    Args:
+        text (str): Markdown text
+
+    Returns:
+        str: Rendered HTML
+    """
+    return get_markdown_converter().reset().convert(text)
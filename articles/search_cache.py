@@ -0,0 +1,110 @@
+"""
+Search result cache for articles app
+
+The results of a search are cached as the ordered ids of the matching articles, keyed on the normalized
+query, the search mode and the optional tag filter, so that every page of a popular search is sliced out
+of a single cached list and only the articles of the page are fetched. Queries are normalized by folding
+their case and collapsing their whitespace, which neither kind of search depends on, and the search runs
+on the normalized query so that all its spellings share the same results.
+
+Keys also hold the version of the articles as a whole, which changes whenever an article is created,
+updated, deleted or retagged, so that a change drops every cached search at once. Only the
+`SEARCH_RESULTS_CACHE_MAX_RESULTS` best ranked results are kept. Hits and misses are counted by the
+cache metrics, under the `search-results` key prefix.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .forms import SearchForm
+from .fragments import get_articles_version
+from .helpers import (get_articles_matching_full_text_search, get_articles_tagged_by_given_tag,
+                      get_most_similar_articles_based_on_trigram_similarity)
+
+SEARCH_RESULTS_KEY = 'search-results:{}:{}'
+
+
+def normalize_query(query):
+    """
+    Returns a query case folded, with its words separated by single spaces
+    """
+    return ' '.join(query.split()).casefold()
+
+
+def search_articles(query, mode):
+    """
+    Returns the articles matching a query in the given mode, ranked by relevance
+    """
+    if mode == SearchForm.MODE_FUZZY:
+        return get_most_similar_articles_based_on_trigram_similarity(query)
+    return get_articles_matching_full_text_search(query)
+
+
+def get_search_results_key(query, mode, tag_slug):
+    digest = hashlib.sha1(json.dumps([mode, query, tag_slug or '']).encode()).hexdigest()
+    return SEARCH_RESULTS_KEY.format(get_articles_version(), digest)
+
+
+class SearchResults:
+    """
+    Ranked results of a search, fetching only the articles of the slices taken from them, e.g. the page
+    of a paginator, along with the annotations of their search
+
+    Args:
+        query (str): Normalized query
+        mode (str): Search mode, one of the `SearchForm` modes
+        article_ids (list[int]): Ids of the matching articles, best ranked first
+    """
+
+    def __init__(self, query, mode, article_ids):
+        self.query = query
+        self.mode = mode
+        self.article_ids = article_ids
+
+    def __len__(self):
+        return len(self.article_ids)
+
+    def count(self):
+        return len(self.article_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._fetch(self.article_ids[index])
+        return self._fetch([self.article_ids[index]])[0]
+
+    def _fetch(self, article_ids):
+        if not article_ids:
+            return []
+        articles = search_articles(self.query, self.mode).filter(id__in=article_ids)
+        articles = {article.id: article for article in articles}
+        # Articles which stopped matching since the results were cached are left out, their change having
+        # already made the cached results stale
+        return [articles[article_id] for article_id in article_ids if article_id in articles]
+
+
+def get_search_results(query, mode=SearchForm.MODE_FULL_TEXT, tag_slug=None):
+    """
+    Returns the results of a search, from the search result cache if it is cached, or caches them
+
+    Args:
+        query (str): Query to search articles for
+        mode (str): Search mode, one of the `SearchForm` modes, full text search by default
+        tag_slug (str): Slug of the tag the results are filtered by, if any
+
+    Returns:
+        SearchResults: The ranked results, which pages can be sliced from
+    """
+    query = normalize_query(query)
+    mode = SearchForm.MODE_FUZZY if mode == SearchForm.MODE_FUZZY else SearchForm.MODE_FULL_TEXT
+    key = get_search_results_key(query, mode, tag_slug)
+
+    article_ids = cache.get(key)
+    if article_ids is None:
+        articles = search_articles(query, mode)
+        if tag_slug:
+            articles = get_articles_tagged_by_given_tag(articles, tag_slug)
+        article_ids = list(articles.values_list('id', flat=True)[:settings.SEARCH_RESULTS_CACHE_MAX_RESULTS])
+        cache.set(key, article_ids, timeout=settings.SEARCH_RESULTS_CACHE_TIMEOUT)
+    return SearchResults(query, mode, article_ids)
@@ -0,0 +1,226 @@
+"""
+Synthetic data generation for articles app
+"""
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .fragments import bump_articles_version
+from .helpers import rebuild_related_articles, refresh_tag_leaderboard
+from .importing import ArticleImporter
+from .models import Article, Comment, FeedEntry
+
+USERNAME_PREFIX = 'bench-'
+BATCH_SIZE = 5000
+
+WORDS = [
+    'django', 'python', 'postgres', 'index', 'search', 'query', 'cache', 'design', 'travel', 'cooking',
+    'music', 'history', 'science', 'startup', 'writing', 'health', 'finance', 'garden', 'climate', 'poetry',
+    'football', 'painting', 'rust', 'kernel', 'network', 'mobile', 'privacy', 'economy', 'coffee', 'mountain',
+    'ocean', 'city', 'memory', 'language', 'theory', 'practice', 'habit', 'family', 'school', 'market',
+    'energy', 'planet', 'camera', 'film', 'novel', 'recipe', 'bicycle', 'running', 'sleep', 'focus',
+    'team', 'product', 'review', 'release', 'server', 'browser', 'design', 'pattern', 'signal', 'graph',
+]
+
+
+class PowerLaw:
+    """
+    Samples items with a probability decreasing as a power of their rank, so that a few items are
+    picked very often and most items rarely, like the followers of profiles or the favorites of articles
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cumulative_weights = list(itertools.accumulate(
+            1 / (rank + 1) ** exponent for rank in range(len(self.items))
+        ))
+
+    def sample(self, count):
+        """
+        Returns up to `count` distinct items
+        """
+        if not self.items:
+            return []
+        picked = self.rng.choices(self.items, cum_weights=self.cumulative_weights, k=count)
+        return list(dict.fromkeys(picked))
+
+    def one(self):
+        return self.rng.choices(self.items, cum_weights=self.cumulative_weights)[0]
+
+
+def clear_seeded_data():
+    """
+    Deletes the profiles created by `seed`, along with their articles, comments, favorites and follows.
+    Comments are deleted first with a single query, since they would otherwise be deleted one by one to
+    send their signals.
+    """
+    profiles = get_user_model().objects.filter(username__startswith=USERNAME_PREFIX)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Comment._meta.db_table} WHERE article_id IN ('
+                f'SELECT id FROM {Article._meta.db_table} WHERE author_id = ANY(%s))',
+                [list(profiles.values_list('id', flat=True))]
+            )
+        profiles.delete()
+        bump_articles_version()
+
+
+def _around(rng, mean):
+    """
+    Returns a random count with the given mean, geometrically distributed so that most are small and a
+    few are large
+    """
+    if mean <= 0:
+        return 0
+    return int(rng.expovariate(1 / mean))
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _make_article(rng, author, tags, now):
+    paragraphs = [f'{_sentence(rng, rng.randint(20, 60))}.' for _ in range(rng.randint(2, 6))]
+    return {
+        'title': _sentence(rng, rng.randint(3, 8)),
+        'description': f'{_sentence(rng, rng.randint(8, 20))}.',
+        'content': f'# {_sentence(rng, 4)}\n\n' + '\n\n'.join(paragraphs),
+        'author': author,
+        'tags': tags.sample(rng.randint(1, 4)),
+        'created_at': (now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))).isoformat(),
+    }
+
+
+def seed(profiles, articles, tags=200, follows=20, favorites=10, comments=2, random_seed=0, log=None):
+    """
+    Replaces the previously seeded data with `profiles` profiles following each other along a power law,
+    `articles` articles by power law distributed authors and tagged by power law distributed tags, and
+    favorites and comments of the articles. The derived data, i.e. the counters, feed inboxes, search
+    vectors, related articles index and tag leaderboard, is kept consistent.
+
+    Args:
+        profiles (int): Number of profiles
+        articles (int): Number of articles
+        tags (int): Number of distinct tags
+        follows (float): Mean number of profiles followed per profile
+        favorites (float): Mean number of articles favorited per profile
+        comments (float): Mean number of comments per article
+        random_seed (int): Seed of the generator, the same seed generating the same data
+        log (callable): Called with progress messages
+
+    Returns:
+        dict: Number of rows created of each kind
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    Profile = get_user_model()
+
+    clear_seeded_data()
+
+    password = make_password(None)
+    Profile.objects.bulk_create([
+        Profile(username=f'{USERNAME_PREFIX}{index}', password=password)
+        for index in range(profiles)
+    ], batch_size=BATCH_SIZE)
+    profile_ids = list(Profile.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+    rng.shuffle(profile_ids)
+    log(f'Created {len(profile_ids)} profiles')
+
+    popular_profiles = PowerLaw(profile_ids, 1.0, rng)
+    Follow = Profile.followed_profiles.through
+    follow_rows = [
+        Follow(from_profile_id=follower_id, to_profile_id=followed_id)
+        for follower_id in profile_ids
+        for followed_id in popular_profiles.sample(_around(rng, follows))
+        if followed_id != follower_id
+    ]
+    Follow.objects.bulk_create(follow_rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    log(f'Created {len(follow_rows)} follows')
+
+    usernames = dict(Profile.objects.filter(id__in=profile_ids).values_list('id', 'username'))
+    prolific_authors = PowerLaw(profile_ids, 0.8, rng)
+    tag_names = PowerLaw(list(dict.fromkeys(
+        f'{rng.choice(WORDS)}{index}' if index >= len(WORDS) else WORDS[index] for index in range(tags)
+    )), 1.1, rng)
+
+    importer = ArticleImporter()
+    imported = 0
+    while imported < articles:
+        batch_size = min(BATCH_SIZE, articles - imported)
+        records = [
+            ('seed', _make_article(rng, usernames[prolific_authors.one()], tag_names, now))
+            for _ in range(batch_size)
+        ]
+        count, _ = importer.import_batch(records)
+        imported += count
+        log(f'Created {imported} articles')
+
+    article_ids = list(Article.objects.filter(author_id__in=profile_ids).values_list('id', flat=True))
+    rng.shuffle(article_ids)
+    popular_articles = PowerLaw(article_ids, 1.0, rng)
+
+    Favorite = Profile.favorite_articles.through
+    favorite_rows = [
+        Favorite(profile_id=profile_id, article_id=article_id)
+        for profile_id in profile_ids
+        for article_id in popular_articles.sample(_around(rng, favorites))
+    ]
+    Favorite.objects.bulk_create(favorite_rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    log(f'Created {len(favorite_rows)} favorites')
+
+    comment_rows = [
+        Comment(article_id=article_id, author_id=popular_profiles.one(), body=_sentence(rng, rng.randint(5, 30)))
+        for article_id in article_ids
+        for _ in range(_around(rng, comments))
+    ]
+    Comment.objects.bulk_create(comment_rows, batch_size=BATCH_SIZE)
+    log(f'Created {len(comment_rows)} comments')
+
+    with transaction.atomic():
+        _fan_out_favorites(profile_ids)
+    call_command('reconcile_counters', stdout=io.StringIO())
+    rebuild_related_articles()
+    refresh_tag_leaderboard(rebuild=True)
+    bump_articles_version()
+    log('Rebuilt the feed inboxes, counters, related articles index and tag leaderboard')
+
+    return {
+        'profiles': len(profile_ids),
+        'follows': len(follow_rows),
+        'articles': imported,
+        'favorites': len(favorite_rows),
+        'comments': len(comment_rows),
+    }
+
+
+def _fan_out_favorites(profile_ids):
+    """
+    Adds the articles favorited by the given profiles to their own feed inboxes and to their followers',
+    as the favorites receiver would, with a single insert
+    """
+    Profile = get_user_model()
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO {FeedEntry._meta.db_table} (owner_id, article_id, article_created_at)
+            SELECT owners.owner_id, favorites.article_id, articles.created_at
+            FROM {Profile.favorite_articles.through._meta.db_table} AS favorites
+            JOIN {Article._meta.db_table} AS articles ON articles.id = favorites.article_id
+            JOIN (
+                SELECT from_profile_id AS owner_id, to_profile_id AS profile_id
+                FROM {Profile.followed_profiles.through._meta.db_table}
+                UNION ALL
+                SELECT id, id FROM {Profile._meta.db_table}
+            ) AS owners ON owners.profile_id = favorites.profile_id
+            WHERE favorites.profile_id = ANY(%s)
+            ON CONFLICT DO NOTHING
+        ''', [list(profile_ids)])
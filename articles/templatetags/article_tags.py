@@ -1,16 +1,65 @@
 """
 Template tags for articles app
 """
-import markdown
 from django import template
 from django.utils.safestring import mark_safe
 
+from ..fragments import get_fragment_version
+from ..helpers import format_headline
+from ..rendering import render_markdown
+
 register = template.Library()
 
 
 @register.filter(name='markdown')
 def markdown_format(text):
     """
-    Converts text into markdown format
+    Converts text into markdown format. Article content should use the stored
+    `Article.get_content_html` instead.
+    """
+    return mark_safe(render_markdown(text))
+
+
+@register.filter(name='highlight')
+def highlight_headline(headline):
+    """
+    Converts a full text search headline into HTML with the matched terms highlighted
+    """
+    return mark_safe(format_headline(headline))
+
+
+@register.filter(name='has_favorited')
+def viewer_has_favorited(viewer, article):
+    """
+    Returns whether the viewer has favorited the article
+    """
+    return viewer.has_favorited(article)
+
+
+@register.filter(name='is_author')
+def viewer_is_author(viewer, article):
+    """
+    Returns whether the viewer is the author of the article
+    """
+    return viewer.is_author(article)
+
+
+@register.filter(name='fragment_version')
+def article_fragment_version(article):
+    """
+    Returns the version the cached fragments of the article are keyed on
+    """
+    return get_fragment_version(article)
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, **params):
+    """
+    Returns the query string of the current page with the given pagination parameters replacing the
+    current ones, keeping the rest such as the search query
     """
-    return mark_safe(markdown.markdown(text))
+    query = context['request'].GET.copy()
+    for name in ('page', 'cursor'):
+        query.pop(name, None)
+    query.update(params)
+    return f'?{query.urlencode()}'
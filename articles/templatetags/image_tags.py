@@ -0,0 +1,21 @@
+"""
+Template tags for responsive images
+"""
+from django import template
+from django.utils.html import format_html
+
+from articulate.images import get_srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_attrs(url, sizes):
+    """
+    Returns the `src` attribute of an image, along with the `srcset` of its resized variants and the given
+    `sizes` if it is stored under `MEDIA_ROOT`, e.g. `<img {% image_attrs profile.display "80px" %}>`
+    """
+    srcset = get_srcset(url)
+    if not srcset:
+        return format_html('src="{}"', url)
+    return format_html('src="{}" srcset="{}" sizes="{}"', url, srcset, sizes)
@@ -0,0 +1,433 @@
+"""
+Tests for articles app
+"""
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connections
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from articulate.concurrency import StreamingASGIHandler
+
+from .conditional import get_article_validators, get_feed_etag
+from .counters import CounterBuffer
+from .export import CSV, NDJSON, stream_export
+from .helpers import refresh_tag_leaderboard
+from .importing import ArticleImporter, InvalidRecord, read_records
+from .models import Article, Comment, FeedEntry, RelatedArticle, Tag
+from .pagination import NEXT, InvalidCursor, KeysetPaginator, encode_changes_cursor, encode_cursor
+
+Profile = get_user_model()
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'articulate.metrics.InstrumentedLocMemCache'}}
+
+
+class ExportOverASGITests(TransactionTestCase):
+    """
+    The export streams its rows from the database through the ASGI handler, outside of the event loop
+    """
+
+    def get_over_asgi(self, path, cookies):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookies.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+
+        async def request():
+            communicator = ApplicationCommunicator(StreamingASGIHandler(), scope)
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(timeout=10)
+            body = b''
+            while True:
+                message = await communicator.receive_output(timeout=10)
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            await communicator.wait()
+            return start, body
+
+        # The persistent connection of the thread the view ran in would outlive the test database otherwise
+        self.addCleanup(lambda: SyncToAsync.single_thread_executor.submit(connections.close_all).result())
+        return async_to_sync(request)()
+
+    def test_streams_the_export(self):
+        staff = Profile.objects.create(username='staff', is_staff=True)
+        Tag.objects.create(name='python', slug='python')
+        Tag.objects.create(name='django', slug='django')
+        client = Client()
+        client.force_login(staff)
+
+        start, body = self.get_over_asgi(
+            reverse('api_articles:export', args=['tags']),
+            f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        )
+
+        self.assertEqual(start['status'], 200)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['python', 'django'])
+
+
+class FeedInboxTests(TestCase):
+    """
+    The local feed inboxes follow the favorites and follows of the profiles, cleared relations included
+    """
+
+    def setUp(self):
+        self.reader = Profile.objects.create(username='reader')
+        self.writer = Profile.objects.create(username='writer')
+        self.other = Profile.objects.create(username='other')
+        self.reader.followed_profiles.add(self.writer)
+        self.authored = Article.objects.create(title='Authored', description='-', content='-', author=self.writer)
+        self.favorited = Article.objects.create(title='Favorited', description='-', content='-', author=self.other)
+        self.writer.favorite_articles.add(self.favorited)
+
+    def get_inbox(self, profile):
+        return set(FeedEntry.objects.filter(owner=profile).values_list('article_id', flat=True))
+
+    def test_fans_out_authored_and_favorited_articles(self):
+        self.assertEqual(self.get_inbox(self.reader), {self.authored.id, self.favorited.id})
+
+    def test_clearing_favorites_prunes_the_inboxes(self):
+        self.writer.favorite_articles.clear()
+
+        self.assertEqual(self.get_inbox(self.reader), {self.authored.id})
+        self.assertEqual(self.get_inbox(self.writer), set())
+
+    def test_clearing_favorited_by_prunes_the_inboxes(self):
+        self.favorited.favorited.clear()
+
+        self.assertEqual(self.get_inbox(self.reader), {self.authored.id})
+        self.assertEqual(self.get_inbox(self.writer), set())
+
+    def test_clearing_followers_prunes_their_inboxes(self):
+        self.writer.followers.clear()
+
+        self.assertEqual(self.get_inbox(self.reader), set())
+
+    def test_clearing_followed_profiles_rebuilds_the_inbox(self):
+        self.reader.followed_profiles.clear()
+
+        self.assertEqual(self.get_inbox(self.reader), set())
+
+    def test_keeps_articles_still_favorited_by_a_followed_profile(self):
+        self.reader.followed_profiles.add(self.other)
+        self.other.favorite_articles.add(self.favorited)
+
+        self.writer.favorite_articles.clear()
+
+        self.assertEqual(self.get_inbox(self.reader), {self.authored.id, self.favorited.id})
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Keyset pages follow each other through their cursors, and forged cursors are rejected
+    """
+
+    def setUp(self):
+        author = Profile.objects.create(username='author')
+        self.articles = [
+            Article.objects.create(title=f'Article {index}', description='-', content='-', author=author)
+            for index in range(5)
+        ]
+        self.paginator = KeysetPaginator(Article.objects.all(), 2)
+
+    def test_pages_from_the_most_recent(self):
+        first = self.paginator.page()
+        second = self.paginator.page(first.next_cursor)
+        last = self.paginator.page(second.next_cursor)
+
+        self.assertEqual(list(first), self.articles[4:2:-1])
+        self.assertEqual(list(second), self.articles[2:0:-1])
+        self.assertEqual(list(last), self.articles[:1])
+        self.assertFalse(last.has_next())
+        self.assertEqual(list(self.paginator.page(last.previous_cursor)), self.articles[2:0:-1])
+
+    def test_rejects_malformed_cursors(self):
+        for cursor in ('not a cursor', encode_cursor('x', self.articles[0].created_at, 1)):
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(cursor)
+
+    def test_rejects_keys_not_fitting_the_key_field(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(encode_cursor(NEXT, 1.5, 1))
+
+        scored = Article.objects.annotate(recommendation_score=F('favorites_count'))
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(scored, 2, key_field='recommendation_score').page(
+                encode_cursor(NEXT, self.articles[0].created_at, 1)
+            )
+
+    def test_api_answers_forged_cursors_with_not_found(self):
+        response = Client().get(reverse('api_articles:article-list'), {'cursor': encode_cursor(NEXT, 1.5, 1)})
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FeedETagTests(TransactionTestCase):
+    """
+    The ETag of a feed page changes with what the page shows
+    """
+
+    def setUp(self):
+        self.author = Profile.objects.create(username='author')
+        self.user = Profile.objects.create(username='reader')
+
+    def test_changes_with_new_articles(self):
+        etag = get_feed_etag(self.user, '/')
+        Article.objects.create(title='New', description='-', content='-', author=self.author)
+
+        self.assertNotEqual(get_feed_etag(self.user, '/'), etag)
+
+    def test_changes_with_trending_tags_refresh(self):
+        etag = get_feed_etag(self.user, '/', with_trending_tags=True)
+        refresh_tag_leaderboard()
+
+        self.assertNotEqual(get_feed_etag(self.user, '/', with_trending_tags=True), etag)
+
+    def test_is_per_viewer(self):
+        self.assertNotEqual(get_feed_etag(self.user, '/'), get_feed_etag(self.author, '/'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArticleETagTests(TransactionTestCase):
+    """
+    The ETag of an article page changes with the article, its comments and favorites, the similar articles
+    it shows and the viewer, but not with other articles
+    """
+
+    def setUp(self):
+        self.author = Profile.objects.create(username='author')
+        self.reader = Profile.objects.create(username='reader')
+        self.article = self.create_article('Article')
+        self.similar = self.create_article('Similar')
+        self.other = self.create_article('Other')
+        RelatedArticle.objects.create(article=self.article, related_article=self.similar, shared_tags=1, rank=0)
+
+    def create_article(self, title):
+        return Article.objects.create(title=title, description='-', content='-', author=self.author)
+
+    def get_etag(self, user=None):
+        return get_article_validators(user or self.reader, with_similar=True, pk=self.article.pk)[1]
+
+    def test_ignores_other_articles(self):
+        etag = self.get_etag()
+        self.other.title = 'Edited'
+        self.other.save()
+        self.create_article('New')
+
+        self.assertEqual(self.get_etag(), etag)
+
+    def test_changes_with_comments_and_favorites(self):
+        etag = self.get_etag()
+        Comment.objects.create(author=self.reader, article=self.article, body='Nice')
+        commented_etag = self.get_etag()
+        self.reader.favorite_articles.add(self.article)
+
+        self.assertNotEqual(commented_etag, etag)
+        self.assertNotEqual(self.get_etag(), commented_etag)
+
+    def test_changes_with_similar_articles(self):
+        etag = self.get_etag()
+        self.similar.title = 'Edited'
+        self.similar.save()
+
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_is_per_viewer(self):
+        self.assertNotEqual(self.get_etag(), self.get_etag(self.author))
+
+
+class CommentChangesTests(TestCase):
+    """
+    Clients polling the changes of the comments of an article get every comment posted and deleted once,
+    including the ones committed after newer ones
+    """
+
+    def setUp(self):
+        self.author = Profile.objects.create(username='author')
+        self.article = Article.objects.create(title='Article', description='-', content='-', author=self.author)
+        self.url = reverse('api_articles:comment-list', args=[self.article.pk])
+
+    def comment(self, body):
+        return Comment.objects.create(author=self.author, article=self.article, body=body)
+
+    def get_changes(self, changes_url):
+        response = self.client.get(changes_url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_follows_posted_and_deleted_comments(self):
+        first = self.comment('First')
+        changes = self.get_changes(self.client.get(self.url).json()['changes'])
+        self.assertEqual((changes['results'], changes['deleted']), ([], []))
+
+        second = self.comment('Second')
+        first_id = first.id
+        first.delete()
+        changes = self.get_changes(changes['changes'])
+        self.assertEqual([comment['id'] for comment in changes['results']], [second.id])
+        self.assertEqual(changes['deleted'], [first_id])
+
+        changes = self.get_changes(changes['changes'])
+        self.assertEqual((changes['results'], changes['deleted']), ([], []))
+
+    def test_gets_comments_committed_after_newer_ones(self):
+        late = self.comment('Committed last')
+        newer = self.comment('Committed first')
+        # A client that saw the newer comment before the transaction of the older one committed
+        since = encode_changes_cursor(newer.id, 0, [newer.id])
+
+        changes = self.get_changes(f'{self.url}?since={since}')
+        self.assertEqual([comment['id'] for comment in changes['results']], [late.id])
+
+        changes = self.get_changes(changes['changes'])
+        self.assertEqual(changes['results'], [])
+
+    def test_answers_malformed_cursors_with_not_found(self):
+        self.assertEqual(self.client.get(f'{self.url}?since=not-a-cursor').status_code, 404)
+
+
+class CounterBufferTests(TestCase):
+    """
+    Buffered counters and relations are written on flush, merged, and kept for the next flush when the
+    database can not be reached
+    """
+
+    def setUp(self):
+        self.buffer = CounterBuffer()
+        # Flushed by the tests rather than by a background thread
+        self.buffer._ensure_flusher = lambda: None
+        self.profile = Profile.objects.create(username='reader')
+        self.articles = [
+            Article.objects.create(title=f'Article {index}', description='-', content='-', author=self.profile)
+            for index in range(2)
+        ]
+        self.tag = Tag.objects.create(name='python', slug='python')
+
+    def test_flushes_merged_increments(self):
+        for _ in range(3):
+            for article in self.articles:
+                self.buffer.increment(Article, article.pk, 'view_count')
+        self.buffer.increment(Tag, self.tag.pk, 'click_count', 2)
+
+        self.buffer.flush()
+
+        self.assertEqual(list(Article.objects.order_by('id').values_list('view_count', flat=True)), [3, 3])
+        self.assertEqual(Tag.objects.get().click_count, 2)
+        self.buffer.flush()
+        self.assertEqual(list(Article.objects.order_by('id').values_list('view_count', flat=True)), [3, 3])
+
+    def test_flushes_relations_skipping_existing_and_dangling_rows(self):
+        through = Tag.clicked_by_profile.through
+        through.objects.create(tag=self.tag, profile=self.profile)
+        other = Profile.objects.create(username='other')
+        deleted = Profile.objects.create(username='deleted')
+        for profile_id in (self.profile.pk, other.pk, deleted.pk):
+            self.buffer.add_relation(through, tag_id=self.tag.pk, profile_id=profile_id)
+        deleted.delete()
+
+        self.buffer.flush()
+
+        self.assertEqual(set(through.objects.values_list('profile_id', flat=True)), {self.profile.pk, other.pk})
+
+    def test_keeps_increments_when_the_database_can_not_be_reached(self):
+        self.buffer.increment(Article, self.articles[0].pk, 'view_count')
+
+        with mock.patch.object(CounterBuffer, '_write_increments', side_effect=OperationalError('down')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.buffer.increment(Article, self.articles[0].pk, 'view_count')
+        self.buffer.flush()
+
+        self.assertEqual(Article.objects.get(pk=self.articles[0].pk).view_count, 2)
+
+
+class ExportTests(TestCase):
+    """
+    Datasets are exported as NDJSON or CSV, optionally gzipped and resumed after a given id
+    """
+
+    def setUp(self):
+        author = Profile.objects.create(username='author')
+        self.tags = [Tag.objects.create(name=name, slug=name) for name in ('python', 'django')]
+        self.article = Article.objects.create(title='Article', description='-', content='-', author=author)
+        self.article.tags.set(self.tags)
+
+    def export(self, *args, **kwargs):
+        return b''.join(stream_export(*args, chunk_size=1, **kwargs))
+
+    def test_exports_articles_as_ndjson(self):
+        row, = [json.loads(line) for line in self.export('articles', NDJSON).decode().splitlines()]
+
+        self.assertEqual(row['slug'], self.article.slug)
+        self.assertEqual(row['author_username'], 'author')
+        self.assertEqual(row['tag_names'], ['django', 'python'])
+
+    def test_exports_tags_as_csv_after_an_id(self):
+        lines = self.export('tags', CSV, after=self.tags[0].pk).decode().splitlines()
+
+        self.assertEqual(lines, ['id,name,slug,click_count', f'{self.tags[1].pk},django,django,0'])
+
+    def test_gzips_the_export(self):
+        self.assertEqual(gzip.decompress(self.export('tags', CSV, compress=True)), self.export('tags', CSV))
+
+
+class ImportTests(TestCase):
+    """
+    Articles are imported in batches with their tags, unique slugs, creation dates and feed inbox entries,
+    skipping the invalid records
+    """
+
+    def setUp(self):
+        self.author = Profile.objects.create(username='author')
+        self.follower = Profile.objects.create(username='follower')
+        self.follower.followed_profiles.add(self.author)
+        Article.objects.create(title='Hello', description='-', content='-', author=self.author)
+
+    def test_imports_a_batch(self):
+        records = [
+            ('1', {'title': 'Hello', 'content': 'Body', 'tags': 'Python, django', 'author': 'author',
+                   'created_at': '2020-01-02T03:04:05+00:00'}),
+            ('2', {'title': 'Untitled'}),
+            ('3', {'title': 'Stranger', 'content': 'Body', 'author': 'nobody'}),
+        ]
+
+        count, errors = ArticleImporter().import_batch(records)
+
+        self.assertEqual(count, 1)
+        self.assertEqual([error.location for error in errors], ['2', '3'])
+        self.assertTrue(all(isinstance(error, InvalidRecord) for error in errors))
+        article = Article.objects.get(slug='hello-2')
+        self.assertEqual(article.created_at.isoformat(), '2020-01-02T03:04:05+00:00')
+        self.assertEqual(sorted(article.tags.values_list('name', flat=True)), ['django', 'python'])
+        self.assertEqual(article.content_html, '<p>Body</p>')
+        self.assertTrue(FeedEntry.objects.filter(owner=self.follower, article=article).exists())
+
+    def test_reads_markdown_files_with_front_matter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'first-post.md').write_text('---\ntags: python\nauthor: "author"\n---\n\n# Body\n')
+
+            records = list(read_records(directory))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0][1], {'tags': 'python', 'author': 'author', 'title': 'first post',
+                                         'content': '# Body\n'})
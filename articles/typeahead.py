@@ -0,0 +1,360 @@
+"""
+Search-as-you-type index for articles app
+
+Tag names, article titles and usernames are looked up by prefix in an index held in memory by every
+process, so that suggestions are answered without a database round trip. The keys of an entry are its
+normalized label and the suffixes of the label starting at each of its first `MAX_WORDS` words, e.g.
+"python tips" and "tips" for an article titled "Python Tips", kept in a sorted list so that the keys
+starting with a prefix form a contiguous range found by bisection. The best `TOP_K` entries are
+precomputed for every prefix of at most `SHORT_PREFIX_LENGTH` characters, and for every longer prefix
+matching more than `SCAN_LIMIT` keys, e.g. a word most titles start with, so that lookups by any other
+prefix scan at most that many keys.
+
+Entries are ranked by whether the prefix starts their label, then by their popularity: the click count
+of tags, the favorites count of articles and the followers count of profiles. Only the
+`TYPEAHEAD_MAX_ENTRIES` most popular entries of each kind are loaded, which bounds the memory used.
+
+The index is loaded when the process starts serving, kept up to date for the changes made by this process
+by the receivers of the models, which queue them for a background thread to apply in batches, and
+reloaded every `TYPEAHEAD_REFRESH_INTERVAL` seconds for the changes made by the others and the new
+popularities. Lookups read an immutable snapshot of the index, which updates replace, so they never wait
+for one.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from .models import Article, Tag
+
+logger = logging.getLogger(__name__)
+
+TAG = 'tag'
+ARTICLE = 'article'
+PROFILE = 'profile'
+KINDS = (TAG, ARTICLE, PROFILE)
+
+MAX_WORDS = 6
+TOP_K = 10
+SHORT_PREFIX_LENGTH = 3
+SCAN_LIMIT = 1000
+BISECT_LIMIT = 256
+MAX_QUERY_LENGTH = 50
+LOAD_TIMEOUT = 10
+LAST_CODE_POINT = chr(0x10FFFF)
+
+Entry = namedtuple('Entry', 'pk label slug popularity')
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    Returns the words of a text, case folded and stripped of accents, joined by single spaces
+    """
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return ' '.join(_WORD_RE.findall(text))
+
+
+def get_keys(entry):
+    """
+    Returns the keys of an entry as `(key, pk, starts_label)` tuples
+    """
+    words = normalize(entry.label).split(' ')
+    return [(' '.join(words[start:]), entry.pk, start == 0)
+            for start in range(min(len(words), MAX_WORDS)) if words[start]]
+
+
+class PrefixIndex:
+    """
+    Immutable prefix index of the entries of one kind, by primary key. The update methods return a new
+    index.
+    """
+
+    def __init__(self, entries, keys=None, top=None):
+        self.entries = entries
+        if keys is None:
+            keys = sorted(key for entry in entries.values() for key in get_keys(entry))
+        self.keys = keys
+        self.top = top if top is not None else self._compute_top()
+
+    def _rank(self, key):
+        return key[2], self.entries[key[1]].popularity
+
+    def _compute_top(self):
+        top = {}
+        for key in sorted(self.keys, key=self._rank, reverse=True):
+            text, pk = key[0], key[1]
+            for length in range(1, min(len(text), SHORT_PREFIX_LENGTH) + 1):
+                pks = top.setdefault(text[:length], [])
+                if len(pks) < TOP_K and pk not in pks:
+                    pks.append(pk)
+
+        # A prefix can only match more keys than the scan limit if the prefix one character shorter does
+        frontier = [prefix for prefix in top if len(prefix) == SHORT_PREFIX_LENGTH]
+        while frontier:
+            longer = set()
+            for prefix in frontier:
+                start, stop = self._get_range(prefix)
+                if stop - start <= SCAN_LIMIT:
+                    continue
+                if len(prefix) > SHORT_PREFIX_LENGTH:
+                    top[prefix] = self._scan(prefix, TOP_K)
+                longer.update(self.keys[index][0][:len(prefix) + 1] for index in range(start, stop)
+                              if len(self.keys[index][0]) > len(prefix))
+            frontier = longer
+        return top
+
+    def _get_range(self, prefix):
+        """
+        Returns the bounds of the range of the keys starting with the prefix
+        """
+        # Keys starting with the prefix sort before the prefix followed by the last code point
+        return bisect_left(self.keys, (prefix,)), bisect_left(self.keys, (prefix + LAST_CODE_POINT,))
+
+    def _scan(self, prefix, limit):
+        """
+        Returns the primary keys of the `limit` best ranked entries having a key starting with the prefix
+        """
+        best = {}
+        for index in range(*self._get_range(prefix)):
+            key = self.keys[index]
+            rank = self._rank(key)
+            if rank > best.get(key[1], (False, -1)):
+                best[key[1]] = rank
+        return heapq.nlargest(limit, best, key=best.__getitem__)
+
+    def lookup(self, prefix, limit):
+        """
+        Returns the `limit` best ranked entries having a key starting with the normalized prefix
+        """
+        pks = self.top.get(prefix)
+        if pks is None:
+            pks = self._scan(prefix, limit) if len(prefix) > SHORT_PREFIX_LENGTH else ()
+        return [self.entries[pk] for pk in pks[:limit]]
+
+    def _update_top(self, prefix, previous_entries):
+        """
+        Updates the precomputed best entries of a prefix for the changed entries, given as their previous
+        versions by primary key, None for the new ones. The entries of the list are re-ranked in place,
+        and the keys starting with the prefix are only scanned again when a full list loses an entry or
+        an entry ranked lower, since the next best one is not known then.
+        """
+        def rank(entry):
+            # The same as the best rank of the entry's keys starting with the prefix, if it has one
+            if entry is None or not any(key[0].startswith(prefix) for key in get_keys(entry)):
+                return None
+            return normalize(entry.label).startswith(prefix), entry.popularity
+
+        pks = self.top.get(prefix, [])
+        demoted = False
+        for pk, previous in previous_entries.items():
+            if pk in pks:
+                new_rank = rank(self.entries.get(pk))
+                demoted = demoted or new_rank is None or new_rank < rank(previous)
+
+        if demoted and len(pks) >= TOP_K:
+            pks = self._scan(prefix, TOP_K)
+        else:
+            candidates = [pk for pk in pks if pk not in previous_entries]
+            candidates += [pk for pk in previous_entries if rank(self.entries.get(pk)) is not None]
+            pks = sorted(candidates, key=lambda pk: rank(self.entries[pk]), reverse=True)[:TOP_K]
+
+        if pks:
+            self.top[prefix] = pks
+        else:
+            self.top.pop(prefix, None)
+
+    def update(self, entries):
+        """
+        Returns the index with the given entries added, or replacing the ones with the same primary keys,
+        and the ones given as None removed
+
+        Args:
+            entries (dict): The new version of each changed entry, or None if it was deleted, by primary key
+        """
+        previous_entries = {pk: self.entries.get(pk) for pk, entry in entries.items() if self.entries.get(pk) != entry}
+        if not previous_entries:
+            return self
+
+        removed = {key for previous in previous_entries.values() if previous for key in get_keys(previous)}
+        added = [key for pk in previous_entries if entries[pk] for key in get_keys(entries[pk])]
+        if len(removed) + len(added) <= BISECT_LIMIT:
+            keys = list(self.keys)
+            for key in removed:
+                del keys[bisect_left(keys, key)]
+            for key in added:
+                insort(keys, key)
+        else:
+            # Sorting the kept keys followed by the added ones only merges the two sorted runs
+            keys = [key for key in self.keys if key not in removed] + added
+            keys.sort()
+        merged = {**self.entries, **entries}
+        index = PrefixIndex({pk: entry for pk, entry in merged.items() if entry is not None}, keys, dict(self.top))
+
+        # The precomputed prefixes are kept until the next reload, so that some may match fewer keys by then
+        changed_by_prefix = {}
+        for pk, previous in previous_entries.items():
+            for key in (get_keys(previous) if previous else []) + (get_keys(entries[pk]) if entries[pk] else []):
+                for length in range(1, len(key[0]) + 1):
+                    prefix = key[0][:length]
+                    if length <= SHORT_PREFIX_LENGTH or prefix in self.top:
+                        changed_by_prefix.setdefault(prefix, {})[pk] = previous
+        for prefix, changed in changed_by_prefix.items():
+            index._update_top(prefix, changed)
+        return index
+
+
+def load_entries(kind):
+    """
+    Loads the `TYPEAHEAD_MAX_ENTRIES` most popular entries of a kind from the database
+    """
+    limit = settings.TYPEAHEAD_MAX_ENTRIES
+    if kind == TAG:
+        rows = Tag.objects.order_by('-click_count', 'id').values_list('id', 'name', 'slug', 'click_count')[:limit]
+    elif kind == ARTICLE:
+        rows = Article.objects.order_by('-favorites_count', '-id').values_list(
+            'id', 'title', 'slug', 'favorites_count')[:limit]
+    else:
+        rows = ((pk, username, username, followers_count) for pk, username, followers_count in
+                get_user_model().objects.order_by('-followers_count', 'id').values_list(
+                    'id', 'username', 'followers_count')[:limit].iterator())
+    return {row[0]: Entry(*row) for row in rows}
+
+
+def get_entry(kind, instance):
+    if kind == TAG:
+        return Entry(instance.pk, instance.name, instance.slug, instance.click_count)
+    if kind == ARTICLE:
+        return Entry(instance.pk, instance.title, instance.slug, instance.favorites_count)
+    return Entry(instance.pk, instance.username, instance.username, instance.followers_count)
+
+
+def get_entry_url(kind, entry):
+    if kind == TAG:
+        return reverse('articles:article_list_by_tag', args=[entry.slug])
+    if kind == ARTICLE:
+        return reverse('articles:article_detail', kwargs={'article_slug': entry.slug})
+    return reverse('profiles:profile_detail', args=[entry.slug])
+
+
+class TypeaheadIndex:
+    """
+    Prefix indexes of the tags, articles and profiles, loaded on first use or by `start`, and reloaded
+    every `TYPEAHEAD_REFRESH_INTERVAL` seconds by a background thread, which also applies the changes made
+    by this process in batches
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._changed = threading.Event()
+        self._indexes = None
+        self._pending = None
+        self._refresher = None
+
+    def start(self):
+        """
+        Starts loading the index in the background, e.g. when the process starts serving
+        """
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._refresh_periodically, name='typeahead-refresh',
+                                                   daemon=True)
+                self._refresher.start()
+
+    def _refresh_periodically(self):
+        next_reload = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() >= next_reload:
+                    next_reload = time.monotonic() + settings.TYPEAHEAD_REFRESH_INTERVAL
+                    self.reload()
+                else:
+                    self.apply_pending()
+            except Exception:
+                logger.exception('Failed to update the typeahead index')
+            self._changed.wait(max(0, next_reload - time.monotonic()))
+            self._changed.clear()
+
+    def reload(self):
+        """
+        Loads the index from the database, replacing the current one. The changes made while it loads are
+        applied to it again, since it may have been read before they were committed.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                if self._pending is None:
+                    self._pending = {kind: {} for kind in KINDS}
+            indexes = {kind: PrefixIndex(load_entries(kind)) for kind in KINDS}
+            with self._lock:
+                self._indexes = indexes
+            self._apply_pending()
+        self._loaded.set()
+
+    def apply_pending(self):
+        """
+        Applies the changes made by this process since the last time to the index, all the changes to
+        entries of a kind at once
+        """
+        with self._rebuild_lock:
+            self._apply_pending()
+
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {kind: {} for kind in KINDS}
+            indexes = self._indexes
+        if indexes is None or not any(pending.values()):
+            return
+        indexes = {kind: index.update(pending[kind]) if pending[kind] else index for kind, index in indexes.items()}
+        with self._lock:
+            self._indexes = indexes
+
+    def lookup(self, query, limit=5):
+        """
+        Returns the best ranked entries of every kind matching a query, waiting up to `LOAD_TIMEOUT` seconds
+        for the index to be loaded if it is not yet
+
+        Returns:
+            dict: The `Entry` tuples of the matching tags, articles and profiles, by kind, none if the index
+            could not be loaded in time
+        """
+        if self._refresher is None or not self._refresher.is_alive():
+            # Not started yet, or started before the process was forked
+            self.start()
+        if not self._loaded.is_set():
+            self._loaded.wait(LOAD_TIMEOUT)
+        prefix = normalize(query[:MAX_QUERY_LENGTH])
+        indexes = self._indexes
+        return {kind: indexes[kind].lookup(prefix, limit) if prefix and indexes else [] for kind in KINDS}
+
+    def put(self, kind, instance):
+        """
+        Adds a tag, article or profile to the index, or updates it
+        """
+        self._update(kind, instance.pk, get_entry(kind, instance))
+
+    def remove(self, kind, pk):
+        self._update(kind, pk, None)
+
+    def _update(self, kind, pk, entry):
+        # Queued for the refresher thread, the latest change to an entry replacing the earlier ones, so that
+        # saving an object does not rebuild the index. Processes that never load it do not keep changes.
+        with self._lock:
+            if self._pending is None:
+                return
+            self._pending[kind][pk] = entry
+        self._changed.set()
+
+
+typeahead_index = TypeaheadIndex()
@@ -1,20 +1,29 @@
 """
 Urls for articles app
 """
+from django.conf import settings
 from django.urls import path, re_path
 
 from . import views
 
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+    article_list = async_views.article_list
+    article_detail = async_views.article_detail
+else:
+    article_list = views.ArticleListView.as_view()
+    article_detail = views.ArticleDetailView.as_view()
+
 app_name = 'articles'
 urlpatterns = [
-    path('', views.ArticleListView.as_view(), name='article_list'),
-    path('local-feed/', views.ArticleListView.as_view(), {'local': True}, name='article_local_feed'),
-    path('local-feed/tag/<slug:tag_slug>/', views.ArticleListView.as_view(), {'local': True},
-         name='article_local_feed_by_tag'),
-    path('tag/<slug:tag_slug>/', views.ArticleListView.as_view(), name='article_list_by_tag'),
-    path('search/<slug:query>/', views.ArticleListView.as_view(), name='article_list_by_search'),
+    path('', article_list, name='article_list'),
+    path('local-feed/', article_list, {'local': True}, name='article_local_feed'),
+    path('local-feed/tag/<slug:tag_slug>/', article_list, {'local': True}, name='article_local_feed_by_tag'),
+    path('recommended/', article_list, {'recommended': True}, name='article_recommended_feed'),
+    path('tag/<slug:tag_slug>/', article_list, name='article_list_by_tag'),
+    path('search/<slug:query>/', article_list, name='article_list_by_search'),
     path('new/', views.ArticleCreateView.as_view(), name='article_create_new'),
-    path('<slug:article_slug>/', views.ArticleDetailView.as_view(), name='article_detail'),
+    path('<slug:article_slug>/', article_detail, name='article_detail'),
     path('<slug:article_slug>/edit/', views.ArticleUpdateView.as_view(), name='article_edit'),
     path('<slug:article_slug>/delete/', views.ArticleDeleteView.as_view(), name='article_delete'),
     re_path('(?P<slug>[-\w]+)/(?P<rate>favourite|unfavourite)/$', views.ArticleRateView.as_view(), name='article_rate'),
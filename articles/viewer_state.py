@@ -0,0 +1,73 @@
+"""
+Request scoped state of the viewer for articles app
+"""
+from django.contrib.auth import get_user_model
+
+
+class ViewerState:
+    """
+    Resolves whether the viewer has favorited, is following or is the author of the articles and
+    profiles shown on a page. Loading a whole page of articles or profiles resolves their state with a
+    single query per relation, and objects that were not loaded beforehand are resolved on demand.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.favorited_ids = set()
+        self.followed_ids = set()
+        self.loaded_article_ids = set()
+        self.loaded_profile_ids = set()
+
+    @property
+    def is_authenticated(self):
+        return self.user is not None and self.user.is_authenticated
+
+    def load_articles(self, articles):
+        """
+        Resolves the favorite state of the viewer for all the given articles in one query
+        """
+        article_ids = {article.pk for article in articles} - self.loaded_article_ids
+        if self.is_authenticated and article_ids:
+            favorites = get_user_model().favorite_articles.through.objects
+            self.favorited_ids |= set(favorites.filter(
+                profile_id=self.user.pk, article_id__in=article_ids).values_list('article_id', flat=True))
+        self.loaded_article_ids |= article_ids
+
+    def load_profiles(self, profiles):
+        """
+        Resolves the follow state of the viewer for all the given profiles in one query
+        """
+        profile_ids = {profile.pk for profile in profiles} - self.loaded_profile_ids
+        if self.is_authenticated and profile_ids:
+            follows = get_user_model().followed_profiles.through.objects
+            self.followed_ids |= set(follows.filter(
+                from_profile_id=self.user.pk, to_profile_id__in=profile_ids).values_list('to_profile_id', flat=True))
+        self.loaded_profile_ids |= profile_ids
+
+    def has_favorited(self, article):
+        if article.pk not in self.loaded_article_ids:
+            self.load_articles([article])
+        return article.pk in self.favorited_ids
+
+    def is_following(self, profile):
+        if profile.pk not in self.loaded_profile_ids:
+            self.load_profiles([profile])
+        return profile.pk in self.followed_ids
+
+    def is_author(self, article):
+        return self.is_authenticated and article.author_id == self.user.pk
+
+
+def get_viewer_state(request):
+    """
+    Returns the viewer state of the request's user, shared by everything rendering the request
+
+    Args:
+        request (HttpRequest): Current request
+
+    Returns:
+        ViewerState: State of the viewer
+    """
+    if not hasattr(request, '_viewer_state'):
+        request._viewer_state = ViewerState(getattr(request, 'user', None))
+    return request._viewer_state
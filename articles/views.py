@@ -4,27 +4,49 @@ Views for the articles app
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.postgres.search import TrigramSimilarity
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db.models import Count, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.generic import (CreateView, DeleteView, FormView, ListView,
                                   UpdateView)
 from django.views.generic.detail import DetailView, SingleObjectMixin
 from django.views.generic.edit import FormMixin
 
+from articulate.replicas import use_primary_database
+from profiles.models import profile_cache
+
+from .conditional import ConditionalGetMixin, get_article_validators, get_feed_etag
+from .counters import counter_buffer
 from .forms import ArticleForm, CommentForm, SearchForm
+from .fragments import load_fragment_versions
 from .helpers import (
-    get_articles_liked_and_authored_by_followed_profiles,
     get_articles_tagged_by_given_tag,
-    get_most_similar_articles_based_on_trigram_similarity,
-    get_top_n_most_popular_tags
+    get_comment_sync_markers,
+    get_feed_inbox_articles,
+    get_recommended_articles,
+    get_trending_tags
 )
-from .models import Article, Comment, Tag
+from .models import Article, Comment, Tag, article_cache
+from .pagination import InvalidCursor, KeysetPaginator, encode_changes_cursor
+from .search_cache import get_search_results
+from .signals import tag_click
 
 
-class ArticleListView(FormMixin, ListView):
+class ArticleLookupMixin:
+    """
+    Mixin for the views of a single article, looking it up by slug through the article cache, so that
+    their permission checks and the view itself share a single fetch
+    """
+    slug_url_kwarg = 'article_slug'
+
+    def get_object(self, queryset=None):
+        return article_cache.get_object_or_404(slug=self.kwargs[self.slug_url_kwarg])
+
+
+class ArticleListView(ConditionalGetMixin, FormMixin, ListView):
     """
     View to handle all the data of the index page
     """
@@ -35,43 +57,111 @@ class ArticleListView(FormMixin, ListView):
     context_object_name = 'articles'
 
     def get_queryset(self):
-        feed_articles = self.get_feed_articles()
+        """
+        Returns the articles of the feed, or the results of the search replacing it, which are read through
+        the search result cache
+        """
+        tag_slug_query = self.kwargs.get('tag_slug')
 
         if 'query' in self.request.GET:
             search_form = SearchForm(self.request.GET)
             if search_form.is_valid():
-                search_query = search_form.cleaned_data['query']
-                feed_articles = get_most_similar_articles_based_on_trigram_similarity(search_query)
+                return get_search_results(search_form.cleaned_data['query'], search_form.cleaned_data['mode'],
+                                          tag_slug=tag_slug_query)
 
-        tag_slug_query = self.kwargs.get('tag_slug')
+        feed_articles = self.get_feed_articles()
         if tag_slug_query:
             feed_articles = get_articles_tagged_by_given_tag(feed_articles, tag_slug_query)
 
         return feed_articles
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates the feeds with keyset pagination on their creation date, or on the score of the
+        recommendations for the recommended feed. Search results are ranked on relevance instead, so these
+        keep the default page number pagination.
+        """
+        if self.is_search():
+            return super().paginate_queryset(queryset, page_size)
+
+        if self.is_recommended_feed():
+            key_field = 'recommendation_score'
+        else:
+            key_field = 'feed_created_at' if self.is_local_feed() else 'created_at'
+        paginator = KeysetPaginator(queryset, page_size, key_field=key_field)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as error:
+            raise Http404(str(error)) from error
+
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def is_search(self):
+        return bool(self.request.GET.get('query'))
+
+    def is_local_feed(self):
+        return bool(self.kwargs.get('local')) and self.request.user.is_authenticated
+
+    def is_recommended_feed(self):
+        return bool(self.kwargs.get('recommended')) and self.request.user.is_authenticated
+
+    def get(self, request, *args, **kwargs):
+        self.record_tag_click()
+        return super().get(request, *args, **kwargs)
+
+    def record_tag_click(self):
+        tag_slug = self.kwargs.get('tag_slug')
+        if tag_slug:
+            tag = Tag.objects.only('id').filter(slug=tag_slug).first()
+            profile = self.request.user if self.request.user.is_authenticated else None
+            tag_click.send(sender=self.__class__, tag=tag, profile=profile)
+
+    def get_validators(self):
+        """
+        Validates the page of the feed on the newest article in the feed and the trending tags. Cards do
+        not show any counts, so favorites and comments do not change the page.
+        """
+        etag = get_feed_etag(self.request.user, self.request.get_full_path(), local=self.is_local_feed(),
+                             recommended=self.is_recommended_feed(), with_trending_tags=True)
+        return etag, None
+
     def get_context_data(self, **kwargs):
+        context = self.get_feed_context_data(**kwargs)
+        context['popular_tags'] = self.get_popular_tags()
+        return context
+
+    def get_feed_context_data(self, **kwargs):
+        """
+        Returns the context of the page but for the trending tags, which the async view fetches
+        concurrently
+        """
         context = super(ArticleListView, self).get_context_data(**kwargs)
+        load_fragment_versions(context['object_list'])
         context.update({
-            'popular_tags': get_top_n_most_popular_tags(self.get_queryset(), 5),
             'search_form': self.get_form(),
             'query': self.request.GET.get('query'),
             'local': self.kwargs.get('local'),
+            'recommended': self.kwargs.get('recommended'),
             'tag': self.kwargs.get('tag_slug')
         })
 
         return context
 
+    def get_popular_tags(self):
+        return get_trending_tags(5, scope_slug=self.kwargs.get('tag_slug'))
+
     def get_feed_articles(self):
         """
-        Gets the user's local feed if there is a authenticated user otherwise returns the
-        feed common to all users.
+        Gets the user's local feed, read from the user's feed inbox, or the articles recommended to the
+        user, if there is a authenticated user otherwise returns the feed common to all users.
 
         Returns:
             QuerySet: A queryset containing articles to be shown in the newsfeed
         """
-        if self.kwargs.get('local'):
-            if self.request.user.is_authenticated:
-                return get_articles_liked_and_authored_by_followed_profiles(self.request.user)
+        if self.is_local_feed():
+            return get_feed_inbox_articles(self.request.user)
+        if self.is_recommended_feed():
+            return get_recommended_articles(self.request.user)
 
         return Article.objects.all().order_by('-created_at').select_related('author').prefetch_related('tags')
 
@@ -90,14 +180,13 @@ class ArticleDetailView(View):
         return view(request, *args, **kwargs)
 
 
-class ArticleDetailFormView(LoginRequiredMixin, SingleObjectMixin, FormView):
+class ArticleDetailFormView(LoginRequiredMixin, ArticleLookupMixin, SingleObjectMixin, FormView):
     """
     Article detail view to handle post requests for embedded form
     """
 
     form_class = CommentForm
     model = Article
-    slug_url_kwarg = 'article_slug'
     template_name = 'articles/detail.html'
 
     def get_form_kwargs(self):
@@ -117,36 +206,88 @@ class ArticleDetailFormView(LoginRequiredMixin, SingleObjectMixin, FormView):
         return reverse('articles:article_detail', kwargs={'article_slug': self.object.slug})
 
 
-class ArticleDetailDisplay(DetailView):
+class ArticleDetailDisplay(ConditionalGetMixin, ArticleLookupMixin, DetailView):
     """
     View for the detail page of Article
     """
 
     model = Article
-    slug_url_kwarg = 'article_slug'
     template_name = 'articles/detail.html'
 
-    def get_context_data(self, **kwargs):
-        context = super(ArticleDetailDisplay, self).get_context_data()
-        comments = self.object.get_all_comments()
-        paginator = Paginator(comments, 5)
+    def get(self, request, *args, **kwargs):
+        """
+        Counts a view of the article through the counter buffer, even when the client's copy of the page
+        is still current
+        """
+        response = super().get(request, *args, **kwargs)
+        self.count_view()
+        return response
 
-        page = self.request.GET.get('page')
-        try:
-            comments = paginator.page(page)
-        except PageNotAnInteger:
-            comments = paginator.page(1)
-        except EmptyPage:
-            comments = paginator.page(paginator.num_pages)
+    def count_view(self):
+        counter_buffer.increment(Article, self.article_id, 'view_count')
 
-        context.update({
-            'comment_form': CommentForm(),
-            'page': page,
-            'comments': comments,
-        })
+    def get_object(self, queryset=None):
+        """
+        Gets the article and its author through the object caches
+        """
+        article = super().get_object(queryset)
+        article.author = profile_cache.get(pk=article.author_id)
+        self.article_id = article.pk
+        return article
+
+    def get_validators(self):
+        """
+        Validates the page on the article, the page of comments and the similar articles
+        """
+        validators = get_article_validators(self.request.user, self.request.GET.get('cursor', ''), with_similar=True,
+                                            slug=self.kwargs[self.slug_url_kwarg])
+        if validators is None:
+            return None
+
+        self.article_id, etag, last_modified = validators
+        return etag, last_modified
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the page of comments, the cursor of their changes and the similar articles to the context,
+        unless given, as the async view fetches them concurrently
+        """
+        if 'comments' not in kwargs:
+            kwargs['comments'] = self.get_comments_page(self.object.pk)
+        if 'comments_changes_cursor' not in kwargs:
+            kwargs['comments_changes_cursor'] = self.get_comments_changes_cursor(self.object.pk)
+        if 'similar_articles' not in kwargs:
+            kwargs['similar_articles'] = list(self.object.get_similar_articles())
+        load_fragment_versions([self.object] + kwargs['similar_articles'])
+
+        context = super(ArticleDetailDisplay, self).get_context_data(**kwargs)
+        context['comment_form'] = CommentForm()
 
         return context
 
+    def get_comments_page(self, article_id):
+        """
+        Returns the page of comments of the article at the cursor of the request, from the most recent,
+        seeking to it rather than counting and offsetting the comments
+        """
+        comments = Comment.objects.filter(article_id=article_id).select_related('author')
+        paginator = KeysetPaginator(comments, settings.COMMENTS_PAGE_SIZE)
+        try:
+            return paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as error:
+            raise Http404(str(error)) from error
+
+    def get_comments_changes_cursor(self, article_id):
+        """
+        Returns the cursor the page follows the changes of the comments from when showing the most recent
+        comments, or None
+        """
+        markers = None if self.request.GET.get('cursor') else get_comment_sync_markers(article_id)
+        if markers is None:
+            return None
+        _, *position = markers
+        return encode_changes_cursor(*position)
+
 
 class ArticleCreateView(LoginRequiredMixin, CreateView):
     """
@@ -167,22 +308,20 @@ class ArticleCreateView(LoginRequiredMixin, CreateView):
         return kwargs
 
 
-class ArticleUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ArticleUpdateView(LoginRequiredMixin, UserPassesTestMixin, ArticleLookupMixin, UpdateView):
     """
     View to update an Article
     """
 
     form_class = ArticleForm
     model = Article
-    slug_url_kwarg = 'article_slug'
     template_name_suffix = '_form'
 
     def test_func(self):
         """
         Only allow deletion if the authenticated user is the author of the article
         """
-        article_slug = self.kwargs.get('article_slug')
-        return Article.objects.filter(slug=article_slug, author=self.request.user).exists()
+        return self.get_object().author_id == self.request.user.pk
 
     def get_form_kwargs(self, *args, **kwargs):
         """
@@ -211,13 +350,12 @@ class ArticleUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return render(request, 'articles/article_form.html', {'form': form})
 
 
-class ArticleDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class ArticleDeleteView(LoginRequiredMixin, UserPassesTestMixin, ArticleLookupMixin, DeleteView):
     """
     View to delete an Article
     """
 
     model = Article
-    slug_url_kwarg = 'article_slug'
     success_url = reverse_lazy('articles:article_list')
     template_name = 'components/confirm_delete.html'
 
@@ -225,8 +363,7 @@ class ArticleDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         """
         Only allow deletion if the authenticated user is the author of the article
         """
-        article_slug = self.kwargs.get('article_slug')
-        return Article.objects.filter(slug=article_slug, author=self.request.user).exists()
+        return self.get_object().author_id == self.request.user.pk
 
 
 class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
@@ -238,29 +375,37 @@ class CommentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     pk_url_kwarg = 'comment_id'
     template_name = 'components/confirm_delete.html'
 
+    def get_queryset(self):
+        return Comment.objects.filter(article__slug=self.kwargs.get('article_slug')).select_related('article')
+
+    def get_object(self, queryset=None):
+        """
+        Fetches the comment along with its article once, for both the permission check and the deletion
+        """
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
+
     def test_func(self):
         """
         Only allow delete if the logged in user is either the author of the comment or the article
         """
-        comment_id = self.kwargs.get('comment_id')
-        article_slug = self.kwargs.get('article_slug')
-
-        is_comment_author = Comment.objects.filter(id=comment_id, author=self.request.user).exists()
-        is_article_author = Article.objects.filter(slug=article_slug, author=self.request.user).exists()
-
-        return is_article_author or is_comment_author
+        comment = self.get_object()
+        return self.request.user.pk in (comment.author_id, comment.article.author_id)
 
     def get_success_url(self):
         article_slug = self.kwargs.get('article_slug')
         return reverse_lazy('articles:article_detail', kwargs={'article_slug': article_slug})
 
 
-class ArticleRateView(LoginRequiredMixin, SingleObjectMixin, View):
+@method_decorator(use_primary_database, name='dispatch')
+class ArticleRateView(LoginRequiredMixin, ArticleLookupMixin, SingleObjectMixin, View):
     """
     View that handles the favourite and un-favourite functionality of an article
     """
 
     model = Article
+    slug_url_kwarg = 'slug'
 
     def get(self, request, slug, rate):  # pylint: disable=unused-argument
         self.object = self.get_object()
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'articulate.settings')
+# Serves the read-only hot paths with the async views, see the ASYNC_READ_VIEWS setting
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
-application = get_asgi_application()
+# As `get_asgi_application` does, with a handler streaming responses outside of the event loop
+django.setup(set_prefix=False)
+
+from articulate.concurrency import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
+
+# Loads the typeahead index in the background, so that the first suggestions do not wait for it
+from articles.typeahead import typeahead_index  # noqa: E402
+
+typeahead_index.start()
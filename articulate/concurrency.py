@@ -0,0 +1,149 @@
+"""
+Thread pool for the async views of articulate
+
+The ORM can only be used synchronously, so async views run their queries in a pool of worker threads
+bounded by the `ASYNC_THREAD_POOL_SIZE` setting. Each worker thread keeps its own database connection,
+so the pool also bounds the number of connections a process opens, and independent queries of a
+request run concurrently on different connections.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+
+from .middleware import install_query_counters
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_THREAD_POOL_SIZE,
+                                           thread_name_prefix='articulate-async')
+        return _executor
+
+
+def _run_in_worker(function, args, kwargs):
+    # Worker threads outlive requests, so their connections are recycled here as Django does between
+    # requests, honouring CONN_MAX_AGE and dropping broken connections
+    close_old_connections()
+    install_query_counters()
+    return function(*args, **kwargs)
+
+
+async def run_sync(function, *args, **kwargs):
+    """
+    Runs a blocking function in the thread pool and returns its result. The context variables of the
+    caller are visible to the function, e.g. to count its queries in the request's metrics.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, _run_in_worker, function, args, kwargs)
+    )
+
+
+def load_user(request):
+    """
+    Resolves the lazy `request.user`, which queries the session and the user. It has to be resolved in
+    a worker thread before an async view touches it, and before its jobs are run concurrently.
+    """
+    return request.user.is_authenticated
+
+
+def _render(response):
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    return response
+
+
+def offload(view):
+    """
+    Turns a sync view into an async one running the safe requests in the thread pool, response rendering
+    included. The other requests run in the thread Django runs sync views in, so that writes behave as
+    they do under WSGI.
+
+    Args:
+        view (callable): Sync view, e.g. a viewset's `as_view()`
+
+    Returns:
+        callable: Async view
+    """
+    unsafe_view = sync_to_async(view, thread_sensitive=True)
+
+    async def async_view(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await run_sync(lambda: _render(view(request, *args, **kwargs)))
+        return await unsafe_view(request, *args, **kwargs)
+
+    # Copies the attributes of the view, e.g. csrf_exempt, without making it look synchronous
+    async_view.__dict__.update(view.__dict__)
+    async_view.__name__ = getattr(view, '__name__', 'async_view')
+    return async_view
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler iterating the content of streaming responses in a thread of their own, since Django 3.1
+    iterates it in the event loop, where lazy content reading from the database, like an export, raises
+    `SynchronousOnlyOperation`. A single thread reads the whole content so that a server-side cursor
+    stays on the connection it was opened on, and its connection is closed once the response is sent.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.get_response_headers(response),
+        })
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='articulate-stream')
+        done = object()
+        try:
+            # Access `__iter__` and not `streaming_content` directly in case it has been overridden
+            parts = await loop.run_in_executor(executor, iter, response)
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, done)
+                if part is done:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(executor, _close_streaming_response, response)
+            executor.shutdown(wait=False)
+            # Signals the end of the request in the thread the view ran in too, as Django does
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+    @staticmethod
+    def get_response_headers(response):
+        headers = [
+            (header.encode('ascii') if isinstance(header, str) else header,
+             value.encode('latin1') if isinstance(value, str) else value)
+            for header, value in response.items()
+        ]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                    for cookie in response.cookies.values()]
+        return headers
+
+
+def _close_streaming_response(response):
+    try:
+        response.close()
+    finally:
+        connections.close_all()
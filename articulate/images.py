@@ -0,0 +1,256 @@
+"""
+Responsive image variants for articulate
+
+Images stored under `MEDIA_ROOT`, i.e. whose url starts with `MEDIA_URL` on one of the site's own hosts,
+are served in each of the `IMAGE_VARIANT_WIDTHS` narrower than them, resized and re-encoded with Pillow,
+so that pages can let the browser pick the smallest one filling the space the image is drawn in. Images
+hosted elsewhere are left as they are.
+
+A variant's url holds the digest of its source's content and of the settings it is rendered with, so a
+url always serves the same bytes and is cached by browsers as immutable, while a changed source gets new
+urls. Variants are rendered in a pool of `IMAGE_WORKERS` threads as soon as a page refers to them, since
+Pillow releases the GIL while decoding, resizing and encoding, and are stored under
+`IMAGE_VARIANTS_ROOT` by digest. A request for a variant that is not rendered yet waits for it.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.http.request import validate_host
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever variants of the same source and width would be rendered differently, to change their urls
+PIPELINE_VERSION = 1
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+CHUNK_SIZE = 1024 * 1024
+VARIANT_EXTENSIONS = ('jpg', 'png')
+
+SourceImage = namedtuple('SourceImage', 'name path digest width height has_alpha')
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='articulate-images')
+        return _executor
+
+
+@lru_cache(maxsize=4096)
+def _inspect(path, mtime_ns, size):
+    # Keyed on the modification time and size too, so that a source replaced in place is read again
+    digest = hashlib.sha256(f'{PIPELINE_VERSION}:{settings.IMAGE_VARIANT_QUALITY}:'.encode())
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    with Image.open(path) as image:
+        width, height = image.size
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return digest.hexdigest()[:32], width, height, has_alpha
+
+
+def get_source_image(name):
+    """
+    Returns the source image stored under `MEDIA_ROOT` at the given relative path
+
+    Returns:
+        SourceImage: The image, or None if there is no such file or it is not an image Pillow can read
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(path)
+        digest, width, height, has_alpha = _inspect(path, stat.st_mtime_ns, stat.st_size)
+    except (SuspiciousFileOperation, OSError, Image.DecompressionBombError):
+        return None
+    return SourceImage(name, path, digest, width, height, has_alpha)
+
+
+def get_site_hosts():
+    """
+    Returns the host patterns the site is served on, as Django validates the `Host` header against them,
+    leaving out the wildcard that would claim every host
+    """
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and host != '*']
+    if settings.DEBUG and not settings.ALLOWED_HOSTS:
+        hosts = ['.localhost', '127.0.0.1', '[::1]']
+    return hosts
+
+
+def get_media_name(url):
+    """
+    Returns the path relative to `MEDIA_ROOT` of an image url, or None if the image is hosted elsewhere.
+    Image urls are stored absolute, so urls on one of the site's own hosts whose path starts with a
+    relative `MEDIA_URL` are stored under `MEDIA_ROOT` too.
+    """
+    if not url:
+        return None
+    if url.startswith(settings.MEDIA_URL):
+        path = url[len(settings.MEDIA_URL):]
+    else:
+        parts = urlsplit(url)
+        if (parts.scheme not in ('http', 'https') or not parts.hostname
+                or not parts.path.startswith(settings.MEDIA_URL)
+                or not validate_host(parts.hostname, get_site_hosts())):
+            return None
+        path = parts.path[len(settings.MEDIA_URL):]
+    return unquote(path.split('?', 1)[0]) or None
+
+
+def get_variant_extension(source):
+    # Photos are re-encoded as JPEG, and images with transparency as PNG to keep it
+    return 'png' if source.has_alpha else 'jpg'
+
+
+def get_variant_path(source, width):
+    return os.path.join(settings.IMAGE_VARIANTS_ROOT, source.digest[:2], source.digest,
+                        f'{width}.{get_variant_extension(source)}')
+
+
+def get_variant_url(source, width):
+    return reverse('image_variant', kwargs={'digest': source.digest, 'width': width,
+                                             'extension': get_variant_extension(source), 'name': source.name})
+
+
+def get_variant_widths(source):
+    """
+    Returns the `IMAGE_VARIANT_WIDTHS` narrower than the source, which is never upscaled
+    """
+    return [width for width in sorted(settings.IMAGE_VARIANT_WIDTHS) if width < source.width]
+
+
+def render_variant(source, width):
+    """
+    Resizes the source to the given width and re-encodes it, writing the variant atomically so that it
+    is never served half written
+    """
+    path = get_variant_path(source, width)
+    if os.path.exists(path):
+        return path
+
+    height = max(1, round(source.height * width / source.width))
+    with Image.open(source.path) as image:
+        # Lets the JPEG decoder scale the image down by a power of two while decoding, which is much
+        # cheaper than decoding it in full
+        image.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(image)
+        if source.has_alpha:
+            image = image.convert('RGBA')
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        # The orientation may have swapped the sides, so the height is derived again
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                if source.has_alpha:
+                    image.save(file, 'PNG', optimize=True)
+                else:
+                    image.save(file, 'JPEG', quality=settings.IMAGE_VARIANT_QUALITY, optimize=True,
+                               progressive=True)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+    return path
+
+
+def _forget_pending(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def request_variant(source, width):
+    """
+    Queues the variant for rendering in the worker pool unless it is rendered or queued already
+
+    Returns:
+        Future: The future of the path of the variant, or None if it is rendered already
+    """
+    path = get_variant_path(source, width)
+    if os.path.exists(path):
+        return None
+    with _pending_lock:
+        future = _pending.get(path)
+        if future is not None:
+            return future
+        future = _pending[path] = get_executor().submit(render_variant, source, width)
+    # Outside of the lock, since the callback runs right away if the variant is rendered already
+    future.add_done_callback(lambda _: _forget_pending(path))
+    return future
+
+
+def get_srcset(url):
+    """
+    Returns the `srcset` of an image: the urls of its variants, each with its width, and of the image
+    itself. The missing variants are queued for rendering, so that they are usually ready by the time the
+    browser requests them.
+
+    Returns:
+        str: The `srcset`, or an empty string if the image is hosted elsewhere or has no variants
+    """
+    name = get_media_name(url)
+    source = get_source_image(name) if name else None
+    if source is None:
+        return ''
+
+    candidates = []
+    for width in get_variant_widths(source):
+        request_variant(source, width)
+        candidates.append(f'{get_variant_url(source, width)} {width}w')
+    if not candidates:
+        return ''
+    candidates.append(f'{url} {source.width}w')
+    return ', '.join(candidates)
+
+
+@require_safe
+def image_variant_view(request, digest, width, extension, name):
+    """
+    Serves a variant of an image stored under `MEDIA_ROOT`, rendering it first if it is not yet, with
+    headers letting browsers and proxies cache it for good
+    """
+    # The digest and extension are checked before they make up a path
+    if not re.fullmatch('[0-9a-f]{32}', digest) or extension not in VARIANT_EXTENSIONS:
+        raise Http404('No such image variant.')
+
+    path = os.path.join(settings.IMAGE_VARIANTS_ROOT, digest[:2], digest, f'{width}.{extension}')
+    if not os.path.exists(path):
+        source = get_source_image(name)
+        if (source is None or source.digest != digest or extension != get_variant_extension(source)
+                or width not in get_variant_widths(source)):
+            raise Http404('No such image variant.')
+        future = request_variant(source, width)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                logger.exception('Failed to render the %dpx variant of %s', width, name)
+                raise Http404('No such image variant.')
+
+    response = FileResponse(open(path, 'rb'))
+    patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
@@ -0,0 +1,304 @@
+"""
+Prometheus style metrics for articulate
+
+Every process records its metrics in memory and regularly writes them to its own file in the
+`METRICS_DIR` directory. The `/metrics` endpoint sums the files of all the processes, so that the
+metrics of every gunicorn worker are exposed whichever worker answers the scrape.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import MemcachedCache
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django_redis.cache import RedisCache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+METRICS = {
+    'articulate_http_requests_total': (COUNTER, 'Requests by view, method and status code'),
+    'articulate_http_exceptions_total': (COUNTER, 'Unhandled exceptions raised by views, by view and exception type'),
+    'articulate_http_request_duration_seconds': (HISTOGRAM, 'Time to produce a response, by view'),
+    'articulate_db_queries_per_request': (HISTOGRAM, 'SQL queries issued per request, by view'),
+    'articulate_db_query_duration_seconds_total': (COUNTER, 'Time spent running SQL queries, by view'),
+    'articulate_cache_lookups_total': (COUNTER, 'Cache lookups by key prefix and result'),
+}
+
+ARCHIVE_FILE = 'archived.json'
+LOCK_FILE = '.lock'
+
+
+class Registry:
+    """
+    Holds the metrics of the current process. Recording a sample is a dictionary update under a lock,
+    and the metrics are written to the process' file at most every `METRICS_FLUSH_INTERVAL` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_flush = 0
+
+    def increment(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] += amount
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0, 'count': 0}
+            for index, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, dict(histogram, counts=list(histogram['counts']))]
+                               for (name, labels), histogram in self._histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """
+        Writes the metrics of the process to its file in `METRICS_DIR`, if the last write is older than
+        `METRICS_FLUSH_INTERVAL` seconds or `force` is set
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as metrics_file:
+            json.dump(self.snapshot(), metrics_file)
+        os.replace(temporary_path, path)
+
+
+registry = Registry()
+
+
+def _flush_at_exit():
+    try:
+        registry.flush(force=True)
+    except OSError:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def _merge(totals, snapshot):
+    for name, labels, value in snapshot['counters']:
+        totals['counters'][(name, tuple(map(tuple, labels)))] += value
+    for name, labels, histogram in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        total = totals['histograms'].get(key)
+        if total is None:
+            totals['histograms'][key] = dict(histogram, counts=list(histogram['counts']))
+        else:
+            total['counts'] = [a + b for a, b in zip(total['counts'], histogram['counts'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+
+
+def _to_snapshot(totals):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in totals['counters'].items()],
+        'histograms': [[name, labels, histogram] for (name, labels), histogram in totals['histograms'].items()],
+    }
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """
+    Sums the metrics of every process. The files of processes that have exited are folded into an
+    archive file, so that counters never go backwards while the number of files stays bounded.
+
+    Returns:
+        dict: Sums of the counters and histograms, keyed on their name and labels
+    """
+    registry.flush(force=True)
+    directory = settings.METRICS_DIR
+    totals = {'counters': defaultdict(float), 'histograms': {}}
+
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = {'counters': defaultdict(float), 'histograms': {}}
+        dead_paths = []
+        if os.path.exists(archive_path):
+            with open(archive_path) as archive_file:
+                _merge(archive, json.load(archive_file))
+
+        for filename in os.listdir(directory):
+            pid, _, extension = filename.partition('.')
+            if extension != 'json' or not pid.isdigit():
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                with open(path) as metrics_file:
+                    snapshot = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue
+            if _is_alive(int(pid)):
+                _merge(totals, snapshot)
+            else:
+                _merge(archive, snapshot)
+                dead_paths.append(path)
+
+        if dead_paths:
+            temporary_path = f'{archive_path}.tmp'
+            with open(temporary_path, 'w') as archive_file:
+                json.dump(_to_snapshot(archive), archive_file)
+            os.replace(temporary_path, archive_path)
+            for path in dead_paths:
+                os.remove(path)
+
+    _merge(totals, _to_snapshot(archive))
+    return totals
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_exposition(totals):
+    """
+    Formats the collected metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == COUNTER:
+            for (metric, labels), value in sorted(totals['counters'].items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value!r}')
+            continue
+
+        for (metric, labels), histogram in sorted(totals['histograms'].items(), key=lambda item: item[0]):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {float(histogram["sum"])!r}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Exposes the metrics of all the processes. If the `METRICS_TOKEN` setting is set, the scraper has to
+    send it as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    return HttpResponse(render_exposition(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def get_key_prefix(key):
+    """
+    Returns the part of a cache key that identifies what is cached, e.g. `article-fragment-version` for
+    `article-fragment-version:42` and `template.cache.article-card-header` for the fragments cached by
+    the `{% cache %}` tag
+    """
+    if key.startswith('template.cache.'):
+        return key.rsplit('.', 1)[0]
+    return key.split(':', 1)[0]
+
+
+class CacheMetricsMixin:
+    """
+    Mixin for cache backends counting the hits and misses of lookups by key prefix. The local memory
+    and file based backends implement `get_many` and `get_or_set` on top of `get`, so these are
+    counted too.
+    """
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version)
+        registry.increment('articulate_cache_lookups_total', (
+            ('key', get_key_prefix(str(key))), ('result', 'miss' if value is sentinel else 'hit')
+        ))
+        return default if value is sentinel else value
+
+
+class BatchCacheMetricsMixin(CacheMetricsMixin):
+    """
+    Cache metrics mixin for the backends fetching several keys at once in a single round trip, counting
+    each key of `get_many` as a lookup
+    """
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version)
+        for key in keys:
+            registry.increment('articulate_cache_lookups_total', (
+                ('key', get_key_prefix(str(key))), ('result', 'hit' if key in values else 'miss')
+            ))
+        return values
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+class InstrumentedFileBasedCache(CacheMetricsMixin, FileBasedCache):
+    """
+    File based cache for development, which never culls its entries since Django lists the whole cache
+    directory to do so on every write. Expired entries are still deleted when they are read.
+    """
+
+    def _cull(self):
+        pass
+
+
+class InstrumentedMemcachedCache(BatchCacheMetricsMixin, MemcachedCache):
+    pass
+
+
+class InstrumentedRedisCache(BatchCacheMetricsMixin, RedisCache):
+    pass
@@ -0,0 +1,234 @@
+"""
+Middleware for articulate
+"""
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import LATENCY_BUCKETS, QUERY_COUNT_BUCKETS, registry
+from .objectcache import READ_ONLY_METHODS, identity_map
+from .replicas import current_routing, get_routing_state, pin_to_primary, reads_from_replica, replica_health
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+current_query_stats = ContextVar('current_query_stats', default=None)
+
+
+class QueryStats:
+    """
+    Counts the queries of a request and the time spent running them. Async views run their queries
+    concurrently in worker threads, so the counts are updated under a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0
+
+    def record(self, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Database execute wrapper recording every query in the `QueryStats` of the current request, if any.
+    The stats are found through a context variable, so queries run by a request in any thread, e.g. in
+    the thread pool of the async views, are recorded.
+    """
+    stats = current_query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(time.perf_counter() - start)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def install_query_counters():
+    """
+    Installs `count_queries` on the connections of the current thread. The connections opened afterwards
+    get it when they connect.
+    """
+    for connection in connections.all():
+        install_query_counter(None, connection)
+
+
+connection_created.connect(install_query_counter)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status code and SQL queries of every request, labelled with the name of the
+    URL pattern it resolved to, e.g. `articles:article_list`. It should come first so that the time
+    spent in the other middleware is measured too. It runs in both sync and async mode, so that it does
+    not force the async views back into a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        install_query_counters()
+        start = time.perf_counter()
+        queries = QueryStats()
+        token = current_query_stats.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        queries = QueryStats()
+        token = current_query_stats.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def record(self, request, response, duration, queries):
+        view = self.get_view_name(request)
+        registry.increment('articulate_http_requests_total', (
+            ('view', view), ('method', request.method), ('status', str(response.status_code))
+        ))
+        registry.observe('articulate_http_request_duration_seconds', (('view', view),), duration, LATENCY_BUCKETS)
+        registry.observe('articulate_db_queries_per_request', (('view', view),), queries.count, QUERY_COUNT_BUCKETS)
+        registry.increment('articulate_db_query_duration_seconds_total', (('view', view),), queries.duration)
+        registry.flush()
+
+    def process_exception(self, request, exception):
+        registry.increment('articulate_http_exceptions_total', (
+            ('view', self.get_view_name(request)), ('exception', type(exception).__name__)
+        ))
+
+    @staticmethod
+    def get_view_name(request):
+        resolver_match = getattr(request, 'resolver_match', None)
+        return resolver_match.view_name if resolver_match else UNRESOLVED_VIEW
+
+
+class IdentityMapMiddleware:
+    """
+    Scopes an identity map of the objects read through the object caches to every request, so that the
+    objects a request looks up more than once are fetched once. Only the identity maps of safe requests
+    are read through the shared cache. It runs in both sync and async mode, like `MetricsMiddleware`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        with identity_map(read_only=request.method in READ_ONLY_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with identity_map(read_only=request.method in READ_ONLY_METHODS):
+            return await self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Routes the reads of safe requests to a replica, as described in `articulate.replicas`, and pins the
+    clients of the requests that wrote to the primary for a while. It runs in both sync and async mode,
+    like `MetricsMiddleware`, and runs the due health checks of the replicas in a worker thread in async
+    mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if reads_from_replica(request):
+            replica_health.run_due_checks()
+        state = get_routing_state(request)
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        if reads_from_replica(request) and replica_health.get_due_checks():
+            await sync_to_async(replica_health.run_due_checks, thread_sensitive=False)()
+        state = get_routing_state(request)
+        token = current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.pin(request, response, state)
+
+    @staticmethod
+    def pin(request, response, state):
+        if state.wrote or request.method not in READ_ONLY_METHODS:
+            pin_to_primary(response)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that also runs in async mode. WhiteNoise only supports sync mode, which under
+    ASGI would make Django run every request through a single thread, async views included. Static
+    files are looked up and opened in a worker thread, since both may touch the file system.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.root or request.path_info.startswith(self.static_prefix):
+            response = await sync_to_async(self.process_request, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
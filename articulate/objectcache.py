@@ -0,0 +1,186 @@
+"""
+Read-through object cache for articulate
+
+Objects looked up on every request, e.g. articles by slug, are read through the shared cache. Each object
+is cached under its primary key, and under each other field it is looked up by as a pointer to that key.
+The receivers of their app drop the cached copy whenever an object is saved, deleted or has one of its
+counters updated. Pointers are not dropped, so an object found through one is checked to still match.
+
+Within a request, the objects are also kept in an identity map, so that e.g. a permission check and the
+view it guards share a single fetch and a single instance. Requests that may write read the objects from
+the database, so that they never save a stale copy, and lookups outside of a request, e.g. in management
+commands, always go to the database. Copies are only cached from the primary database, since one read
+from a lagging replica could be cached for long after the change it missed. Fields the pages do not need,
+e.g. credentials, can be left out of the copies, and are then loaded from the database on first access.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+current_identity_map = ContextVar('current_identity_map', default=None)
+
+_UNKNOWN = object()
+
+_caches = {}
+
+
+class IdentityMap:
+    """
+    Objects looked up during a request by model and primary key, along with the primary keys of the
+    objects by the other fields they were looked up by. None stands for objects that do not exist.
+    """
+
+    def __init__(self, read_only):
+        self.read_only = read_only
+        self.objects = {}
+        self.aliases = {}
+
+    def add(self, label, field, value, instance):
+        pk = value if field == 'pk' else getattr(instance, 'pk', None)
+        if field != 'pk':
+            self.aliases[(label, field, value)] = pk
+        if pk is not None:
+            self.objects[(label, pk)] = instance
+
+    def discard(self, label, pks):
+        """
+        Forgets the given objects, along with the lookups that found nothing, which may find them now
+        """
+        for pk in pks:
+            self.objects.pop((label, pk), None)
+        self.aliases = {alias: pk for alias, pk in self.aliases.items()
+                        if alias[0] != label or (pk is not None and pk not in pks)}
+
+
+@contextmanager
+def identity_map(read_only):
+    """
+    Scopes a new identity map to the enclosed code, e.g. a request
+    """
+    token = current_identity_map.set(IdentityMap(read_only))
+    try:
+        yield
+    finally:
+        current_identity_map.reset(token)
+
+
+class ObjectCache:
+    """
+    Read-through cache of the instances of a model, looked up by primary key or by one of the given unique
+    fields
+
+    Args:
+        model (Model): Model of the cached instances
+        lookup_fields (Iterable[str]): Unique fields the instances are looked up by besides the primary key
+        deferred_fields (Iterable[str]): Fields left out of the instances, and so out of the cache
+    """
+
+    def __init__(self, model, lookup_fields=(), deferred_fields=()):
+        self.model = model
+        self.lookup_fields = tuple(lookup_fields)
+        self.deferred_fields = tuple(deferred_fields)
+        self.label = model._meta.label_lower
+        _caches[model] = self
+
+    def get_key(self, field, value):
+        # Quoted so that the key is valid whatever the value, e.g. a username with spaces
+        return f'object:{self.label}:{field}:{quote(str(value))}'
+
+    def get(self, **lookup):
+        """
+        Returns the instance matching a single lookup, e.g. `get(slug=...)` or `get(pk=...)`, first from
+        the identity map of the current request, then from the shared cache, then from the database
+
+        Returns:
+            Model: The instance, or None if there is no such instance
+        """
+        field, value = self._parse_lookup(lookup)
+        current_map = current_identity_map.get()
+        if current_map is None:
+            return self._fetch(field, value)
+
+        pk = value if field == 'pk' else current_map.aliases.get((self.label, field, value), _UNKNOWN)
+        if pk is None:
+            return None
+        instance = current_map.objects.get((self.label, pk), _UNKNOWN)
+        if instance is _UNKNOWN:
+            if current_map.read_only:
+                instance = self._read_through(field, value)
+            else:
+                instance = self._fetch(field, value, using=DEFAULT_DB_ALIAS)
+                if instance is not None:
+                    self._store(instance)
+            current_map.add(self.label, field, value, instance)
+        return instance
+
+    def get_object_or_404(self, **lookup):
+        """
+        Returns the instance matching a single lookup like `get`, raising Http404 if there is none
+        """
+        instance = self.get(**lookup)
+        if instance is None:
+            raise Http404(f'No {self.model._meta.object_name} matches the given query.')
+        return instance
+
+    def invalidate(self, pks):
+        """
+        Drops the cached copies of the instances with the given primary keys, once the current transaction
+        commits so that no other request caches them again in the meantime
+        """
+        pks = set(pks)
+        if not pks:
+            return
+        current_map = current_identity_map.get()
+        if current_map is not None:
+            current_map.discard(self.label, pks)
+        keys = [self.get_key('pk', pk) for pk in pks]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def _parse_lookup(self, lookup):
+        if len(lookup) != 1:
+            raise TypeError('ObjectCache lookups take a single field')
+        (field, value), = lookup.items()
+        if field in ('pk', self.model._meta.pk.name):
+            return 'pk', self.model._meta.pk.to_python(value)
+        if field not in self.lookup_fields:
+            raise ValueError(f'{self.label} instances are not cached by {field}')
+        return field, self.model._meta.get_field(field).to_python(value)
+
+    def _fetch(self, field, value, using=None):
+        try:
+            return self.model._default_manager.db_manager(using).defer(*self.deferred_fields).get(**{field: value})
+        except self.model.DoesNotExist:
+            return None
+
+    def _read_through(self, field, value):
+        pk = value if field == 'pk' else cache.get(self.get_key(field, value))
+        if pk is not None:
+            instance = cache.get(self.get_key('pk', pk))
+            if instance is not None and (field == 'pk' or getattr(instance, field) == value):
+                return instance
+
+        instance = self._fetch(field, value, using=DEFAULT_DB_ALIAS)
+        if instance is not None:
+            self._store(instance)
+        return instance
+
+    def _store(self, instance):
+        entries = {self.get_key(field, getattr(instance, field)): instance.pk for field in self.lookup_fields}
+        entries[self.get_key('pk', instance.pk)] = instance
+        cache.set_many(entries, timeout=settings.OBJECT_CACHE_TIMEOUT)
+
+
+def invalidate_cached_objects(model, pks):
+    """
+    Drops the cached copies of the given instances of a model, if it has an object cache
+    """
+    object_cache = _caches.get(model)
+    if object_cache is not None:
+        object_cache.invalidate(pks)
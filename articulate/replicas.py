@@ -0,0 +1,302 @@
+"""
+Read replica routing for articulate
+
+Safe requests read from one of the replicas listed in the `REPLICA_DATABASES` setting, picked at random
+among the healthy ones, while writes always go to the primary. Reading your own writes is preserved by
+sending to the primary:
+- the reads of requests that may write, and of the views marked with `use_primary_database`;
+- the reads following a write, or made in a transaction, for the rest of the request;
+- the requests of a client for `REPLICA_PIN_SECONDS` after it wrote, tracked by a cookie.
+
+Replicas are health checked every `REPLICA_HEALTH_CHECK_INTERVAL` seconds on a separate connection, and
+skipped until the next check when they cannot be reached or lag more than `REPLICA_MAX_LAG` seconds
+behind the primary. A replica that cannot be connected to is skipped right away, the request reading from
+the primary instead, and one whose connection fails in the middle of a request is skipped from the next
+request on.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+
+from .objectcache import READ_ONLY_METHODS
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_until'
+
+# Replicas that are not in recovery, e.g. a copy of the database on another server, count as caught up, as
+# do the ones that replayed all the WAL they received, which restarts from the start of a segment
+REPLICATION_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= pg_last_wal_receive_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RoutingState:
+    """
+    Database the reads of a request are routed to, switched to the primary once the request writes
+    """
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+    def use_primary(self):
+        self.replica = None
+
+    def get_read_database(self):
+        """
+        Returns the database to read from, connecting to the replica first if the current thread has not
+        yet, and falling back to the primary if it cannot
+        """
+        if self.replica is None:
+            return DEFAULT_DB_ALIAS
+
+        connection = connections[self.replica]
+        if connection.connection is None:
+            try:
+                connection.ensure_connection()
+            except (OperationalError, InterfaceError):
+                logger.warning('Cannot connect to replica %s, reading from the primary', self.replica, exc_info=True)
+                replica_health.set_healthy(self.replica, False)
+                self.use_primary()
+                return DEFAULT_DB_ALIAS
+        return self.replica
+
+
+class ReplicaHealth:
+    """
+    Tracks which replicas are healthy, checking each of them at most every `REPLICA_HEALTH_CHECK_INTERVAL`
+    seconds. Replicas are healthy until their first check.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._healthy = {}
+        self._checked_at = {}
+
+    def get_due_checks(self):
+        now = time.monotonic()
+        with self._lock:
+            return [alias for alias in settings.REPLICA_DATABASES
+                    if now - self._checked_at.get(alias, -float('inf')) >= settings.REPLICA_HEALTH_CHECK_INTERVAL]
+
+    def run_due_checks(self):
+        """
+        Checks the replicas whose last check is older than the interval. A replica is claimed before it is
+        checked, so that concurrent requests do not check it too.
+        """
+        for alias in self.get_due_checks():
+            with self._lock:
+                checked_at = self._checked_at.get(alias, -float('inf'))
+                if time.monotonic() - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+                    continue
+                self._checked_at[alias] = time.monotonic()
+            self.set_healthy(alias, self.check(alias))
+
+    def check(self, alias):
+        """
+        Returns whether the replica can be reached and lags at most `REPLICA_MAX_LAG` seconds behind, on a
+        connection of its own rather than the one of the current thread
+        """
+        wrapper = connections[alias]
+        try:
+            connection = wrapper.get_new_connection(wrapper.get_connection_params())
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(REPLICATION_LAG_SQL)
+                    lag, = cursor.fetchone()
+            finally:
+                connection.close()
+        except Exception:
+            logger.warning('Replica %s failed its health check', alias, exc_info=True)
+            return False
+
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning('Replica %s lags %.1f seconds behind the primary', alias, lag)
+            return False
+        return True
+
+    def set_healthy(self, alias, healthy):
+        with self._lock:
+            if self._healthy.get(alias, True) and not healthy:
+                self._checked_at[alias] = time.monotonic()
+            self._healthy[alias] = healthy
+
+    def get_healthy_replicas(self):
+        with self._lock:
+            return [alias for alias in settings.REPLICA_DATABASES if self._healthy.get(alias, True)]
+
+
+replica_health = ReplicaHealth()
+
+
+def is_pinned(request):
+    """
+    Returns whether the client wrote recently enough that it has to read from the primary
+    """
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def reads_from_replica(request):
+    """
+    Returns whether a request should read from a replica, i.e. it is safe and its client is not pinned to
+    the primary
+    """
+    return bool(settings.REPLICA_DATABASES) and request.method in READ_ONLY_METHODS and not is_pinned(request)
+
+
+def get_routing_state(request):
+    """
+    Returns the routing state of a request, reading from one of the replicas that were healthy at their
+    last check if it should read from a replica
+    """
+    if not reads_from_replica(request):
+        return RoutingState(None)
+
+    replicas = replica_health.get_healthy_replicas()
+    return RoutingState(random.choice(replicas) if replicas else None)
+
+
+def pin_to_primary(response):
+    """
+    Pins the client of the response to the primary for `REPLICA_PIN_SECONDS`
+    """
+    response.set_cookie(PIN_COOKIE, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+
+
+def use_primary_database(view):
+    """
+    Decorator for the views reading from the primary, e.g. because they write on GET requests based on
+    what they read
+    """
+    @wraps(view)
+    def wrapped_view(*args, **kwargs):
+        state = current_routing.get()
+        if state is not None:
+            state.use_primary()
+        return view(*args, **kwargs)
+
+    return wrapped_view
+
+
+def detect_replica_failure(execute, sql, params, many, context):
+    """
+    Database execute wrapper of the replica connections skipping a replica until its next health check as
+    soon as its connection fails
+    """
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        replica_health.set_healthy(context['connection'].alias, False)
+        raise
+
+
+def install_failure_detector(sender, connection, **kwargs):
+    if connection.alias not in settings.REPLICA_DATABASES:
+        return
+    if detect_replica_failure not in connection.execute_wrappers:
+        connection.execute_wrappers.append(detect_replica_failure)
+
+
+connection_created.connect(install_failure_detector)
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the current request to its replica, if any, and everything else
+    to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.get_read_database()
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.wrote = True
+            state.use_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary, so objects read from any of them can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class DelayedCacheDeletes:
+    """
+    Deletes cache keys once more `REPLICA_MAX_LAG` seconds after a change is committed, when the healthy
+    replicas have caught up with it, so that entries cached from what a lagging replica read in the
+    meantime do not outlive the change. A single thread runs the due deletes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._pending = deque()
+        self._thread = None
+
+    def schedule(self, keys):
+        with self._condition:
+            self._pending.append((time.monotonic() + settings.REPLICA_MAX_LAG, list(keys)))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='delayed-cache-deletes', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                due, keys = self._pending[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                self._pending.popleft()
+            try:
+                cache.delete_many(keys)
+            except Exception:
+                logger.exception('Failed to delete %d cache keys', len(keys))
+
+
+delayed_cache_deletes = DelayedCacheDeletes()
+
+
+def delete_from_cache_on_commit(keys):
+    """
+    Deletes cache keys once the current transaction commits, and once more when the replicas have
+    caught up with it if reads are served by replicas
+    """
+    keys = list(keys)
+
+    def delete():
+        cache.delete_many(keys)
+        if settings.REPLICA_DATABASES:
+            delayed_cache_deletes.schedule(keys)
+
+    transaction.on_commit(delete)
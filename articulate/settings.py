@@ -4,9 +4,11 @@ Django settings for articulate project.
 Generated by 'django-admin startproject' using Django 3.1.
 """
 import os
+import tempfile
 from pathlib import Path
 
 import dj_database_url
+import django_cache_url
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'social_django',
     'rest_framework',
     'articles',
@@ -42,12 +45,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'articulate.middleware.MetricsMiddleware',
+    'articulate.middleware.StaticFilesMiddleware',
+    'articulate.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'articulate.middleware.IdentityMapMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +103,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'social_django.context_processors.backends',
                 'social_django.context_processors.login_redirect',
+                'articles.context_processors.viewer_state',
+                'articles.context_processors.fragment_cache',
             ],
         },
     },
@@ -119,6 +127,62 @@ DATABASES = {
 db_from_env = dj_database_url.config(conn_max_age=600)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas
+# Safe requests read from the replicas given as space separated database urls in REPLICA_DATABASE_URLS,
+# while writes, and the requests of clients that wrote in the last REPLICA_PIN_SECONDS, go to the primary.
+# Replicas failing their health check, or lagging more than REPLICA_MAX_LAG seconds behind the primary,
+# are skipped until their next check, every REPLICA_HEALTH_CHECK_INTERVAL seconds.
+REPLICA_DATABASES = []
+for index, replica_url in enumerate(os.environ.get('REPLICA_DATABASE_URLS', '').split()):
+    replica = dj_database_url.parse(replica_url, conn_max_age=600)
+    replica.setdefault('OPTIONS', {}).setdefault('connect_timeout', 2)
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{index}'] = replica
+    REPLICA_DATABASES.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['articulate.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+REPLICA_MAX_LAG = 2
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Cached fragments, objects and search results are invalidated by writing to the cache, so it has to be
+# shared by all the workers of all the hosts: Redis or Memcached at CACHE_URL, e.g. redis://localhost:6379/0
+# or memcached://localhost:11211. Without CACHE_URL, a file based cache in CACHE_DIR, in the temporary
+# directory by default, serves development: it is local to the host and never culled.
+INSTRUMENTED_CACHE_BACKENDS = {
+    'django_redis.cache.RedisCache': 'articulate.metrics.InstrumentedRedisCache',
+    'django.core.cache.backends.memcached.MemcachedCache': 'articulate.metrics.InstrumentedMemcachedCache',
+    'django.core.cache.backends.memcached.PyLibMCCache': 'articulate.metrics.InstrumentedMemcachedCache',
+}
+
+if os.environ.get('CACHE_URL'):
+    default_cache = django_cache_url.config()
+    default_cache['BACKEND'] = INSTRUMENTED_CACHE_BACKENDS.get(default_cache['BACKEND'], default_cache['BACKEND'])
+else:
+    default_cache = {
+        'BACKEND': 'articulate.metrics.InstrumentedFileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'articulate-cache')),
+    }
+
+CACHES = {
+    'default': default_cache
+}
+
+# Metrics exposed at /metrics: the directory shared by the workers to aggregate their metrics, the seconds
+# between writes of a worker's metrics to it, and an optional bearer token the scraper has to send
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'articulate-metrics'))
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Async views
+# Under ASGI the read-only hot paths are served by async views, which run their queries concurrently in
+# a bounded pool of threads, each keeping its own database connection. `articulate/asgi.py` sets
+# ASYNC_READ_VIEWS, so the sync views keep serving WSGI deployments.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS') == '1'
+ASYNC_THREAD_POOL_SIZE = int(os.environ.get('ASYNC_THREAD_POOL_SIZE', 8))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -145,6 +209,51 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5
 }
 
+# Full text search
+# https://www.postgresql.org/docs/current/textsearch-configuration.html
+
+SEARCH_CONFIG = 'english'
+
+# Minimum trigram similarity for a title or username to match a fuzzy search
+TRIGRAM_SIMILARITY_THRESHOLD = 0.1
+
+# Seconds between flushes of the buffered tag click and article view counters
+COUNTER_FLUSH_INTERVAL = 5
+
+# Trending tags leaderboard: half-life of an article's or a click's contribution to a tag's score, and
+# the weight of a click relative to an article
+TAG_POPULARITY_HALF_LIFE_DAYS = 7
+TAG_POPULARITY_CLICK_WEIGHT = 0.1
+
+# Typeahead suggestions: number of most popular tags, articles and profiles held in the in-memory index of
+# every process, and seconds between reloads picking up the changes made by other processes
+TYPEAHEAD_MAX_ENTRIES = 100000
+TYPEAHEAD_REFRESH_INTERVAL = 60
+
+# Seconds the rendered fragments of article cards and pages are cached for. Fragments are keyed on a
+# version bumped whenever their article changes, so this only bounds how long unused ones are kept.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds articles and profiles are cached for by the object caches. They are dropped from the cache
+# whenever they change, so this only bounds how long a copy cached by a request racing a change is served.
+OBJECT_CACHE_TIMEOUT = 60 * 10
+
+# Search results cached as the ids of the matching articles: the number of best ranked results kept, and
+# the seconds they are cached for. Cached searches are keyed on the version of the articles as a whole, so
+# this only bounds how long the results of searches nobody repeats are kept.
+SEARCH_RESULTS_CACHE_MAX_RESULTS = 1000
+SEARCH_RESULTS_CACHE_TIMEOUT = 60 * 10
+
+# Comments shown per page of an article's comments, and seconds deleted comments are remembered for the
+# clients polling for changes. Clients that polled longer ago than that reload the comments instead. The
+# expired ones are deleted at most every COMMENT_TOMBSTONE_PRUNE_INTERVAL seconds by each process.
+COMMENTS_PAGE_SIZE = 5
+COMMENT_TOMBSTONE_TTL = 60 * 60 * 24
+COMMENT_TOMBSTONE_PRUNE_INTERVAL = 60 * 10
+# Ids below the newest comment and deleted comment a client saw, read again on every poll, since ids are
+# assigned before the transactions writing them commit, possibly after the ones of newer ids.
+COMMENT_CHANGES_WINDOW = 100
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
 
@@ -168,3 +277,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Responsive images
+# Images under MEDIA_ROOT are served in each of these widths narrower than them, rendered in a pool of
+# IMAGE_WORKERS threads and stored under IMAGE_VARIANTS_ROOT, which should be shared by the workers of a host.
+IMAGE_VARIANT_WIDTHS = (80, 160, 320, 640, 960, 1280)
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS_ROOT = os.environ.get('IMAGE_VARIANTS_DIR', os.path.join(BASE_DIR, 'media_variants'))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
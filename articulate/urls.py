@@ -9,8 +9,13 @@ from django.views.generic import RedirectView
 
 from articles.api.views import api_root
 
+from .images import image_variant_view
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('images/<str:digest>/<int:width>.<str:extension>/<path:name>', image_variant_view, name='image_variant'),
     path('', RedirectView.as_view(url='articles/'), name='index'),
     path('', include('social_django.urls', namespace='social')),
     path('profiles/', include('profiles.urls', namespace='profiles')),
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'articulate.settings')
 
 application = get_wsgi_application()
+
+# Loads the typeahead index in the background, so that the first suggestions do not wait for it
+from articles.typeahead import typeahead_index  # noqa: E402
+
+typeahead_index.start()
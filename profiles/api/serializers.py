@@ -1,20 +1,49 @@
 from rest_framework import serializers
 
-from ..models import Profile
+from articles.viewer_state import get_viewer_state
+
+from ..models import FollowSuggestion, Profile
+
+
+class ProfileListSerializer(serializers.ListSerializer):
+    """
+    Resolves the viewer state of a whole page of profiles at once before serializing them
+    """
+
+    def to_representation(self, data):
+        profiles = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request', None)
+        if request:
+            get_viewer_state(request).load_profiles(profiles)
+        return super().to_representation(profiles)
 
 
 class ProfileSerializer(serializers.ModelSerializer):
-    following = serializers.SerializerMethodField()
-    followers = serializers.SerializerMethodField()
+    following = serializers.IntegerField(source='following_count', read_only=True)
+    followers = serializers.IntegerField(source='followers_count', read_only=True)
+    is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
         fields = ['username', 'bio', 'first_name', 'display', 'last_name', 'following', 'followers',
-                  'followed_profiles', 'favorite_articles', 'authored_articles']
+                  'is_following', 'followed_profiles', 'favorite_articles', 'authored_articles']
         read_only_fields = ('username',)
+        list_serializer_class = ProfileListSerializer
 
-    def get_following(self, instance):
-        return instance.get_followed_profiles().count()
+    def get_is_following(self, instance):
+        request = self.context.get('request', None)
+        if request:
+            return get_viewer_state(request).is_following(instance)
+        return False
 
-    def get_followers(self, instance):
-        return instance.get_followers().count()
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='suggested.username')
+    display = serializers.URLField(source='suggested.display')
+    bio = serializers.CharField(source='suggested.bio')
+    followers = serializers.IntegerField(source='suggested.followers_count')
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['username', 'display', 'bio', 'followers', 'score']
+        read_only_fields = fields
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.urlpatterns import format_suffix_patterns
 
-from .views import ProfileViewSet
+from articulate.concurrency import offload
+
+from .views import FollowSuggestionListView, ProfileViewSet
 
 profile_list = ProfileViewSet.as_view({
     'get': 'list'
@@ -15,9 +18,15 @@ profile_detail_username = ProfileViewSet.as_view({
     'get': 'retrieve'
 }, lookup_field='username')
 
+if settings.ASYNC_READ_VIEWS:
+    profile_list = offload(profile_list)
+    profile_detail = offload(profile_detail)
+    profile_detail_username = offload(profile_detail_username)
+
 app_name = "profiles"
 urlpatterns = [
     path('', profile_list, name='profile-list'),
+    path('suggestions/', FollowSuggestionListView.as_view(), name='profile-suggestions'),
     path('<int:pk>/', profile_detail, name='profile-detail'),
     path('@<slug:username>/', profile_detail_username, name='profile-detail'),
 ]
@@ -1,9 +1,28 @@
-from rest_framework import viewsets
+from rest_framework import generics, permissions, viewsets
 
-from profiles.api.serializers import ProfileSerializer
-from profiles.models import Profile
+from profiles.api.serializers import FollowSuggestionSerializer, ProfileSerializer
+from profiles.helpers import get_follow_suggestions
+from profiles.models import Profile, profile_cache
 
 
 class ProfileViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        profile = profile_cache.get_object_or_404(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, profile)
+        return profile
+
+
+class FollowSuggestionListView(generics.ListAPIView):
+    """
+    Profiles suggested for the authenticated user to follow, from the best
+    """
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return get_follow_suggestions(self.request.user)
@@ -0,0 +1,32 @@
+"""
+Async views for profiles app, served under ASGI when the `ASYNC_READ_VIEWS` setting is set
+"""
+import asyncio
+
+from django.shortcuts import render
+
+from articles.fragments import load_fragment_versions
+from articles.models import Article
+from articulate.concurrency import load_user, run_sync
+
+from .models import profile_cache
+
+
+def _get_authored_articles(username):
+    articles = list(Article.objects.filter(author__username=username).select_related('author').prefetch_related('tags'))
+    load_fragment_versions(articles)
+    return articles
+
+
+async def profile_detail(request, username):
+    """
+    Async version of `profile_detail`, fetching the profile, its articles and the viewer concurrently
+    """
+    profile, articles, _ = await asyncio.gather(
+        run_sync(profile_cache.get_object_or_404, username=username),
+        run_sync(_get_authored_articles, username),
+        run_sync(load_user, request),
+    )
+    return await run_sync(render, request, 'profiles/detail.html', context={"profile": profile,
+                                                                            "articles": articles,
+                                                                            "favorite": False})
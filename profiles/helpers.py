@@ -0,0 +1,36 @@
+"""
+Helpers for profiles app
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+
+from profiles.models import FollowSuggestion, Profile
+
+
+def get_most_similar_profiles_based_on_trigram_similarity(query):
+    """
+    Given a query, returns all the profiles whose username is similar to it based on trigram similarity,
+    matched through the trigram index on the username
+
+    Args:
+        query (str): Query to search profiles for
+
+    Returns:
+        QuerySet: A queryset of similar profiles
+    """
+    return Profile.objects.filter(username__trigram_similar=query).annotate(
+        similarity=TrigramSimilarity('username', query)).order_by('-similarity', 'username')
+
+
+def get_follow_suggestions(profile, limit=FollowSuggestion.TOP_K):
+    """
+    Gets the stored suggestions of profiles for a profile to follow, from the best, with a single
+    indexed query
+
+    Args:
+        profile (Profile): Profile to get the suggestions of
+        limit (int): Maximum number of suggestions
+
+    Returns:
+        QuerySet: A queryset of follow suggestions with their suggested profiles
+    """
+    return FollowSuggestion.objects.filter(owner=profile).select_related('suggested').order_by('rank')[:limit]
@@ -0,0 +1,25 @@
+"""
+Management command to refresh the "who to follow" suggestions
+"""
+from django.core.management.base import BaseCommand
+
+from profiles.models import FollowSuggestion
+from profiles.suggestions import refresh_follow_suggestions
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the profiles suggested to every profile to follow from the follow graph and the favorites
+    """
+    help = 'Recomputes the "who to follow" suggestions of every profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=FollowSuggestion.TOP_K,
+                            help='Number of suggestions to store per profile')
+        parser.add_argument('--workers', type=int, help='Number of worker processes, all the cores by default')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of profiles per worker task')
+
+    def handle(self, *args, **options):
+        written = refresh_follow_suggestions(top_k=options['top'], workers=options['workers'],
+                                             chunk_size=options['chunk_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} follow suggestions'))
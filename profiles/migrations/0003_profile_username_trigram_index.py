@@ -0,0 +1,19 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:01
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0008_article_title_trigram_index'),
+        ('profiles', '0002_auto_20210611_0046'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['username'], name='profile_username_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(related_model, column):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{column: OuterRef('pk')}).values(column).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    Follow = Profile.followed_profiles.through
+
+    Profile.objects.update(
+        followers_count=count_related(Follow, 'to_profile_id'),
+        following_count=count_related(Follow, 'from_profile_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_profile_username_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.7 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_profile_follow_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to=settings.AUTH_USER_MODEL)),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('owner', 'rank'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='followsuggestion',
+            index=models.Index(fields=['owner', 'rank'], name='follow_suggestion_rank_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='followsuggestion',
+            unique_together={('owner', 'suggested')},
+        ),
+    ]
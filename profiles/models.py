@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
-from articles.models import Article
+from articles.models import article_cache
+from articulate.objectcache import ObjectCache
 
 
 class Profile(AbstractUser):
@@ -16,12 +18,32 @@ class Profile(AbstractUser):
     )
     followed_profiles = models.ManyToManyField("self", related_name="followers", blank=True, symmetrical=False)
     favorite_articles = models.ManyToManyField("articles.Article", related_name="favorited", blank=True)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            GinIndex(fields=['username'], name='profile_username_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_byline = (instance.__dict__.get('username'), instance.__dict__.get('display'))
+        return instance
+
+    def has_changed_byline(self):
+        """
+        Returns whether the username or display picture shown next to the profile's articles has changed
+        since the profile was loaded from the database
+        """
+        return (self.username, self.display) != getattr(self, '_loaded_byline', (self.username, self.display))
+
     def get_authored_articles(self):
         return self.authored_articles.all()
 
@@ -35,21 +57,22 @@ class Profile(AbstractUser):
         return self.followers.all()
 
     def follow_profile(self, username):
-        profile_to_follow = Profile.objects.get(username=username)
+        profile_to_follow = profile_cache.get(username=username)
         if profile_to_follow:
             self.followed_profiles.add(profile_to_follow)
 
     def unfollow_profile(self, username):
-        if self.followed_profiles.filter(username=username).exists():
-            self.followed_profiles.remove(self.followed_profiles.get(username=username))
+        profile_to_unfollow = profile_cache.get(username=username)
+        if profile_to_unfollow and self.followed_profiles.filter(pk=profile_to_unfollow.pk).exists():
+            self.followed_profiles.remove(profile_to_unfollow)
 
     def is_favorite(self, article_slug):
         return self.favorite_articles.filter(slug=article_slug).exists()
 
     def toggle_article_favourite(self, article_slug):
-        article_to_toggle = Article.objects.filter(slug=article_slug).first()
+        article_to_toggle = article_cache.get(slug=article_slug)
         if article_to_toggle:
-            if self.is_favorite(article_slug):
+            if self.favorite_articles.filter(pk=article_to_toggle.pk).exists():
                 self.favorite_articles.remove(article_to_toggle)
             else:
                 self.favorite_articles.add(article_to_toggle)
@@ -59,3 +82,29 @@ class Profile(AbstractUser):
 
     def get_following_count(self):
         return self.get_followed_profiles().count()
+
+
+class FollowSuggestion(models.Model):
+    """
+    Model for one of the top `TOP_K` profiles suggested for `owner` to follow, as computed offline from
+    the follow graph and the favorites by `refresh_follow_suggestions`
+    """
+    TOP_K = 10
+
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='suggested_to')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ('owner', 'rank')
+        unique_together = ('owner', 'suggested')
+        indexes = [
+            models.Index(fields=['owner', 'rank'], name='follow_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.owner_id} -> {self.suggested_id} ({self.score:.3f})'
+
+
+profile_cache = ObjectCache(Profile, lookup_fields=('username',), deferred_fields=('password', 'email'))
@@ -0,0 +1,94 @@
+"""
+Signal receivers for profiles app
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from articles.fragments import bump_fragment_versions
+from articles.helpers import adjust_counter, get_related_ids_being_removed
+from articles.typeahead import PROFILE, typeahead_index
+
+from .models import FollowSuggestion, Profile, profile_cache
+
+
+@receiver(m2m_changed, sender=Profile.followed_profiles.through)
+def update_follow_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that keeps the followers and following counts of profiles in sync with the follow graph
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_follow_ids = get_related_ids_being_removed(
+            sender, instance, reverse, pk_set, 'from_profile_id', 'to_profile_id'
+        )
+        return
+
+    if action == 'post_add':
+        changed_ids, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed_ids, delta = instance.__dict__.pop('_removed_follow_ids', set()), -1
+    else:
+        return
+
+    if not changed_ids:
+        return
+
+    own_counter, other_counter = ('followers_count', 'following_count') if reverse else (
+        'following_count', 'followers_count')
+    adjust_counter(Profile.objects.filter(id=instance.id), own_counter, delta * len(changed_ids))
+    adjust_counter(Profile.objects.filter(id__in=changed_ids), other_counter, delta)
+    profile_cache.invalidate({instance.id} | set(changed_ids))
+
+
+@receiver(m2m_changed, sender=Profile.followed_profiles.through)
+def drop_followed_suggestions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Receiver that drops the follow suggestions of the profiles that were just followed, until the
+    suggestions are next refreshed
+    """
+    if action != 'post_add' or not pk_set:
+        return
+
+    if reverse:
+        FollowSuggestion.objects.filter(owner_id__in=pk_set, suggested=instance).delete()
+    else:
+        FollowSuggestion.objects.filter(owner=instance, suggested_id__in=pk_set).delete()
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_authored_article_fragments(sender, instance, created, **kwargs):
+    """
+    Receiver that invalidates the cached fragments of a profile's articles when its byline changes
+    """
+    if not created and instance.has_changed_byline():
+        bump_fragment_versions(instance.authored_articles.values_list('id', flat=True))
+        instance._loaded_byline = (instance.username, instance.display)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """
+    Receiver that drops the cached copy of a profile whenever it is saved or deleted
+    """
+    profile_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Profile)
+def update_typeahead_entry(sender, instance, update_fields=None, **kwargs):
+    """
+    Receiver that adds new profiles to the typeahead index of this process, and keeps their username
+    current, once the change is committed. Saves of other fields only, e.g. of `last_login` on every
+    login, leave the entry as it is.
+    """
+    if update_fields is not None and not {'username', 'followers_count'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: typeahead_index.put(PROFILE, instance))
+
+
+@receiver(post_delete, sender=Profile)
+def remove_typeahead_entry(sender, instance, **kwargs):
+    """
+    Receiver that removes deleted profiles from the typeahead index of this process
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: typeahead_index.remove(PROFILE, pk))
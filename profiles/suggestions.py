@@ -0,0 +1,222 @@
+"""
+"Who to follow" suggestions for profiles app
+
+Suggestions are computed offline over an in-memory copy of the follow graph and of the favorites, held
+as CSR adjacency arrays: the neighbours of row `i` are `indices[indptr[i]:indptr[i + 1]]`, with profiles
+and articles numbered densely. A profile is suggested to a user for every profile the user follows that
+follows it, and for every article they both favorited. Each of these shared neighbours counts less the
+more profiles it connects, as in the Adamic-Adar index, so that following a prolific profile or
+favoriting a popular article says less about the user's interests.
+"""
+import math
+import multiprocessing
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from django.db import connections, transaction
+
+from .models import FollowSuggestion, Profile
+
+FAVORITE_WEIGHT = 0.5
+BATCH_SIZE = 5000
+
+
+class Adjacency(namedtuple('Adjacency', 'indptr indices')):
+    """
+    Adjacency lists of a graph in CSR form
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_pairs(cls, sources, targets, size):
+        """
+        Builds the adjacency lists of `size` rows from the edges between the dense indexes `sources`
+        and `targets`
+        """
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+        return cls(indptr, targets[order].astype(np.int32))
+
+    def transpose(self, size):
+        """
+        Returns the reversed adjacency lists, of `size` rows
+        """
+        sources = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), self.degrees())
+        return Adjacency.from_pairs(self.indices, sources, size)
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def row(self, index):
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def gather(self, rows):
+        """
+        Returns the neighbours of all the given rows concatenated, along with the position in `rows` of
+        the row each one is a neighbour of, without looping over the rows in Python
+        """
+        starts, lengths = self.indptr[rows], self.indptr[np.asarray(rows) + 1] - self.indptr[rows]
+        positions = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.indices[np.repeat(starts, lengths) + offsets], positions
+
+
+FollowGraph = namedtuple('FollowGraph', 'profile_ids follows favorites favoriters')
+
+
+def _load_pairs(queryset):
+    values = np.fromiter(chain.from_iterable(queryset.iterator(chunk_size=BATCH_SIZE)), dtype=np.int64)
+    return values[0::2], values[1::2]
+
+
+def load_follow_graph():
+    """
+    Loads the follow graph and the favorites into CSR adjacency arrays, streaming the rows so that only
+    the arrays are held in memory
+
+    Returns:
+        FollowGraph: The ids of the profiles by dense index, who each profile follows, the articles each
+        profile favorited and the profiles that favorited each article
+    """
+    profile_ids = np.fromiter(Profile.objects.order_by('id').values_list('id', flat=True).iterator(
+        chunk_size=BATCH_SIZE), dtype=np.int64)
+
+    # The pairs are not read in the same snapshot as the profiles, so the ones of profiles created or
+    # deleted in the meantime are dropped rather than indexed past or wrongly into the arrays
+    follower_ids, followed_ids = _load_pairs(Profile.followed_profiles.through.objects.values_list(
+        'from_profile_id', 'to_profile_id'))
+    loaded = np.isin(follower_ids, profile_ids) & np.isin(followed_ids, profile_ids)
+    follower_ids, followed_ids = follower_ids[loaded], followed_ids[loaded]
+    follows = Adjacency.from_pairs(np.searchsorted(profile_ids, follower_ids),
+                                   np.searchsorted(profile_ids, followed_ids), len(profile_ids))
+
+    favoriter_ids, article_ids = _load_pairs(Profile.favorite_articles.through.objects.values_list(
+        'profile_id', 'article_id'))
+    loaded = np.isin(favoriter_ids, profile_ids)
+    favoriter_ids, article_ids = favoriter_ids[loaded], article_ids[loaded]
+    _, article_indexes = np.unique(article_ids, return_inverse=True)
+    article_count = int(article_indexes.max()) + 1 if len(article_indexes) else 0
+    favorites = Adjacency.from_pairs(np.searchsorted(profile_ids, favoriter_ids), article_indexes, len(profile_ids))
+
+    return FollowGraph(profile_ids, follows, favorites, favorites.transpose(article_count))
+
+
+def score_candidates(graph, index):
+    """
+    Scores the profiles that could be suggested to the profile at `index`
+
+    Returns:
+        tuple: The dense indexes of the candidates and their scores, excluding the profile itself and
+        the profiles it already follows
+    """
+    followed = graph.follows.row(index)
+    followed_of_followed, via_followed = graph.follows.gather(followed)
+    follow_weights = 1 / np.log(2 + graph.follows.degrees()[followed])
+
+    favorited = graph.favorites.row(index)
+    cofavoriters, via_favorited = graph.favoriters.gather(favorited)
+    favorite_weights = FAVORITE_WEIGHT / np.log(2 + graph.favoriters.degrees()[favorited])
+
+    candidates = np.concatenate([followed_of_followed, cofavoriters])
+    weights = np.concatenate([follow_weights[via_followed], favorite_weights[via_favorited]])
+    candidates, inverse = np.unique(candidates, return_inverse=True)
+    scores = np.bincount(inverse, weights=weights, minlength=len(candidates))
+
+    eligible = (candidates != index) & ~np.isin(candidates, followed)
+    return candidates[eligible], scores[eligible]
+
+
+def top_suggestions(graph, index, top_k):
+    """
+    Returns the `top_k` best scored candidates for the profile at `index`, as `(profile id, score)`
+    pairs from the best
+    """
+    candidates, scores = score_candidates(graph, index)
+    if len(candidates) > top_k:
+        best = np.argpartition(-scores, top_k)[:top_k]
+        candidates, scores = candidates[best], scores[best]
+    # Ties are broken on the id so that the suggestions are stable between runs
+    order = np.lexsort((candidates, -scores))
+    return [(int(graph.profile_ids[candidate]), float(score))
+            for candidate, score in zip(candidates[order], scores[order])]
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _suggest_for_chunk(args):
+    start, stop, top_k = args
+    return [(int(_worker_graph.profile_ids[index]), top_suggestions(_worker_graph, index, top_k))
+            for index in range(start, stop)]
+
+
+def _save_suggestions(results):
+    owner_ids = [owner_id for owner_id, _ in results]
+    suggested_ids = {suggested_id for _, suggestions in results for suggested_id, _ in suggestions}
+    with transaction.atomic():
+        # Profiles deleted since the graph was loaded are skipped, both as owners and as suggestions
+        existing_ids = set(Profile.objects.filter(id__in=suggested_ids.union(owner_ids)).values_list('id', flat=True))
+        rows = []
+        for owner_id, suggestions in results:
+            if owner_id not in existing_ids:
+                continue
+            suggestions = [(suggested_id, score) for suggested_id, score in suggestions if suggested_id in existing_ids]
+            rows.extend(FollowSuggestion(owner_id=owner_id, suggested_id=suggested_id, score=score, rank=rank)
+                        for rank, (suggested_id, score) in enumerate(suggestions))
+        FollowSuggestion.objects.filter(owner_id__in=owner_ids).delete()
+        FollowSuggestion.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def refresh_follow_suggestions(top_k=FollowSuggestion.TOP_K, workers=None, chunk_size=1000, log=None):
+    """
+    Recomputes the suggestions of every profile, scoring chunks of profiles in parallel worker processes
+    and replacing the stored suggestions of each chunk as its results come in
+
+    Args:
+        top_k (int): Number of suggestions to store per profile
+        workers (int): Number of worker processes, all the cores by default, or 1 to score in this process
+        chunk_size (int): Number of profiles per chunk handed to a worker
+        log (callable): Called with progress messages, if given
+
+    Returns:
+        int: Number of suggestions stored
+    """
+    graph = load_follow_graph()
+    workers = workers or multiprocessing.cpu_count()
+    chunks = [(start, min(start + chunk_size, len(graph.profile_ids)), top_k)
+              for start in range(0, len(graph.profile_ids), chunk_size)]
+    if log:
+        log(f'Loaded {len(graph.profile_ids)} profiles, {len(graph.follows.indices)} follows and '
+            f'{len(graph.favorites.indices)} favorites, scoring {len(chunks)} chunks with {workers} workers')
+
+    if workers == 1 or len(chunks) <= 1:
+        _init_worker(graph)
+        results = map(_suggest_for_chunk, chunks)
+        pool = None
+    else:
+        # The workers only compute, so they must not share the connections of this process
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(graph,))
+        results = pool.imap_unordered(_suggest_for_chunk, chunks)
+
+    written = 0
+    try:
+        for done, chunk_results in enumerate(results, start=1):
+            written += _save_suggestions(chunk_results)
+            if log and done % max(1, math.ceil(len(chunks) / 10)) == 0:
+                log(f'Scored {done} of {len(chunks)} chunks')
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _init_worker(None)
+
+    return written
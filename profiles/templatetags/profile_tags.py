@@ -1,5 +1,7 @@
 from django import template
 
+from ..helpers import get_follow_suggestions
+
 register = template.Library()
 
 
@@ -8,3 +10,17 @@ def insert_relevant_class(favorite):
     if favorite:
         return "btn-success \" disabled"
     return "btn-outline-success"
+
+
+@register.filter(name='is_following')
+def viewer_is_following(viewer, profile):
+    return viewer.is_following(profile)
+
+
+@register.inclusion_tag('components/follow_suggestions.html', takes_context=True)
+def follow_suggestions(context, limit=5):
+    """
+    Renders the stored suggestions of profiles for the viewer to follow
+    """
+    user = context['request'].user
+    return {'suggestions': get_follow_suggestions(user, limit) if user.is_authenticated else []}
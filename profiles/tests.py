@@ -1 +1,35 @@
-# Create your tests here.
+"""
+Tests for profiles app
+"""
+import pickle
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from articulate.objectcache import identity_map
+
+from .models import Profile, profile_cache
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'articulate.metrics.InstrumentedLocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProfileCacheTests(TestCase):
+    """
+    Profiles are cached without their credentials
+    """
+
+    def test_leaves_credentials_out_of_the_cache(self):
+        profile = Profile.objects.create_user(username='alice', email='alice@example.com', password='secret')
+
+        with identity_map(read_only=True):
+            self.assertEqual(profile_cache.get(username='alice'), profile)
+
+        cached = cache.get(profile_cache.get_key('pk', profile.pk))
+        self.assertEqual(cached.username, 'alice')
+        self.assertEqual(cached.get_deferred_fields(), {'password', 'email'})
+        pickled = pickle.dumps(cached)
+        self.assertNotIn(profile.password.encode(), pickled)
+        self.assertNotIn(b'alice@example.com', pickled)
+        # Loaded from the database when needed
+        self.assertEqual(cached.email, 'alice@example.com')
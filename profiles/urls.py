@@ -1,14 +1,20 @@
+from django.conf import settings
 from django.conf.urls import url
 from django.urls import include, path
 
 from . import views
 
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import profile_detail
+else:
+    profile_detail = views.profile_detail
+
 app_name = 'profiles'
 urlpatterns = [
     path('login/', views.profile_login, name='profile_login'),
     path('register/', views.profile_register, name='profile_register'),
     path('logout/', views.profile_logout, name='profile_logout'),
-    path('@<str:username>/', views.profile_detail, name='profile_detail'),
+    path('@<str:username>/', profile_detail, name='profile_detail'),
     path('@<str:username>/follow/', views.profile_follow, {"follow": True}, name='profile_follow'),
     path('@<str:username>/unfollow/', views.profile_follow, {"follow": False}, name='profile_unfollow'),
     path('@<str:username>/edit/', views.profile_edit, name='profile_edit'),
@@ -1,9 +1,11 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404, redirect, render
+from django.shortcuts import redirect, render
+
+from articulate.replicas import use_primary_database
 
 from .forms import LoginForm, SignupForm, UserChangeForm
-from .models import Profile
+from .models import profile_cache
 
 
 # Create your views here.
@@ -47,7 +49,7 @@ def profile_logout(request):
 
 
 def profile_detail(request, username):
-    profile = get_object_or_404(Profile, username=username)
+    profile = profile_cache.get_object_or_404(username=username)
     articles = profile.get_authored_articles()
     return render(request, 'profiles/detail.html', context={"profile": profile,
                                                             "articles": articles,
@@ -55,7 +57,7 @@ def profile_detail(request, username):
 
 
 def profile_favorites(request, username):
-    profile = get_object_or_404(Profile, username=username)
+    profile = profile_cache.get_object_or_404(username=username)
     articles = profile.get_favorite_articles()
     return render(request, 'profiles/detail.html', context={"profile": profile,
                                                             "articles": articles,
@@ -63,6 +65,7 @@ def profile_favorites(request, username):
 
 
 @login_required
+@use_primary_database
 def profile_follow(request, username, follow=True):
     current_user = request.user
     if follow:
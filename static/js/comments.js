@@ -0,0 +1,242 @@
+/*
+ * Loads the comments of an article incrementally through the comments API: posting and deleting a
+ * comment no longer reload the page, older comments are appended on demand, and the comments posted or
+ * deleted by others are picked up by polling the changes since the last poll.
+ */
+(function () {
+    'use strict';
+
+    var POLL_INTERVAL = 15000;
+
+    var list = document.getElementById('comments');
+    if (!list) {
+        return;
+    }
+
+    var commentsUrl = list.dataset.commentsUrl;
+    var changesUrl = list.dataset.changesCursor ? commentsUrl + '?since=' + list.dataset.changesCursor : null;
+    var nextCursor = list.dataset.nextCursor || null;
+    var authenticated = list.dataset.authenticated === 'true';
+    var template = document.getElementById('comment-template');
+    var empty = document.getElementById('comments-empty');
+    var form = document.querySelector('#comment-form form');
+    var csrfInput = document.querySelector('#comment-form [name=csrfmiddlewaretoken]');
+    var pollTimer = null;
+
+    function request(method, url, body) {
+        var headers = {'Accept': 'application/json'};
+        if (body !== undefined) {
+            headers['Content-Type'] = 'application/json';
+        }
+        if (method !== 'GET' && csrfInput) {
+            headers['X-CSRFToken'] = csrfInput.value;
+        }
+        return fetch(url, {
+            method: method,
+            headers: headers,
+            credentials: 'same-origin',
+            body: body === undefined ? undefined : JSON.stringify(body)
+        });
+    }
+
+    function renderBody(container, body) {
+        // Mirrors Django's linebreaks filter: blank lines separate paragraphs, newlines become breaks
+        body.replace(/\r\n|\r/g, '\n').split(/\n{2,}/).forEach(function (paragraph) {
+            var element = document.createElement('p');
+            paragraph.split('\n').forEach(function (line, index) {
+                if (index) {
+                    element.appendChild(document.createElement('br'));
+                }
+                element.appendChild(document.createTextNode(line));
+            });
+            container.appendChild(element);
+        });
+    }
+
+    function renderComment(comment) {
+        var element = template.content.firstElementChild.cloneNode(true);
+        element.dataset.commentId = comment.id;
+        renderBody(element.querySelector('.comment-text'), comment.body);
+        var author = element.querySelector('.comment-author');
+        author.href = comment.author_url;
+        author.querySelector('mark').textContent = comment.author;
+        element.querySelector('.comment-date').textContent = new Date(comment.created_at).toLocaleString();
+        if (!comment.can_delete) {
+            element.querySelector('.comment-delete').parentNode.remove();
+        }
+        return element;
+    }
+
+    function findComment(id) {
+        return list.querySelector('[data-comment-id="' + id + '"]');
+    }
+
+    function updateEmpty() {
+        empty.hidden = list.querySelector('.comment') !== null;
+    }
+
+    function prependComments(comments) {
+        // The changes list comments from the oldest, so each one goes on top of the previous one
+        comments.forEach(function (comment) {
+            if (!findComment(comment.id)) {
+                list.insertBefore(renderComment(comment), list.firstChild);
+            }
+        });
+        updateEmpty();
+    }
+
+    function appendComments(comments) {
+        comments.forEach(function (comment) {
+            if (!findComment(comment.id)) {
+                list.appendChild(renderComment(comment));
+            }
+        });
+        updateEmpty();
+    }
+
+    function removeComments(ids) {
+        ids.forEach(function (id) {
+            var element = findComment(id);
+            if (element) {
+                element.remove();
+            }
+        });
+        updateEmpty();
+    }
+
+    function cursorOf(link) {
+        return link ? new URL(link).searchParams.get('cursor') : null;
+    }
+
+    function reload() {
+        // The changes since the last poll are no longer known, so start over from the first page
+        return request('GET', commentsUrl).then(function (response) {
+            return response.json();
+        }).then(function (page) {
+            list.querySelectorAll('.comment').forEach(function (element) {
+                element.remove();
+            });
+            appendComments(page.results);
+            changesUrl = page.changes;
+            setNextCursor(cursorOf(page.next));
+        });
+    }
+
+    function poll() {
+        window.clearTimeout(pollTimer);
+        if (!changesUrl) {
+            return Promise.resolve();
+        }
+        return request('GET', changesUrl).then(function (response) {
+            if (response.status === 410) {
+                return reload();
+            }
+            if (!response.ok) {
+                return null;
+            }
+            return response.json().then(function (changes) {
+                prependComments(changes.results);
+                removeComments(changes.deleted);
+                changesUrl = changes.changes;
+                if (changes.has_more) {
+                    return poll();
+                }
+            });
+        }).catch(function () {
+            // Tried again at the next poll
+        }).then(schedulePoll);
+    }
+
+    function schedulePoll() {
+        window.clearTimeout(pollTimer);
+        pollTimer = window.setTimeout(function () {
+            if (document.hidden) {
+                schedulePoll();
+            } else {
+                poll();
+            }
+        }, POLL_INTERVAL);
+    }
+
+    var moreButton = null;
+
+    function setNextCursor(cursor) {
+        nextCursor = cursor;
+        if (moreButton) {
+            moreButton.hidden = !nextCursor;
+        }
+    }
+
+    function loadMore() {
+        moreButton.disabled = true;
+        request('GET', commentsUrl + '?cursor=' + encodeURIComponent(nextCursor)).then(function (response) {
+            return response.json();
+        }).then(function (page) {
+            appendComments(page.results);
+            setNextCursor(cursorOf(page.next));
+        }).finally(function () {
+            moreButton.disabled = false;
+        });
+    }
+
+    function deleteComment(element) {
+        if (!window.confirm('Are you sure you want to delete this comment?')) {
+            return;
+        }
+        request('DELETE', commentsUrl + element.dataset.commentId + '/').then(function (response) {
+            if (response.ok || response.status === 404) {
+                removeComments([element.dataset.commentId]);
+            }
+        });
+    }
+
+    function postComment(event) {
+        var textarea = form.querySelector('textarea');
+        event.preventDefault();
+        if (!textarea.value.trim()) {
+            return;
+        }
+        request('POST', commentsUrl, {body: textarea.value}).then(function (response) {
+            if (!response.ok) {
+                return;
+            }
+            textarea.value = '';
+            return response.json().then(function (comment) {
+                prependComments([comment]);
+                return poll();
+            });
+        });
+    }
+
+    if (changesUrl) {
+        // Only the page with the most recent comments follows the changes and loads older comments,
+        // the others keep their links to the other pages
+        var pagination = document.getElementById('comments-pagination');
+        if (pagination) {
+            pagination.hidden = true;
+        }
+        moreButton = document.createElement('button');
+        moreButton.type = 'button';
+        moreButton.className = 'btn btn-sm btn-outline-warning';
+        moreButton.textContent = 'Older comments';
+        moreButton.addEventListener('click', loadMore);
+        var wrapper = document.createElement('div');
+        wrapper.className = 'col-12 text-center mb-3';
+        wrapper.appendChild(moreButton);
+        list.parentNode.insertBefore(wrapper, empty.nextSibling);
+        setNextCursor(nextCursor);
+        schedulePoll();
+
+        if (authenticated && form) {
+            form.addEventListener('submit', postComment);
+        }
+    }
+
+    list.addEventListener('click', function (event) {
+        var link = event.target.closest('.comment-delete');
+        if (link && authenticated) {
+            event.preventDefault();
+            deleteComment(link.closest('.comment'));
+        }
+    });
+}());
@@ -0,0 +1,87 @@
+/*
+ * Suggests tags, articles and profiles while typing in the search box, through the typeahead API. The
+ * suggestions link to their page, and submitting the form still runs a full search.
+ */
+(function () {
+    'use strict';
+
+    var DEBOUNCE_DELAY = 100;
+    var SECTIONS = [['tags', 'Tags'], ['articles', 'Articles'], ['profiles', 'Profiles']];
+
+    var container = document.getElementById('typeahead');
+    var input = container && container.querySelector('input[name=query]');
+    if (!input) {
+        return;
+    }
+
+    var url = container.dataset.typeaheadUrl;
+    var menu = document.createElement('div');
+    var timer = null;
+    var latestQuery = null;
+
+    menu.className = 'dropdown-menu w-100';
+    input.parentNode.classList.add('position-relative');
+    input.parentNode.appendChild(menu);
+    input.setAttribute('autocomplete', 'off');
+
+    function hide() {
+        menu.classList.remove('show');
+    }
+
+    function render(suggestions) {
+        menu.textContent = '';
+        SECTIONS.forEach(function (section) {
+            var entries = suggestions[section[0]];
+            if (!entries.length) {
+                return;
+            }
+            var header = document.createElement('h6');
+            header.className = 'dropdown-header';
+            header.textContent = section[1];
+            menu.appendChild(header);
+            entries.forEach(function (entry) {
+                var link = document.createElement('a');
+                link.className = 'dropdown-item text-truncate';
+                link.href = entry.url;
+                link.textContent = entry.label;
+                menu.appendChild(link);
+            });
+        });
+        menu.classList.toggle('show', menu.childElementCount > 0);
+    }
+
+    function suggest() {
+        var query = input.value.trim();
+        latestQuery = query;
+        if (!query) {
+            hide();
+            return;
+        }
+        fetch(url + '?q=' + encodeURIComponent(query), {headers: {'Accept': 'application/json'}})
+            .then(function (response) {
+                return response.ok ? response.json() : null;
+            })
+            .then(function (suggestions) {
+                // Responses may arrive out of order, and only the latest query's are still relevant
+                if (suggestions && suggestions.query === latestQuery) {
+                    render(suggestions);
+                }
+            })
+            .catch(hide);
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(suggest, DEBOUNCE_DELAY);
+    });
+    input.addEventListener('keydown', function (event) {
+        if (event.key === 'Escape') {
+            hide();
+        }
+    });
+    document.addEventListener('click', function (event) {
+        if (!container.contains(event.target)) {
+            hide();
+        }
+    });
+}());